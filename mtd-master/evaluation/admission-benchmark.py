@@ -0,0 +1,61 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+import redis
+from admission import RequestGate
+
+def overhead(gate, clients, requests=200000):
+    """
+    Mean cost of the rate limit and admission checks for one admitted request,
+    over a population of clients whose buckets already exist
+    """
+    for limiter in (gate.clients, gate.sessions):
+        limiter.rate = limiter.burst = 1e9
+    addresses = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(clients)]
+    sessions = [f"session-{i}" for i in range(clients)]
+    picks = [random.randrange(clients) for _ in range(requests)]
+    for i in range(clients):
+        gate.limit(addresses[i], sessions[i])
+    started = time.perf_counter()
+    for i in picks:
+        if not gate.limit(addresses[i], sessions[i]) and gate.admit():
+            gate.release()
+    return (time.perf_counter() - started) / requests
+
+def scanner_isolation(gate, seconds=5.0, users=200):
+    """One scanner at 2000 req/s among users at 1 req/s each, on a simulated clock"""
+    clock = [0.0]
+    for limiter in (gate.clients, gate.sessions):
+        limiter.clock = lambda: clock[0]
+    events = [(random.uniform(0, seconds), f"10.0.{i // 250}.{i % 250}", f"user-{i}") for i in range(users) for _ in range(int(seconds))]
+    events += [(i / 2000, "203.0.113.7", None) for i in range(int(seconds * 2000))]
+    events.sort()
+    limited = {"user": 0, "scanner": 0}
+    totals = {"user": 0, "scanner": 0}
+    for now, ip, session in events:
+        clock[0] = now
+        kind = "user" if session else "scanner"
+        totals[kind] += 1
+        limited[kind] += bool(gate.limit(ip, session))
+    return {kind: f"{limited[kind]}/{totals[kind]} limited" for kind in totals}
+
+random.seed(1810)
+print("Local buckets")
+for clients in (1, 1000, 100000):
+    print(f"  {clients:>6} clients: {overhead(RequestGate(lambda: 3), clients) * 1e6:.2f} us per request")
+print(f"  scanner isolation: {scanner_isolation(RequestGate(lambda: 3))}")
+
+client = redis.Redis(host=os.environ.get("REDIS_HOST", "localhost"), socket_timeout=1)
+try:
+    client.ping()
+except redis.RedisError:
+    print("\nRedis not reachable, skipping shared buckets")
+else:
+    print("\nRedis-shared buckets")
+    for clients in (1, 1000, 100000):
+        print(f"  {clients:>6} clients: {overhead(RequestGate(lambda: 3, client), clients, requests=20000) * 1e6:.2f} us per request")
+    for key in client.scan_iter("ratelimit:*", count=10000):
+        client.delete(key)
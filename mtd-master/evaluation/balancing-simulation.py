@@ -0,0 +1,95 @@
+import heapq
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from balancing import STRATEGIES
+
+class SimulatedPod:
+    def __init__(self, pod_name, base_latency, error_rate=0.0, weight=1):
+        self.pod_name = pod_name
+        self.pod_ip = pod_name
+        self.base_latency = base_latency
+        self.error_rate = error_rate
+        self.weight = weight
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def simulate(strategy, pods, arrival_rate=200, duration=120, seed=7):
+    """
+    Discrete-event simulation of the LB in front of pods whose latency grows with
+    their queue. Returns latency percentiles and the error rate seen by clients.
+    """
+    rng = random.Random(seed)
+    random.seed(seed)
+    now = 0.0
+    balancer = STRATEGIES[strategy](clock=lambda: now)
+    inflight = {pod.pod_name: 0 for pod in pods}
+    events = []
+    latencies = []
+    errors = 0
+
+    arrival = 0.0
+    while arrival < duration:
+        arrival += rng.expovariate(arrival_rate)
+        heapq.heappush(events, (arrival, 0, None, None, None))
+
+    sequence = 0
+    while events:
+        now, kind, pod, started, ok = heapq.heappop(events)
+        if kind == 0:
+            pod = balancer.pick(pods)
+            balancer.acquire(pod)
+            inflight[pod.pod_name] += 1
+            ok = rng.random() >= pod.error_rate
+            # Processor sharing: every request already on the pod slows this one down
+            service = pod.base_latency * (1 + 0.2 * (inflight[pod.pod_name] - 1)) * rng.uniform(0.8, 1.2)
+            if not ok:
+                service = 0.002
+            sequence += 1
+            heapq.heappush(events, (now + service, 1 + sequence, pod, now, ok))
+        else:
+            latency = now - started
+            inflight[pod.pod_name] -= 1
+            balancer.report(pod, latency, ok)
+            balancer.release(pod)
+            if ok:
+                latencies.append(latency)
+            else:
+                errors += 1
+
+    total = len(latencies) + errors
+    return {
+        "requests": total,
+        "error_rate": errors / total if total else 0,
+        "p50_latency": percentile(latencies, 50),
+        "p99_latency": percentile(latencies, 99),
+        "p999_latency": percentile(latencies, 99.9)
+    }
+
+def compare_strategies(pods, **kwargs):
+    results = {}
+    for strategy in STRATEGIES:
+        results[strategy] = simulate(strategy, pods, **kwargs)
+        print(f"{strategy:>6}: p50 {results[strategy]['p50_latency']*1000:7.1f} ms, "
+              f"p99 {results[strategy]['p99_latency']*1000:7.1f} ms, "
+              f"p99.9 {results[strategy]['p999_latency']*1000:7.1f} ms, "
+              f"errors {results[strategy]['error_rate']*100:.2f}%")
+    return results
+
+# Eight webapp pods: one slow (e.g. starting up during a rotation) and one failing
+simulated_pods = [SimulatedPod(f"webapp-{i}", 0.010) for i in range(6)]
+simulated_pods.append(SimulatedPod("webapp-slow", 0.080))
+simulated_pods.append(SimulatedPod("webapp-failing", 0.010, error_rate=0.5))
+
+print("Steady state with one slow and one failing pod")
+balancing_results = compare_strategies(simulated_pods)
+random_p99 = balancing_results["random"]["p99_latency"]
+for strategy, result in balancing_results.items():
+    if strategy != "random" and random_p99 > 0:
+        print(f"{strategy} p99 improvement over random: {(1 - result['p99_latency'] / random_p99)*100:.1f}%")
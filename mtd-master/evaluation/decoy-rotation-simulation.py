@@ -0,0 +1,137 @@
+import itertools
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+from decoy_pod_manager import DecoyPodManager
+from pod_cache import PodInformer
+
+class FakeApiServer:
+    """
+    Stand-in for CoreV1Api and its watch: every call takes api_latency seconds,
+    and a created pod turns Running and Ready startup_seconds later
+    """
+
+    def __init__(self, api_latency=0.05, startup_seconds=0.3):
+        self.api_latency = api_latency
+        self.startup_seconds = startup_seconds
+        self.pods = {}
+        self.version = itertools.count(1)
+        self.names = itertools.count(1)
+        self.watchers = []
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _call(self):
+        with self.lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.api_latency)
+        with self.lock:
+            self.in_flight -= 1
+
+    def _emit(self, event_type, pod):
+        with self.lock:
+            pod.metadata.resource_version = str(next(self.version))
+            if event_type == "DELETED":
+                self.pods.pop(pod.metadata.name, None)
+            else:
+                self.pods[pod.metadata.name] = pod
+            for watcher in self.watchers:
+                watcher.put({"type": event_type, "object": pod})
+
+    def create_namespaced_pod(self, namespace, body):
+        self._call()
+        pod = client.V1Pod(
+            metadata=client.V1ObjectMeta(name=f"{body.metadata.generate_name}{next(self.names)}", labels=dict(body.metadata.labels)),
+            status=client.V1PodStatus(phase="Pending")
+        )
+        self._emit("ADDED", pod)
+        threading.Timer(self.startup_seconds, self._start_pod, (pod.metadata.name,)).start()
+        return pod
+
+    def _start_pod(self, name):
+        pod = self.pods.get(name)
+        if pod is not None:
+            pod.status = client.V1PodStatus(phase="Running", pod_ip="10.0.0.1", conditions=[client.V1PodCondition(type="Ready", status="True")])
+            self._emit("MODIFIED", pod)
+
+    def delete_namespaced_pod(self, name, namespace, **kwargs):
+        self._call()
+        pod = self.pods.get(name)
+        if pod is None:
+            raise ApiException(status=404, reason="Not Found")
+        self._emit("DELETED", pod)
+
+    def list_namespaced_pod(self, namespace, **kwargs):
+        with self.lock:
+            return client.V1PodList(items=list(self.pods.values()), metadata=client.V1ListMeta(resource_version=str(next(self.version))))
+
+    def decoys(self):
+        with self.lock:
+            return sum(1 for pod in self.pods.values() if pod.metadata.labels.get("app") == "decoy" and pod.status.phase == "Running")
+
+class FakeWatch:
+    def __init__(self, server):
+        self.server = server
+        self.events = queue.Queue()
+        self.stopped = False
+
+    def stream(self, func, **kwargs):
+        with self.server.lock:
+            self.server.watchers.append(self.events)
+        while not self.stopped:
+            try:
+                yield self.events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def stop(self):
+        self.stopped = True
+
+def simulate(target, workers, rotations=3):
+    """Rotate target decoys a few times, watching that some are always running"""
+    server = FakeApiServer()
+    informer = PodInformer(server, "default", watch_factory=lambda: FakeWatch(server))
+    informer.start()
+    DecoyPodManager.TARGET = target
+    DecoyPodManager.WORKERS = workers
+    manager = DecoyPodManager("default", informer, k8s_api=server)
+    manager.rotate()
+
+    minimum = [target]
+    sampling = threading.Event()
+
+    def sample():
+        while not sampling.is_set():
+            minimum[0] = min(minimum[0], server.decoys())
+            time.sleep(0.005)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    durations = []
+    for _ in range(rotations):
+        started = time.perf_counter()
+        manager.rotate()
+        durations.append(time.perf_counter() - started)
+    sampling.set()
+    sampler.join()
+
+    manager.stop()
+    informer.stop()
+    return sum(durations) / len(durations), minimum[0], server.max_in_flight, server.decoys()
+
+print(f"API latency {FakeApiServer().api_latency * 1000:.0f} ms per call, pods start in {FakeApiServer().startup_seconds * 1000:.0f} ms\n")
+print(f"{'decoys':>6} {'workers':>7} {'rotation':>9} {'min running':>11} {'max in flight':>13} {'running after':>13}")
+for target in (3, 6, 12, 24):
+    for workers in (1, 32):
+        rotation, minimum, in_flight, running = simulate(target, workers)
+        print(f"{target:>6} {workers:>7} {rotation * 1000:>7.0f}ms {minimum:>11} {in_flight:>13} {running:>13}")
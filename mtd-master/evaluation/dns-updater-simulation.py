@@ -0,0 +1,81 @@
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from botocore.exceptions import ClientError
+from dns_updater import DnsUpdater
+
+class FakeRoute53:
+    """
+    Stand-in for the Route 53 client: changes stay PENDING for a while, and
+    a share of the calls fail with throttling errors
+    """
+
+    def __init__(self, failure_rate=0.2, propagation_seconds=0.5):
+        self.failure_rate = failure_rate
+        self.propagation_seconds = propagation_seconds
+        self.changes = {}
+        self.record = None
+        self.calls = {"change_resource_record_sets": 0, "get_change": 0}
+        self.lock = threading.Lock()
+
+    def _maybe_fail(self, operation):
+        if random.random() < self.failure_rate:
+            raise ClientError({"Error": {"Code": "Throttling", "Message": "Rate exceeded"}}, operation)
+
+    def change_resource_record_sets(self, HostedZoneId, ChangeBatch):
+        with self.lock:
+            self.calls["change_resource_record_sets"] += 1
+        self._maybe_fail("ChangeResourceRecordSets")
+        change_id = f"/change/C{len(self.changes)}"
+        self.changes[change_id] = time.monotonic() + self.propagation_seconds
+        self.record = [value["Value"] for value in ChangeBatch["Changes"][0]["ResourceRecordSet"]["ResourceRecords"]]
+        return {"ChangeInfo": {"Id": change_id, "Status": "PENDING"}}
+
+    def get_change(self, Id):
+        with self.lock:
+            self.calls["get_change"] += 1
+        self._maybe_fail("GetChange")
+        return {"ChangeInfo": {"Id": Id, "Status": "INSYNC" if time.monotonic() >= self.changes[Id] else "PENDING"}}
+
+def simulate(rotations=20, updates_per_rotation=5, rotation_interval=1.0, **fake_options):
+    """
+    Fire bursts of updates as a rotation would (standby cutover, ejections,
+    retries) and count what actually reaches Route 53
+    """
+    fake = FakeRoute53(**fake_options)
+    DnsUpdater.DEBOUNCE_SECONDS = 0.2
+    DnsUpdater.BACKOFF_BASE = 0.05
+    updater = DnsUpdater(client=fake, hosted_zone_id="Z123", domain_name="app.example.com")
+    updater.start()
+
+    update_latency = []
+    expected = None
+    for rotation in range(rotations):
+        pods = [f"10.0.{rotation}.{i}" for i in range(1, 4)]
+        for i in range(updates_per_rotation):
+            started = time.perf_counter()
+            updater.update(pods[:min(len(pods), 1 + i)])
+            update_latency.append(time.perf_counter() - started)
+        expected = sorted(pods)
+        time.sleep(rotation_interval)
+
+    time.sleep(2)
+    updater.stop()
+    return {
+        "updates": updater.stats["requested"],
+        "coalesced": updater.stats["coalesced"],
+        "changes_sent": fake.calls["change_resource_record_sets"],
+        "status_polls": fake.calls["get_change"],
+        "failures_retried": updater.stats["failures"],
+        "final_record_correct": fake.record == expected,
+        "max_update_call_ms": max(update_latency) * 1000,
+    }
+
+result = simulate()
+print(f"{result['updates']} updates ({result['coalesced']} coalesced) -> {result['changes_sent']} Route 53 changes, "
+      f"{result['status_polls']} status polls, {result['failures_retried']} failures retried")
+print(f"Final record correct: {result['final_record_correct']}, slowest update() call: {result['max_update_call_ms']:.3f} ms")
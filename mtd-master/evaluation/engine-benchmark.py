@@ -0,0 +1,66 @@
+import asyncio
+import time
+import aiohttp
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_load(url, concurrency=200, duration=30):
+    """
+    Keep `concurrency` requests in flight against url for `duration` seconds
+    """
+    latencies = []
+    errors = 0
+    end_time = time.perf_counter() + duration
+
+    async def worker(session):
+        nonlocal errors
+        while time.perf_counter() < end_time:
+            start = time.perf_counter()
+            try:
+                async with session.get(url) as response:
+                    await response.read()
+                    if response.status == 200:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+            except Exception:
+                errors += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_second": len(latencies) / elapsed if elapsed > 0 else 0,
+        "p50_latency": percentile(latencies, 50),
+        "p99_latency": percentile(latencies, 99)
+    }
+
+def compare_engines(engines, path="/health", concurrency=200, duration=30):
+    """
+    Run the same load against each engine, e.g. {"flask": url, "asyncio": url}
+    """
+    results = {}
+    for name, base_url in engines.items():
+        results[name] = asyncio.run(run_load(f"{base_url}{path}", concurrency=concurrency, duration=duration))
+        print(f"{name}: {results[name]['requests_per_second']:.0f} req/s, "
+              f"p50 {results[name]['p50_latency']*1000:.1f} ms, "
+              f"p99 {results[name]['p99_latency']*1000:.1f} ms, "
+              f"{results[name]['errors']} errors")
+    return results
+
+# Start one load balancer with LB_ENGINE=flask and one with LB_ENGINE=asyncio
+engine_results = compare_engines({
+    "flask": "http://127.0.0.1:51417",
+    "asyncio": "http://127.0.0.1:51418"
+})
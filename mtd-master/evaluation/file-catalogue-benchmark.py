@@ -0,0 +1,55 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webapp1"))
+from file_catalogue import FileCatalogue
+
+def populate(directory, catalogue, user, count):
+    """Create count empty files for user on disk and in the catalogue"""
+    user_dir = os.path.join(directory, user)
+    os.makedirs(user_dir, exist_ok=True)
+    with catalogue.connection() as connection:
+        for i in range(count):
+            name = f"file-{i:07d}.bin"
+            open(os.path.join(user_dir, name), "wb").close()
+            connection.execute(
+                "INSERT OR REPLACE INTO files (user, name, size, created, content_id) VALUES (?, ?, ?, ?, ?)",
+                (user, name, i, time.time(), None)
+            )
+    return user_dir
+
+def directory_scan(user_dir):
+    """What list_files used to do: listdir plus a stat per file"""
+    files = []
+    for filename in os.listdir(user_dir):
+        filepath = os.path.join(user_dir, filename)
+        if os.path.isfile(filepath):
+            files.append({"name": filename, "size": os.path.getsize(filepath)})
+    return files
+
+def time_call(function, repeat=5):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+def benchmark(count, page_size=100):
+    with tempfile.TemporaryDirectory() as directory:
+        catalogue = FileCatalogue(os.path.join(directory, "catalogue.db"))
+        user_dir = populate(directory, catalogue, "benchmark", count)
+
+        _, cursor = catalogue.page("benchmark", limit=count // 2)
+        return {
+            "scan_ms": time_call(lambda: directory_scan(user_dir)),
+            "first_page_ms": time_call(lambda: catalogue.page("benchmark", limit=page_size)),
+            "deep_page_ms": time_call(lambda: catalogue.page("benchmark", limit=page_size, cursor=cursor)),
+            "by_size_ms": time_call(lambda: catalogue.page("benchmark", sort="size", descending=True, limit=page_size)),
+        }
+
+for count in (10000, 100000):
+    result = benchmark(count)
+    print(f"{count} files: directory scan {result['scan_ms']:.1f} ms, "
+          f"first page {result['first_page_ms']:.2f} ms, middle page {result['deep_page_ms']:.2f} ms, "
+          f"largest first {result['by_size_ms']:.2f} ms")
@@ -0,0 +1,119 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from admission import RateLimiter, RequestGate
+from traffic_classifier import TrafficClassifier
+
+BROWSERS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "python-requests/2.32.3",
+    "curl/8.5.0",
+]
+SCANNERS = ["sqlmap/1.7.2#stable (https://sqlmap.org)", "Mozilla/5.00 (Nikto/2.5.0)", "Mozilla/5.0 zgrab/0.x", "Nuclei - Open-source project (github.com/projectdiscovery/nuclei)"]
+PROBES = ["/.env", "/.git/config", "/wp-login.php", "/phpmyadmin/", "/cgi-bin/luci", "/actuator/health", "/server-status", "/download/..%2f..%2fetc/passwd", "/xmlrpc.php"]
+WORDLIST = ["admin", "backup", "old", "test", "api", "v1", "private", "uploads", "static", "logs", "db", "config", "dev", "tmp", "secret"]
+FILES = ["sample1.txt", "sample2.txt", "sample3.txt", "report.pdf", "data.csv", "backup.sql", "notes.md"]
+
+def legitimate_session(ip, start):
+    """A user logging in, browsing and downloading at human speed"""
+    agent = random.choice(BROWSERS)
+    now = start
+    requests = [("PUT", f"/login/user{ip.split('.')[-1]}", 200), ("GET", "/", 200), ("GET", "/ui", 200)]
+    for _ in range(random.randint(5, 40)):
+        roll = random.random()
+        if roll < 0.4:
+            requests.append(("GET", f"/files?sort={random.choice(['name', 'size', 'created'])}&limit=50", 200))
+        elif roll < 0.8:
+            name = random.choice(FILES)
+            requests.append(("GET", f"/download/{name}", 200 if random.random() < 0.95 else 404))
+        elif roll < 0.9:
+            requests.append(("POST", "/upload", 200))
+        else:
+            requests.append(("GET", "/health", 200))
+    for method, path, status in requests:
+        now += random.expovariate(1 / 2.0)
+        yield now, ip, agent, path, status, False
+
+def scanner(ip, start):
+    agent = random.choice(SCANNERS)
+    now = start
+    for _ in range(random.randint(50, 300)):
+        now += random.expovariate(1 / 0.02)
+        yield now, ip, agent, random.choice(PROBES + [f"/{word}" for word in WORDLIST]), 404, True
+
+def stealth_bruteforce(ip, start):
+    """Browser user agent, guessing paths slowly enough to stay under the request rate"""
+    agent = BROWSERS[0]
+    now = start
+    for word in random.sample(WORDLIST, len(WORDLIST)) * 3:
+        now += random.expovariate(1 / 0.2)
+        yield now, ip, agent, f"/{word}/{random.randint(1, 999)}", 404, True
+
+def flood(ip, start):
+    """A browser-looking client hammering a valid page"""
+    now = start
+    for _ in range(3000):
+        now += random.expovariate(1 / 0.005)
+        yield now, ip, BROWSERS[2], "/files", 200, True
+
+def injection(ip, start):
+    now = start
+    for payload in ["1' OR '1'='1", "1 UNION SELECT password FROM users", "<script>alert(1)</script>", "${jndi:ldap://x/a}", "x; cat /etc/passwd"]:
+        now += random.expovariate(1 / 1.0)
+        yield now, ip, BROWSERS[1], f"/files?sort={payload.replace(' ', '%20')}", 200, True
+
+def build_trace(users=2000, attackers=40, duration=600):
+    random.seed(1810)
+    events = []
+    for i in range(users):
+        events.extend(legitimate_session(f"10.1.{i // 250}.{i % 250}", random.uniform(0, duration)))
+    kinds = [scanner, stealth_bruteforce, flood, injection]
+    for i in range(attackers):
+        events.extend(kinds[i % len(kinds)](f"203.0.113.{i}", random.uniform(0, duration)))
+    events.sort(key=lambda event: event[0])
+    return events
+
+def replay(events):
+    clock = [0.0]
+    classifier = TrafficClassifier(clock=lambda: clock[0])
+    # Both engines only classify what the per-client rate limit lets through
+    limiter = RateLimiter("client", RequestGate.CLIENT_RATE, RequestGate.CLIENT_BURST, clock=lambda: clock[0])
+    legitimate = diverted_legitimate = attacks = caught = throttled = throttled_legitimate = 0
+    attack_ips = set()
+    caught_ips = set()
+    started = time.perf_counter()
+    for now, ip, agent, path, status, attack in events:
+        clock[0] = now
+        if limiter.check(ip):
+            throttled += 1
+            throttled_legitimate += not attack
+            attacks += attack
+            legitimate += not attack
+            continue
+        reason = classifier.classify(ip, path, agent)
+        if reason is None:
+            classifier.observe(ip, status)
+        if attack:
+            attacks += 1
+            attack_ips.add(ip)
+            if reason:
+                caught += 1
+                caught_ips.add(ip)
+        else:
+            legitimate += 1
+            diverted_legitimate += reason is not None
+    elapsed = time.perf_counter() - started
+    return elapsed, legitimate, diverted_legitimate, attacks, caught, len(attack_ips), len(caught_ips), throttled, throttled_legitimate, classifier.stats
+
+events = build_trace()
+elapsed, legitimate, false_positives, attacks, caught, attack_ips, caught_ips, throttled, throttled_legitimate, stats = replay(events)
+print(f"Replayed {len(events)} requests in {elapsed:.3f}s: {len(events) / elapsed:,.0f} requests/s, {elapsed / len(events) * 1e6:.2f} us per request")
+print(f"Legitimate requests: {legitimate}, diverted: {false_positives} (false-positive rate {false_positives / legitimate:.4%})")
+print(f"Attack requests: {attacks}, diverted: {caught} ({caught / attacks:.2%}); attackers caught {caught_ips}/{attack_ips}")
+print(f"Throttled by the rate limit before classification: {throttled} ({throttled_legitimate} legitimate)")
+print(f"Diverted requests by reason: { {key: value for key, value in stats.items() if key not in ('classified', 'diverted')} }")
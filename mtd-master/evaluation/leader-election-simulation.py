@@ -0,0 +1,295 @@
+import copy
+import datetime
+import heapq
+import itertools
+import logging
+import os
+import queue
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+import pod_registry
+from balancing import create_balancer
+from improved_k8s_controller import KubernetesController
+from leader_election import LeaderElector
+from pod_cache import PodInformer
+from pod_registry import PodRegistry
+
+""" Leader election between load-balancer replicas against a fake Lease API, and followers tracking the leader's pod roles """
+
+DAYS = 2
+REPLICAS = 2
+CRASHES_PER_DAY = 8          # the leader dies without releasing the Lease
+PARTITIONS_PER_DAY = 12      # the leader cannot reach the API server for a while
+RESTARTS_PER_DAY = 2         # rolling updates: the leader shuts down and releases the Lease
+RESTART_SECONDS = 20
+CLOCK_DRIFT = 0.001          # replicas' clocks run up to this much fast or slow
+
+class FakeLeaseApi:
+    """Stand-in for CoordinationV1Api: one Lease store with resourceVersion conflicts, and replicas that can be cut off"""
+
+    def __init__(self):
+        self.leases = {}
+        self.version = itertools.count(1)
+        self.unreachable = set()
+        self.calls = Counter()
+
+    def for_replica(self, identity):
+        return FakeLeaseClient(self, identity)
+
+class FakeLeaseClient:
+    def __init__(self, api, identity):
+        self.api = api
+        self.identity = identity
+
+    def _call(self, verb):
+        if self.identity in self.api.unreachable:
+            raise ApiException(status=503, reason="Service Unavailable")
+        self.api.calls[verb] += 1
+
+    def read_namespaced_lease(self, name, namespace):
+        self._call("get")
+        if name not in self.api.leases:
+            raise ApiException(status=404, reason="Not Found")
+        return copy.deepcopy(self.api.leases[name])
+
+    def create_namespaced_lease(self, namespace, body):
+        self._call("create")
+        if body.metadata.name in self.api.leases:
+            raise ApiException(status=409, reason="AlreadyExists")
+        lease = copy.deepcopy(body)
+        lease.metadata.resource_version = str(next(self.api.version))
+        self.api.leases[body.metadata.name] = lease
+        return copy.deepcopy(lease)
+
+    def replace_namespaced_lease(self, name, namespace, body):
+        self._call("update")
+        current = self.api.leases.get(name)
+        if current is None or current.metadata.resource_version != body.metadata.resource_version:
+            raise ApiException(status=409, reason="Conflict")
+        lease = copy.deepcopy(body)
+        lease.metadata.resource_version = str(next(self.api.version))
+        self.api.leases[name] = lease
+        return copy.deepcopy(lease)
+
+def elect(seed=2505):
+    """Discrete-event run of REPLICAS electors over DAYS, with crashes, partitions and restarts of the leader"""
+    rng = random.Random(seed)
+    api = FakeLeaseApi()
+    now = [0.0]
+    horizon = DAYS * 86400
+    events = []
+    sequence = itertools.count()
+    replicas = {}
+    started = itertools.count()
+
+    def schedule(at, kind, data=None):
+        heapq.heappush(events, (at, next(sequence), kind, data))
+
+    def launch(at):
+        identity = f"load-balancer-{next(started)}"
+        rate = 1 + rng.uniform(-CLOCK_DRIFT, CLOCK_DRIFT)
+        elector = LeaderElector("default", lambda: None, lambda: None, coordination_api=api.for_replica(identity), identity=identity,
+                                clock=lambda: now[0] * rate,
+                                wall_clock=lambda: datetime.datetime.fromtimestamp(now[0], datetime.timezone.utc))
+        elector.logger.setLevel(logging.CRITICAL)
+        replicas[identity] = elector
+        schedule(at, "step", identity)
+
+    def leader():
+        leaders = [identity for identity, elector in replicas.items() if elector.is_leader]
+        return leaders[0] if leaders else None
+
+    for _ in range(REPLICAS):
+        launch(0.0)
+    for kind, per_day in (("crash", CRASHES_PER_DAY), ("partition", PARTITIONS_PER_DAY), ("restart", RESTARTS_PER_DAY)):
+        at = rng.expovariate(per_day / 86400)
+        while at < horizon:
+            schedule(at, kind)
+            at += rng.expovariate(per_day / 86400)
+
+    dual = leaderless = 0.0
+    outages = defaultdict(list)      # cause -> seconds without a leader
+    cause, outage_started = "startup", 0.0
+    transitions = 0
+    previous = None
+
+    while events:
+        at, _, kind, data = heapq.heappop(events)
+        if at > horizon:
+            break
+        leaders = sum(1 for elector in replicas.values() if elector.is_leader)
+        if leaders > 1:
+            dual += at - now[0]
+        elif leaders == 0:
+            leaderless += at - now[0]
+        now[0] = at
+
+        if kind == "step":
+            elector = replicas.get(data)
+            if elector is None:
+                continue
+            elector.step()
+            delay = elector.RETRY_PERIOD_SECONDS * (1 if elector.is_leader else rng.uniform(1, 1.2))
+            schedule(at + delay, "step", data)
+        elif kind == "heal":
+            api.unreachable.discard(data)
+        else:
+            current = leader()
+            if current is None:
+                continue
+            if kind == "partition":
+                api.unreachable.add(current)
+                schedule(at + rng.uniform(3, 40), "heal", current)
+            else:
+                if kind == "restart":
+                    replicas[current].stop()
+                del replicas[current]
+                launch(at + RESTART_SECONDS)
+            cause = kind
+
+        current = leader()
+        if current != previous:
+            if current is None:
+                outage_started = at
+            else:
+                transitions += 1
+                outages[cause].append(at - outage_started)
+            previous = current
+
+    calls = sum(api.calls.values())
+    return dual, leaderless / horizon, outages, transitions, calls / horizon * 60 / REPLICAS, api.calls
+
+class FakeApiServer:
+    """Stand-in for CoreV1Api with a pod watch: label patches turn into MODIFIED events"""
+
+    def __init__(self, api_latency=0.005):
+        self.api_latency = api_latency
+        self.pods = {}
+        self.version = itertools.count(1)
+        self.watchers = []
+        self.lock = threading.Lock()
+        self.calls = Counter()
+
+    def _emit(self, event_type, pod):
+        with self.lock:
+            pod.metadata.resource_version = str(next(self.version))
+            self.pods[pod.metadata.name] = pod
+            for watcher in self.watchers:
+                watcher.put({"type": event_type, "object": copy.deepcopy(pod)})
+
+    def add_pod(self, name, ip, label):
+        pod = client.V1Pod(
+            metadata=client.V1ObjectMeta(name=name, labels={"app": "webapp", "mtd-rotation": label}),
+            status=client.V1PodStatus(phase="Running", pod_ip=ip, conditions=[client.V1PodCondition(type="Ready", status="True")])
+        )
+        self._emit("ADDED", pod)
+
+    def patch_namespaced_pod(self, name, namespace, body):
+        self.calls[threading.current_thread().name] += 1
+        time.sleep(self.api_latency)
+        pod = copy.deepcopy(self.pods[name])
+        pod.metadata.labels.update(body["metadata"]["labels"])
+        self._emit("MODIFIED", pod)
+
+    def list_namespaced_pod(self, namespace, **kwargs):
+        self.calls[threading.current_thread().name] += 1
+        with self.lock:
+            return client.V1PodList(items=[copy.deepcopy(pod) for pod in self.pods.values()],
+                                    metadata=client.V1ListMeta(resource_version=str(next(self.version))))
+
+class FakeWatch:
+    def __init__(self, server):
+        self.server = server
+        self.events = queue.Queue()
+        self.stopped = False
+
+    def stream(self, func, **kwargs):
+        with self.server.lock:
+            self.server.watchers.append(self.events)
+        while not self.stopped:
+            try:
+                yield self.events.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+    def stop(self):
+        self.stopped = True
+
+def replica(server, leading):
+    """A controller with only what following and labelling roles use: pod cache, registry and balancer"""
+    controller = KubernetesController.__new__(KubernetesController)
+    controller.k8s_api = server
+    controller.logger = logging.getLogger("leader-election-simulation")
+    controller.app_labels = {"app": "webapp"}
+    controller.pod_cache = PodInformer(server, "default", watch_factory=lambda: FakeWatch(server))
+    controller.pod_cache.logger.setLevel(logging.WARNING)
+    controller.pod_cache.start()
+    controller.registry = PodRegistry()
+    controller.balancer = create_balancer("p2c")
+    controller.role_version = -1
+    controller.leadership_lock = threading.Lock()
+    controller.elector = LeaderElector("default", lambda: None, lambda: None)
+    controller.elector.leader = leading
+    return controller
+
+def follow_rotations(rotations=20, followers=3, size=3):
+    """The leader cuts over and labels roles; followers only watch, and must switch without an empty pool"""
+    pod_registry.POD_LOGGER.setLevel(logging.WARNING)
+    server = FakeApiServer()
+    for i in range(size):
+        server.add_pod(f"webapp-0-{i}", f"10.0.0.{i}", "0")
+    leader = replica(server, True)
+    replicas = [replica(server, False) for _ in range(followers)]
+    leader.pod_cache.wait_for(lambda: len(leader.pod_cache.pods()) == size, timeout=5)
+    leader._follow()
+    leader.label_roles()
+    server.calls.clear()
+
+    lags, empty = [], 0
+    for number in range(1, rotations + 1):
+        for i in range(size):
+            server.add_pod(f"webapp-{number}-{i}", f"10.{number}.0.{i}", str(number))
+        leader.pod_cache.wait_for(lambda: len(leader.pod_cache.pods({"mtd-rotation": str(number)})) == size, timeout=5)
+        pods = [leader.registry.record(f"webapp-{number}-{i}", f"10.{number}.0.{i}", label=str(number)) for i in range(size)]
+        leader.registry.set_standby(pods)
+        leader.label_roles()
+        started = time.perf_counter()
+        retired = leader.registry.cutover(pods)
+        leader.label_roles()
+        leader.registry.forget(retired)
+        pending = list(replicas)
+        while pending:
+            for follower in list(pending):
+                follower.follow()
+                active = follower.registry.snapshot.active
+                empty += not active
+                if {pod.label for pod in active} == {str(number)}:
+                    lags.append(time.perf_counter() - started)
+                    pending.remove(follower)
+            time.sleep(0.0005)
+
+    for controller in [leader] + replicas:
+        controller.pod_cache.stop()
+    patches = server.calls["MainThread"] / rotations
+    return statistics.mean(lags), max(lags), empty, patches
+
+dual, unavailable, outages, transitions, per_minute, calls = elect()
+print(f"{DAYS} days, {REPLICAS} replicas, lease {LeaderElector.LEASE_DURATION_SECONDS:.0f}s, renew deadline "
+      f"{LeaderElector.RENEW_DEADLINE_SECONDS:.0f}s, retry {LeaderElector.RETRY_PERIOD_SECONDS:.0f}s")
+print(f"Time with two leaders: {dual:.1f}s; without a leader: {unavailable:.4%}; {transitions} leadership changes")
+for cause, seconds in sorted(outages.items()):
+    print(f"  {cause:9s} {len(seconds):4d} times, without a leader for {statistics.mean(seconds):5.1f}s on average, {max(seconds):5.1f}s at most")
+print(f"Lease API calls per replica: {per_minute:.1f} a minute ({dict(calls)})")
+
+mean_lag, max_lag, empty, patches = follow_rotations()
+print(f"Followers switch generations {mean_lag * 1000:.1f} ms after the cutover on average, {max_lag * 1000:.1f} ms at most; "
+      f"empty pools seen: {empty}")
+print(f"Kubernetes API calls per rotation: {patches:.0f} pod label patches by the leader, none by the followers")
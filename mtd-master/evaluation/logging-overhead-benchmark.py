@@ -0,0 +1,94 @@
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+import utils
+
+class Sink:
+    """stdout as seen from a container: every write is a syscall, and a slow log collector makes some of them wait"""
+    def __init__(self, stall_every=0, stall_seconds=0.0):
+        self.writes = 0
+        self.stall_every = stall_every
+        self.stall_seconds = stall_seconds
+        self.devnull = open(os.devnull, "w")
+
+    def write(self, text):
+        self.writes += 1
+        if self.stall_every and self.writes % self.stall_every == 0:
+            time.sleep(self.stall_seconds)
+        self.devnull.write(text)
+
+    def flush(self):
+        self.devnull.flush()
+
+def legacy_logger(sink, *labels):
+    """The old utils.create_stdout_logger: a synchronous handler added on every call"""
+    logger = logging.getLogger(" - ".join(labels))
+    logger.setLevel(logging.DEBUG)
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(utils.TEXT_FORMAT))
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+def pipeline_logger(sink, name, queue_size=utils.LOG_QUEUE_SIZE):
+    stream = logging.StreamHandler(sink)
+    stream.setFormatter(utils.JsonFormatter())
+    log_queue = queue.Queue(queue_size)
+    listener = logging.handlers.QueueListener(log_queue, stream)
+    listener.start()
+    handler = utils.DroppingQueueHandler(log_queue)
+    logger = logging.getLogger(name)
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    logger.propagate = False
+    return logger, handler, log_queue
+
+def per_request(log, requests=100000):
+    """The routing log line of one proxied request"""
+    url = "http://10.244.1.17:8080/download/large.txt"
+    started = time.perf_counter()
+    for _ in range(requests):
+        log("GET", "/download/large.txt", url)
+    return (time.perf_counter() - started) / requests * 1e6
+
+def run(sink):
+    legacy = legacy_logger(sink, f"legacy-{uuid.uuid4().hex[:6]}")
+    results = {"no logging": per_request(lambda method, path, url: None)}
+    results["legacy, every request"] = per_request(lambda method, path, url: legacy.info(f"Routing to {url}"))
+    dropped = 0
+    for name, rate in [("queued JSON, every request", 1), (f"queued JSON, sampled {utils.REQUEST_LOG_SAMPLE_RATE:g}", utils.REQUEST_LOG_SAMPLE_RATE)]:
+        logger, handler, log_queue = pipeline_logger(sink, f"pipeline-{uuid.uuid4().hex[:6]}")
+        sampled = utils.SampledLogger(logger, rate)
+        results[name] = per_request(lambda method, path, url: sampled.info("Routing %s %s to %s", method, path, url))
+        # Let the writer catch up so the next measurement does not share the CPU with it
+        log_queue.join()
+        dropped += handler.dropped
+    return results, dropped
+
+for title, sink in [("Fast stdout", Sink()), ("Log collector stalling 1 ms every 100 lines", Sink(stall_every=100, stall_seconds=0.001))]:
+    results, dropped = run(sink)
+    print(title)
+    for name, micros in results.items():
+        print(f"  {name:32s} {micros:7.2f} us per request")
+    print(f"  records dropped instead of blocking: {dropped}")
+
+def rotations(create, rounds=200, pods=3):
+    before = len(logging.Logger.manager.loggerDict)
+    handlers = set()
+    for _ in range(rounds):
+        for _ in range(pods):
+            logger = create(f"webapp-{uuid.uuid4().hex[:10]}")
+            handlers.update(logger.logger.handlers if isinstance(logger, logging.LoggerAdapter) else logger.handlers)
+    return len(logging.Logger.manager.loggerDict) - before, len(handlers)
+
+sink = Sink()
+print("Loggers created by 200 rotations of 3 pods (one per tracked pod before, one bound logger now):")
+print("  legacy:   {} loggers, {} handlers attached".format(*rotations(lambda pod: legacy_logger(sink, pod))))
+shared = utils.create_stdout_logger(logging.DEBUG, "kubernetes-app")
+print("  pipeline: {} loggers, {} handlers attached".format(*rotations(lambda pod: utils.bind(shared, pod=pod))))
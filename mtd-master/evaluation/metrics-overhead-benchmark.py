@@ -0,0 +1,58 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+import metrics
+
+registry = metrics.Registry()
+REQUESTS = metrics.Counter("bench_requests_total", "Requests", ["outcome"], registry=registry)
+LATENCY = metrics.Histogram("bench_latency_seconds", "Latency per backend", ["backend"], registry=registry)
+INFLIGHT = metrics.Gauge("bench_inflight", "In flight", registry=registry)
+
+def per_call(operation, calls=200000):
+    started = time.perf_counter()
+    for _ in range(calls):
+        operation()
+    return (time.perf_counter() - started) / calls * 1e6
+
+def threaded(operation, threads, calls=50000):
+    """Wall time per call with every thread recording at once"""
+    def run():
+        for _ in range(calls):
+            operation()
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) / (threads * calls) * 1e6
+
+proxied = REQUESTS.labels("proxied")
+backend = LATENCY.labels("webapp-0")
+operations = {
+    "counter inc (bound child)": proxied.inc,
+    "counter labels + inc": lambda: REQUESTS.labels("proxied").inc(),
+    "histogram observe (bound child)": lambda: backend.observe(0.004),
+    "histogram labels + observe": lambda: LATENCY.labels("webapp-0").observe(0.004),
+    "gauge inc + dec": lambda: (INFLIGHT.inc(), INFLIGHT.dec()),
+    "empty loop": lambda: None,
+}
+for name, operation in operations.items():
+    print(f"{name:34s} {per_call(operation):6.2f} us")
+
+for threads in (1, 4, 16):
+    print(f"labels + observe on {threads:2d} threads      {threaded(lambda: LATENCY.labels('webapp-0').observe(0.004), threads):6.2f} us per call")
+
+expected = 2 * 200000 + sum(50000 * threads for threads in (1, 4, 16))
+counted = sum(dict(LATENCY.samples())[("webapp-0",)][:-1])
+print(f"Observations recorded: {counted:.0f} of {expected} (no update lost without a lock)")
+
+for pod in range(64):
+    for _ in range(100):
+        LATENCY.labels(f"webapp-{pod}").observe(pod / 1000)
+started = time.perf_counter()
+text = registry.render()
+print(f"Scrape of {len(text.splitlines())} lines rendered in {(time.perf_counter() - started) * 1000:.2f} ms")
@@ -0,0 +1,74 @@
+import logging
+import os
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+import pod_registry
+from balancing import create_balancer
+from pod_registry import PodRegistry
+
+pod_registry.POD_LOGGER.setLevel(logging.WARNING)
+
+def generation(registry, number, size):
+    return [registry.record(f"webapp-{number}-{i}", f"10.{number // 250 % 250}.{number % 250}.{i}", label=str(number)) for i in range(size)]
+
+def lookups(size):
+    """Finding a pod by name: scanning the pod list as before, against the registry index"""
+    registry = PodRegistry()
+    pods = generation(registry, 1, size)
+    registry.activate(pods)
+    name = pods[-1].pod_name
+    scan = timeit.timeit(lambda: next(pod for pod in pods if pod.pod_name == name), number=20000) / 20000 * 1e6
+    index = timeit.timeit(lambda: registry.get(name), number=20000) / 20000 * 1e6
+    return scan, index
+
+def rotate_under_load(rotations=2000, size=3, readers=4):
+    """Request threads pick pods while the scheduler thread swaps generations as fast as it can"""
+    registry = PodRegistry()
+    balancer = create_balancer("p2c")
+    registry.activate(generation(registry, 0, size))
+    stopped = threading.Event()
+    counts = {"picks": 0, "empty": 0, "mixed": 0}
+
+    def reader():
+        while not stopped.is_set():
+            snapshot = registry.snapshot
+            if not snapshot.active:
+                counts["empty"] += 1
+                continue
+            if len({pod.label for pod in snapshot.active}) != 1:
+                counts["mixed"] += 1
+            balancer.pick(snapshot.active)
+            counts["picks"] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    for number in range(1, rotations + 1):
+        pods = generation(registry, number, size)
+        registry.set_standby(pods)
+        registry.forget(registry.cutover(pods))
+    elapsed = time.perf_counter() - started
+    stopped.set()
+    for thread in threads:
+        thread.join()
+    return elapsed / rotations * 1e6, counts, len(registry.snapshot.tracked)
+
+for size in (3, 30, 300):
+    scan, index = lookups(size)
+    print(f"{size:4d} pods: lookup by name {scan:6.2f} us scanning the list, {index:5.2f} us from the registry index")
+
+per_rotation, counts, tracked = rotate_under_load()
+print(f"Cutover: {per_rotation:.1f} us per generation swap with 4 request threads picking pods")
+print(f"Picks: {counts['picks']}, from an empty pool: {counts['empty']}, from a pool mixing generations: {counts['mixed']}; pods still tracked: {tracked}")
+
+registry = PodRegistry()
+registry.activate(generation(registry, 0, 3))
+stale = registry.snapshot.version
+registry.cutover(generation(registry, 1, 3))
+refilled = registry.activate(generation(registry, 0, 3), expected_version=stale)
+print(f"Refill of the pool from a stale read applied: {refilled}; active generation: {registry.snapshot.active[0].label}")
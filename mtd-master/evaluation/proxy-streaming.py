@@ -0,0 +1,61 @@
+import requests
+import time
+import os
+
+def measure_download(url, runs=5, chunk_size=64 * 1024):
+    """
+    Measure time to first byte and total transfer time of a download
+    """
+    results = []
+
+    for i in range(runs):
+        result = {
+            "run": i,
+            "ttfb": None,
+            "total_time": None,
+            "bytes_received": 0,
+            "error": None
+        }
+        try:
+            start = time.perf_counter()
+            with requests.get(url, stream=True, timeout=300) as response:
+                with open(os.devnull, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if result["ttfb"] is None:
+                            result["ttfb"] = time.perf_counter() - start
+                        f.write(chunk)
+                        result["bytes_received"] += len(chunk)
+            result["total_time"] = time.perf_counter() - start
+        except Exception as e:
+            result["error"] = str(e)
+
+        results.append(result)
+
+    completed = [r for r in results if r["error"] is None and r["ttfb"] is not None]
+    return {
+        "runs": len(results),
+        "completed": len(completed),
+        "avg_ttfb": sum(r["ttfb"] for r in completed) / len(completed) if completed else 0,
+        "avg_total_time": sum(r["total_time"] for r in completed) / len(completed) if completed else 0,
+        "avg_throughput_mb_s": sum(r["bytes_received"] / r["total_time"] for r in completed) / len(completed) / (1024 * 1024) if completed else 0
+    }
+
+def compare_proxy_to_direct(lb_url, pod_url, filename="huge.txt", runs=5):
+    """
+    Compare a download through the load balancer with the same download from a pod
+    """
+    direct = measure_download(f"{pod_url}/download/{filename}", runs=runs)
+    proxied = measure_download(f"{lb_url}/download/{filename}", runs=runs)
+
+    return {
+        "direct": direct,
+        "proxied": proxied,
+        "ttfb_overhead": proxied["avg_ttfb"] - direct["avg_ttfb"],
+        "throughput_ratio": proxied["avg_throughput_mb_s"] / direct["avg_throughput_mb_s"] if direct["avg_throughput_mb_s"] > 0 else 0
+    }
+
+# Run against the load balancer and one webapp pod (e.g. via kubectl port-forward)
+proxy_results = compare_proxy_to_direct("http://127.0.0.1:51417", "http://127.0.0.1:8080")
+print(f"Direct TTFB: {proxy_results['direct']['avg_ttfb']*1000:.1f} ms, through LB: {proxy_results['proxied']['avg_ttfb']*1000:.1f} ms")
+print(f"TTFB overhead: {proxy_results['ttfb_overhead']*1000:.1f} ms")
+print(f"Throughput through LB: {proxy_results['throughput_ratio']*100:.1f}% of direct")
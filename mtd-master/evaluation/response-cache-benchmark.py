@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+import time
+import requests
+
+WEBAPP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webapp1", "enhanced_serve.py")
+# metrics.py is shared with the load balancer
+SHARED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer")
+BASE_URL = "http://127.0.0.1:8080"
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process, from /proc"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def start_webapp(cache_enabled):
+    env = dict(os.environ, PYTHONPATH=SHARED, RESPONSE_CACHE_ENABLED="true" if cache_enabled else "false")
+    process = subprocess.Popen([sys.executable, WEBAPP], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        try:
+            if requests.get(f"{BASE_URL}/ready", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            time.sleep(0.05)
+
+def measure(process, path, requests_count=2000, encoding="gzip, br", revalidate=False):
+    """Bytes on the wire and server CPU per request for one endpoint"""
+    session = requests.Session()
+    session.put(f"{BASE_URL}/login/benchmark")
+    headers = {"Accept-Encoding": encoding}
+    etag = session.get(f"{BASE_URL}{path}", headers=headers).headers.get("ETag")
+    if revalidate and etag:
+        headers["If-None-Match"] = etag
+
+    wire_bytes = 0
+    cpu_before = cpu_seconds(process.pid)
+    for _ in range(requests_count):
+        response = session.get(f"{BASE_URL}{path}", headers=headers, stream=True)
+        wire_bytes += len(response.raw.read(decode_content=False))
+    cpu = cpu_seconds(process.pid) - cpu_before
+    return {"bytes_per_request": wire_bytes / requests_count, "cpu_ms_per_request": cpu / requests_count * 1000}
+
+results = {}
+for cache_enabled in (False, True):
+    process = start_webapp(cache_enabled)
+    try:
+        for path in ("/ui", "/health", "/", "/files"):
+            results[(cache_enabled, path, False)] = measure(process, path)
+            if cache_enabled:
+                results[(cache_enabled, path, True)] = measure(process, path, revalidate=True)
+    finally:
+        process.terminate()
+        process.wait()
+
+for path in ("/ui", "/health", "/", "/files"):
+    before = results[(False, path, False)]
+    after = results[(True, path, False)]
+    revalidated = results[(True, path, True)]
+    print(f"{path}: {before['bytes_per_request']:.0f} -> {after['bytes_per_request']:.0f} bytes "
+          f"({revalidated['bytes_per_request']:.0f} on 304), "
+          f"{before['cpu_ms_per_request']:.3f} -> {after['cpu_ms_per_request']:.3f} ms CPU "
+          f"({revalidated['cpu_ms_per_request']:.3f} on 304)")
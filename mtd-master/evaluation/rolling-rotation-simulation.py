@@ -0,0 +1,193 @@
+import heapq
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from rotation_scheduler import RotationScheduler, RotationSignals
+
+""" Discrete-event simulation of full-swap against rolling rotation: pods used, availability and pod lifetime, offline """
+
+DAYS = 14
+TTL = 3000                 # APP_TTL
+LIVE_APPS = 3              # REPLICAS
+BATCH = 1                  # ROTATION_ROLLING_BATCH
+MAX_SURGE = 1              # ROTATION_ROLLING_MAX_SURGE
+PROVISION_SECONDS = 90     # create the deployment, start and warm the pods
+WARMUP_SECONDS = 60        # a new pod serves at COLD_CAPACITY until its caches are warm
+COLD_CAPACITY = 0.5
+DRAIN_DEADLINE = 300       # transfers still running on a retired pod after this are cut
+POD_RPS = 256              # 64 requests in flight per pod at 0.25 s each
+REQUEST_SECONDS = 0.25
+BASE_RPS = 250
+PEAKS_PER_DAY = 3
+LARGE_FRACTION = 0.0001    # share of requests that are large downloads
+
+def traffic(peaks):
+    """Requests per second: a daily cycle plus a few surges a day"""
+    def rate(t):
+        value = BASE_RPS * (1 + 0.6 * math.sin(2 * math.pi * (t / 86400 - 0.25)))
+        for start, end in peaks:
+            if start <= t < end:
+                value *= 1.8
+        return value
+    return rate
+
+def build_world(seed):
+    rng = random.Random(seed)
+    peaks = []
+    for day in range(DAYS):
+        for _ in range(PEAKS_PER_DAY):
+            start = day * 86400 + rng.uniform(0, 86400)
+            peaks.append((start, start + rng.uniform(600, 1800)))
+    return DAYS * 86400, traffic(peaks)
+
+class Pod:
+    __slots__ = ("activated", "warm_at", "transfers", "deadline")
+
+    def __init__(self, activated):
+        self.activated = activated
+        self.warm_at = activated + WARMUP_SECONDS
+        self.transfers = 0
+        self.deadline = None
+
+def simulate(mode, seed=2404):
+    horizon, rate = build_world(seed)
+    rng = random.Random(seed + 1)
+    now = [0.0]
+    rolling = mode == "rolling"
+    batch = min(BATCH, MAX_SURGE, LIVE_APPS) if rolling else LIVE_APPS
+    steps = math.ceil(LIVE_APPS / batch)
+    scheduler = RotationScheduler(TTL / steps, LIVE_APPS, clock=lambda: now[0], rng=random.Random(seed + 2),
+                                  max_pods=LIVE_APPS + MAX_SURGE if rolling else None, step_pods=batch)
+    scheduler.logger.setLevel(logging.WARNING)
+    scheduler.THREAT_HITS_PER_MINUTE = 0
+
+    events = []
+    sequence = 0
+    def schedule(at, kind, data=None):
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (at, sequence, kind, data))
+
+    active = [Pod(-WARMUP_SECONDS) for _ in range(LIVE_APPS)]
+    retiring = []
+    standby_ready = not rolling          # full swap warms the first standby before the first rotation
+    provisioning = False
+    lifetimes = []
+    requests = shed = cold_shed = cut = skipped = rotations = 0.0
+    started = 0.0
+    pods_peak = pod_seconds = 0.0
+    large_rate_max = BASE_RPS * 1.6 * 1.8 * LARGE_FRACTION
+
+    def oldest(count):
+        return sorted(active, key=lambda pod: pod.activated)[:max(0, len(active) + count - LIVE_APPS)]
+
+    def retire(pods, at):
+        for pod in pods:
+            lifetimes.append(at - pod.activated)
+            pod.deadline = at + DRAIN_DEADLINE
+            active.remove(pod)
+            retiring.append(pod)
+
+    schedule(0.0, "tick")
+    schedule(rng.expovariate(large_rate_max), "transfer")
+
+    while events:
+        at, _, kind, data = heapq.heappop(events)
+        if at > horizon:
+            break
+        now[0] = at
+
+        if kind == "tick":
+            interval = RotationScheduler.CHECK_INTERVAL_SECONDS
+            demand = rate(at)
+            requests += demand * interval
+            capacity = sum(POD_RPS * (COLD_CAPACITY if at < pod.warm_at else 1) for pod in active)
+            shed += max(0.0, demand - capacity) * interval
+            # What the cold pods shed on top of what warm ones would have
+            cold_shed += (max(0.0, demand - capacity) - max(0.0, demand - POD_RPS * len(active))) * interval
+            standby = batch if standby_ready or provisioning else 0
+            pods = len(active) + standby + len(retiring)
+            pods_peak = max(pods_peak, pods)
+            pod_seconds += pods * interval
+
+            for pod in list(retiring):
+                if pod.transfers == 0 or at >= pod.deadline:
+                    cut += pod.transfers
+                    retiring.remove(pod)
+
+            if not (rolling and provisioning):
+                tracked = len(active) + (batch if standby_ready else 0) + len(retiring)
+                outgoing = oldest(batch) if rolling else active
+                signals = RotationSignals(len(active), int(demand * REQUEST_SECONDS), sum(pod.transfers for pod in outgoing), 0, tracked)
+                if scheduler.decide(signals) is not None:
+                    rotations += 1
+                    started = at
+                    if rolling:
+                        # The slice is provisioned on demand, the step completes when it is warm
+                        provisioning = True
+                        schedule(at + PROVISION_SECONDS, "provisioned")
+                    elif standby_ready:
+                        retire(list(active), at)
+                        active.extend(Pod(at) for _ in range(LIVE_APPS))
+                        standby_ready, provisioning = False, True
+                        schedule(at + PROVISION_SECONDS, "provisioned")
+                        scheduler.rotated()
+                    else:
+                        skipped += 1
+                        scheduler.rotated()
+            schedule(at + interval, "tick")
+
+        elif kind == "provisioned":
+            provisioning = False
+            if rolling:
+                retire(oldest(batch), at)
+                active.extend(Pod(at) for _ in range(batch))
+                scheduler.rotated(started)
+            else:
+                standby_ready = True
+
+        elif kind == "transfer":
+            if rng.random() < rate(at) * LARGE_FRACTION / large_rate_max:
+                pod = rng.choice(active)
+                pod.transfers += 1
+                schedule(at + rng.lognormvariate(math.log(40), 0.8), "transfer_end", pod)
+            schedule(at + rng.expovariate(large_rate_max), "transfer")
+
+        elif kind == "transfer_end":
+            if data.transfers > 0:
+                data.transfers -= 1
+
+    lifetimes.extend(horizon - pod.activated for pod in active)
+    return {
+        "rotations per day": rotations / DAYS,
+        "pod replacements per day": len(lifetimes) / DAYS,
+        "mean pod lifetime (s)": statistics.mean(lifetimes),
+        "max pod lifetime (s)": max(lifetimes),
+        "unavailable": (shed + cut) / requests,
+        "requests shed": shed,
+        "shed by cold pods": cold_shed,
+        "transfers cut": cut,
+        "skipped": skipped,
+        "peak pods": pods_peak,
+        "mean pods": pod_seconds / horizon,
+        "capacity overhead": pod_seconds / horizon / LIVE_APPS - 1,
+        "decisions": scheduler.stats,
+    }
+
+results = {name: simulate(name) for name in ("full swap", "rolling")}
+print(f"{DAYS} days, TTL {TTL}s, {LIVE_APPS} pods, rolling {BATCH} pod per step with a surge of {MAX_SURGE}")
+print(f"{'':26s}" + "".join(f"{name:>14s}" for name in results))
+for metric in ["rotations per day", "pod replacements per day", "mean pod lifetime (s)", "max pod lifetime (s)", "unavailable",
+               "requests shed", "shed by cold pods", "transfers cut", "skipped", "peak pods", "mean pods", "capacity overhead"]:
+    cells = []
+    for result in results.values():
+        value = result[metric]
+        cells.append(f"{value:14.4%}" if metric in ("unavailable", "capacity overhead") else f"{value:14,.1f}")
+    print(f"{metric:26s}" + "".join(cells))
+for name, result in results.items():
+    print(f"{name}: {result['decisions']}")
@@ -0,0 +1,195 @@
+import heapq
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from rotation_scheduler import RotationScheduler, RotationSignals
+
+""" Discrete-event simulation of the rotation schedule: availability, exposure and pod count, offline """
+
+DAYS = 14
+TTL = 3000                 # APP_TTL
+LIVE_APPS = 3              # REPLICAS
+PROVISION_SECONDS = 90     # create the deployment, start and warm the next generation
+WARMUP_SECONDS = 60        # a new generation serves at COLD_CAPACITY until its caches are warm
+COLD_CAPACITY = 0.5
+DRAIN_DEADLINE = 300       # transfers still running on a retired generation after this are cut
+POD_RPS = 256              # 64 requests in flight per pod at 0.25 s each
+REQUEST_SECONDS = 0.25
+BASE_RPS = 250
+PEAKS_PER_DAY = 3
+LARGE_FRACTION = 0.0001    # share of requests that are large downloads
+ATTACKS_PER_DAY = 4
+ATTACK_HITS_PER_MINUTE = 300
+
+class FixedScheduler:
+    """The previous schedule: an APScheduler interval of exactly TTL"""
+    def __init__(self, ttl, live_apps, clock, rng):
+        self.clock = clock
+        self.ttl = ttl
+        self.next_due = clock() + ttl
+        self.stats = {"scheduled": 0}
+
+    def decide(self, signals):
+        if self.clock() < self.next_due:
+            return None
+        self.stats["scheduled"] += 1
+        return "scheduled"
+
+    def rotated(self):
+        self.next_due += self.ttl
+
+class JitterOnly(RotationScheduler):
+    MAX_DEFER = 0
+    THREAT_HITS_PER_MINUTE = 0
+
+def traffic(peaks):
+    """Requests per second: a daily cycle plus a few surges a day"""
+    def rate(t):
+        value = BASE_RPS * (1 + 0.6 * math.sin(2 * math.pi * (t / 86400 - 0.25)))
+        for start, end in peaks:
+            if start <= t < end:
+                value *= 1.8
+        return value
+    return rate
+
+def build_world(seed):
+    rng = random.Random(seed)
+    horizon = DAYS * 86400
+    peaks = []
+    for day in range(DAYS):
+        for _ in range(PEAKS_PER_DAY):
+            start = day * 86400 + rng.uniform(0, 86400)
+            peaks.append((start, start + rng.uniform(600, 1800)))
+    attacks = []
+    t = rng.expovariate(ATTACKS_PER_DAY / 86400)
+    while t < horizon:
+        attacks.append((t, t + rng.uniform(900, 2700)))
+        t += rng.expovariate(ATTACKS_PER_DAY / 86400)
+    return horizon, traffic(peaks), attacks
+
+def simulate(policy, seed=1810):
+    horizon, rate, attacks = build_world(seed)
+    rng = random.Random(seed + 1)
+    now = [0.0]
+    scheduler = policy(TTL, LIVE_APPS, clock=lambda: now[0], rng=random.Random(seed + 2))
+    if hasattr(scheduler, "logger"):
+        scheduler.logger.setLevel(logging.WARNING)
+
+    events = []
+    sequence = 0
+    def schedule(at, kind, data=None):
+        nonlocal sequence
+        sequence += 1
+        heapq.heappush(events, (at, sequence, kind, data))
+
+    generation = 0                       # active generation
+    cold_until = 0.0
+    standby_ready = True                 # the first standby is warmed before the first rotation
+    provisioning = False
+    retiring = {}                        # generation -> drain deadline
+    transfers = {}                       # generation -> transfers in flight
+    activated = {0: 0.0}
+    lifetimes, exposures = [], []
+    observed = []                        # (campaign start, generation it saw)
+    hits = 0.0
+    requests = shed = cut = skipped = 0.0
+    pods_peak = pod_seconds = 0.0
+    large_rate_max = BASE_RPS * 1.6 * 1.8 * LARGE_FRACTION
+
+    schedule(0.0, "tick")
+    schedule(rng.expovariate(large_rate_max), "transfer")
+    for start, end in attacks:
+        schedule(start, "attack", end)
+
+    while events:
+        at, _, kind, data = heapq.heappop(events)
+        if at > horizon:
+            break
+        now[0] = at
+
+        if kind == "tick":
+            interval = RotationScheduler.CHECK_INTERVAL_SECONDS
+            demand = rate(at)
+            requests += demand * interval
+            capacity = LIVE_APPS * POD_RPS * (COLD_CAPACITY if at < cold_until else 1)
+            shed += max(0.0, demand - capacity) * interval
+            if any(start <= at < end for start, end in attacks):
+                hits += ATTACK_HITS_PER_MINUTE / 60 * interval
+            pods = LIVE_APPS * (1 + (standby_ready or provisioning) + len(retiring))
+            pods_peak = max(pods_peak, pods)
+            pod_seconds += pods * interval
+
+            for old, deadline in list(retiring.items()):
+                if transfers.get(old, 0) == 0 or at >= deadline:
+                    cut += transfers.pop(old, 0)
+                    del retiring[old]
+
+            tracked = LIVE_APPS * (1 + standby_ready + len(retiring))
+            signals = RotationSignals(LIVE_APPS, int(demand * REQUEST_SECONDS), transfers.get(generation, 0), hits, tracked)
+            decision = scheduler.decide(signals)
+            if decision is not None:
+                if standby_ready:
+                    lifetimes.append(at - activated[generation])
+                    exposures.extend(at - start for start, seen in observed if seen == generation)
+                    observed = [(start, seen) for start, seen in observed if seen != generation]
+                    retiring[generation] = at + DRAIN_DEADLINE
+                    generation += 1
+                    activated[generation] = at
+                    cold_until = at + WARMUP_SECONDS
+                    standby_ready, provisioning = False, True
+                    schedule(at + PROVISION_SECONDS, "provisioned")
+                else:
+                    skipped += 1
+                scheduler.rotated()
+            schedule(at + interval, "tick")
+
+        elif kind == "provisioned":
+            standby_ready, provisioning = True, False
+
+        elif kind == "transfer":
+            if rng.random() < rate(at) * LARGE_FRACTION / large_rate_max:
+                transfers[generation] = transfers.get(generation, 0) + 1
+                schedule(at + rng.lognormvariate(math.log(40), 0.8), "transfer_end", generation)
+            schedule(at + rng.expovariate(large_rate_max), "transfer")
+
+        elif kind == "transfer_end":
+            if transfers.get(data, 0) > 0:
+                transfers[data] -= 1
+
+        elif kind == "attack":
+            observed.append((at, generation))
+
+    exposures.extend(horizon - start for start, seen in observed)
+    exposures.sort()
+    return {
+        "rotations per day": len(lifetimes) / DAYS,
+        "mean lifetime (s)": statistics.mean(lifetimes),
+        "max lifetime (s)": max(lifetimes),
+        "unavailable": (shed + cut) / requests,
+        "requests shed": shed,
+        "transfers cut": cut,
+        "skipped": skipped,
+        "exposure mean (s)": statistics.mean(exposures),
+        "exposure p95 (s)": exposures[int(len(exposures) * 0.95)],
+        "peak pods": pods_peak,
+        "mean pods": pod_seconds / horizon,
+        "decisions": scheduler.stats,
+    }
+
+results = {name: simulate(policy) for name, policy in [("fixed TTL", FixedScheduler), ("jitter only", JitterOnly), ("adaptive", RotationScheduler)]}
+print(f"{DAYS} days, TTL {TTL}s, {LIVE_APPS} pods per generation, {ATTACKS_PER_DAY} attack campaigns a day")
+print(f"{'':22s}" + "".join(f"{name:>14s}" for name in results))
+for metric in ["rotations per day", "mean lifetime (s)", "max lifetime (s)", "unavailable", "requests shed", "transfers cut", "skipped",
+               "exposure mean (s)", "exposure p95 (s)", "peak pods", "mean pods"]:
+    cells = []
+    for result in results.values():
+        value = result[metric]
+        cells.append(f"{value:14.4%}" if metric == "unavailable" else f"{value:14,.1f}")
+    print(f"{metric:22s}" + "".join(cells))
+for name, result in results.items():
+    print(f"{name}: {result['decisions']}")
@@ -0,0 +1,71 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import redis
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webapp1"))
+# metrics.py is shared with the load balancer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from session_cache import SessionCache
+from session_store import SessionStore
+
+def populate_sessions(redis_client, count):
+    session_ids = [uuid.uuid4().hex for _ in range(count)]
+    pipe = redis_client.pipeline(transaction=False)
+    for i, session_id in enumerate(session_ids):
+        pipe.set(f"session:{session_id}", json.dumps({"user": f"user-{i}"}), ex=3600)
+    pipe.execute()
+    return session_ids
+
+def run_lookups(lookup, session_ids, threads=8, duration=10):
+    """
+    Look up random sessions from several threads and count lookups per second
+    """
+    counts = [0] * threads
+    end_time = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(index)
+        while time.perf_counter() < end_time:
+            lookup(rng.choice(session_ids))
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return sum(counts) / (time.perf_counter() - started)
+
+def benchmark_session_cache(host="127.0.0.1", port=6379, sessions=1000, threads=8, duration=10):
+    redis_client = redis.Redis(host=host, port=port)
+    session_ids = populate_sessions(redis_client, sessions)
+
+    def without_cache(session_id):
+        return json.loads(redis_client.get(f"session:{session_id}"))
+
+    cache = SessionCache(SessionStore(redis_client))
+    cache.start()
+    time.sleep(1)  # let the invalidation channel come up
+
+    uncached_rps = run_lookups(without_cache, session_ids, threads, duration)
+    cached_rps = run_lookups(cache.get, session_ids, threads, duration)
+    cache.stop()
+
+    return {
+        "uncached_lookups_per_second": uncached_rps,
+        "cached_lookups_per_second": cached_rps,
+        "speedup": cached_rps / uncached_rps if uncached_rps > 0 else 0,
+        "cache_stats": cache.stats()
+    }
+
+# Needs a local redis-server (6.0 or newer for client-side caching)
+cache_results = benchmark_session_cache()
+print(f"Without cache: {cache_results['uncached_lookups_per_second']:.0f} lookups/s")
+print(f"With cache: {cache_results['cached_lookups_per_second']:.0f} lookups/s ({cache_results['speedup']:.1f}x)")
+print(f"Hit ratio: {cache_results['cache_stats']['hit_ratio']*100:.1f}%")
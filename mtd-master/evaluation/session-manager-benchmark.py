@@ -0,0 +1,84 @@
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "session-manager"))
+from sharded_store import ShardedStore
+
+def run_clients(operation, clients=16, duration=10):
+    """
+    Run operation(rng) from several client threads and count operations per second
+    """
+    counts = [0] * clients
+    errors = [0] * clients
+    end_time = time.perf_counter() + duration
+
+    def client(index):
+        rng = random.Random(index)
+        while time.perf_counter() < end_time:
+            try:
+                operation(rng)
+                counts[index] += 1
+            except Exception:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    return {"ops_per_second": sum(counts) / elapsed, "errors": sum(errors)}
+
+def benchmark_store(shards, sessions=10000, read_ratio=0.9, clients=16, duration=5):
+    """In-process throughput of the store with a read-heavy mix"""
+    store = ShardedStore(shards=shards)
+    keys = [uuid.uuid4().hex for _ in range(sessions)]
+    for key in keys:
+        store.put(key, {"user": key[:8]})
+
+    def operation(rng):
+        key = rng.choice(keys)
+        if rng.random() < read_ratio:
+            store.get(key)
+        else:
+            store.put(key, {"user": key[:8]})
+
+    return run_clients(operation, clients=clients, duration=duration)
+
+def benchmark_service(base_url, sessions=1000, batch_size=50, clients=16, duration=10):
+    """HTTP throughput of single and batch lookups against a running session manager"""
+    keys = [uuid.uuid4().hex for _ in range(sessions)]
+    for i in range(0, len(keys), batch_size):
+        requests.put(f"{base_url}/sessions", json={"sessions": {key: {"user": key[:8]} for key in keys[i:i + batch_size]}})
+
+    local = threading.local()
+
+    def session():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def single(rng):
+        session().get(f"{base_url}/session/{rng.choice(keys)}").raise_for_status()
+
+    def batch(rng):
+        session().post(f"{base_url}/sessions/batch-get", json={"ids": rng.sample(keys, batch_size)}).raise_for_status()
+
+    single_result = run_clients(single, clients=clients, duration=duration)
+    batch_result = run_clients(batch, clients=clients, duration=duration)
+    batch_result["sessions_per_second"] = batch_result["ops_per_second"] * batch_size
+    return {"single": single_result, "batch": batch_result}
+
+for shard_count in (1, 16):
+    store_result = benchmark_store(shard_count)
+    print(f"In-process store with {shard_count} shard(s): {store_result['ops_per_second']:.0f} ops/s")
+
+service_results = benchmark_service("http://127.0.0.1:8888")
+print(f"Single GET: {service_results['single']['ops_per_second']:.0f} req/s, {service_results['single']['errors']} errors")
+print(f"Batch get: {service_results['batch']['sessions_per_second']:.0f} sessions/s, {service_results['batch']['errors']} errors")
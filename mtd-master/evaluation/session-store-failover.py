@@ -0,0 +1,87 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webapp1"))
+# metrics.py is shared with the load balancer
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer"))
+from session_store import SessionStore
+
+def start_redis(port, data_dir):
+    process = subprocess.Popen(
+        ["redis-server", "--port", str(port), "--dir", data_dir, "--appendonly", "yes", "--save", ""],
+        stdout=subprocess.DEVNULL
+    )
+    time.sleep(0.5)
+    return process
+
+def test_redis_restart(port=6390, duration=20, kill_at=5, down_for=3, threads=8):
+    """
+    Hammer the session store while a local redis-server is killed and restarted,
+    and record how long requests stalled and how many failed
+    """
+    data_dir = tempfile.mkdtemp(prefix="mtd-redis-")
+    redis_process = start_redis(port, data_dir)
+    store = SessionStore(SessionStore.client("127.0.0.1", port, 0))
+
+    session_ids = [uuid.uuid4().hex for _ in range(100)]
+    for session_id in session_ids:
+        store.login(session_id, f"user-{session_id[:6]}")
+
+    results = []
+    lock = threading.Lock()
+    end_time = time.time() + duration
+
+    def worker(index):
+        i = index
+        while time.time() < end_time:
+            started = time.perf_counter()
+            result = {"timestamp": time.time(), "success": False, "latency": None}
+            try:
+                result["success"] = store.get(session_ids[i % len(session_ids)]) is not None
+            except Exception as e:
+                result["error"] = type(e).__name__
+            result["latency"] = time.perf_counter() - started
+            with lock:
+                results.append(result)
+            i += threads
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+
+    time.sleep(kill_at)
+    redis_process.kill()
+    redis_process.wait()
+    killed_at = time.time()
+    print(f"redis-server killed, restarting in {down_for}s")
+    time.sleep(down_for)
+    redis_process = start_redis(port, data_dir)
+    restarted_at = time.time()
+
+    for w in workers:
+        w.join()
+    redis_process.kill()
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+    failures = [r for r in results if not r["success"]]
+    recovered = [r["timestamp"] for r in results if r["success"] and r["timestamp"] > restarted_at]
+    return {
+        "total_requests": len(results),
+        "failed_requests": len(failures),
+        "availability": 1 - len(failures) / len(results) if results else 0,
+        "max_latency": max(r["latency"] for r in results) if results else 0,
+        "recovery_seconds": min(recovered) - restarted_at if recovered else None,
+        "outage_seconds": restarted_at - killed_at
+    }
+
+# Needs redis-server on the PATH
+failover_results = test_redis_restart()
+print(f"Availability: {failover_results['availability']*100:.2f}% over {failover_results['total_requests']} requests")
+print(f"Worst request latency: {failover_results['max_latency']*1000:.0f} ms (outage {failover_results['outage_seconds']:.1f}s)")
+print(f"Recovered {failover_results['recovery_seconds']}s after redis-server came back")
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import time
+import requests
+
+WEBAPP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webapp1", "enhanced_serve.py")
+# metrics.py is shared with the load balancer
+SHARED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer")
+
+def measure_startup(url="http://127.0.0.1:8080/ready", timeout=60):
+    """Start a webapp process and time how long it takes until /ready answers 200"""
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, WEBAPP], env=dict(os.environ, PYTHONPATH=SHARED), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = requests.get(url, timeout=1)
+                if response.status_code == 200:
+                    return time.perf_counter() - started, response.json()["startup_seconds"]
+            except requests.RequestException:
+                pass
+            time.sleep(0.02)
+        return None, None
+    finally:
+        process.terminate()
+        process.wait()
+
+def measure_first_download(filename="huge.txt", url="http://127.0.0.1:8080/download"):
+    """Time to first byte and total time of a sample download on a fresh pod"""
+    process = subprocess.Popen([sys.executable, WEBAPP], env=dict(os.environ, PYTHONPATH=SHARED), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                if requests.get(f"{url[:-len('/download')]}/ready", timeout=1).status_code == 200:
+                    break
+            except requests.RequestException:
+                time.sleep(0.02)
+        started = time.perf_counter()
+        response = requests.get(f"{url}/{filename}", stream=True)
+        chunks = response.iter_content(chunk_size=256 * 1024)
+        next(chunks)
+        first_byte = time.perf_counter() - started
+        for _ in chunks:
+            pass
+        return first_byte, time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+results = [measure_startup() for _ in range(5)]
+ready_times = [wall for wall, _ in results if wall is not None]
+print(f"Cold start until ready: {sum(ready_times) / len(ready_times):.2f}s average, {max(ready_times):.2f}s worst over {len(ready_times)} runs")
+print(f"Startup reported by the pod: {[reported for _, reported in results]}")
+
+first_byte, total = measure_first_download()
+print(f"huge.txt on a fresh pod: first byte after {first_byte * 1000:.0f} ms, complete after {total:.2f}s")
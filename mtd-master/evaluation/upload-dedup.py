@@ -0,0 +1,46 @@
+import os
+import time
+import requests
+
+def upload_resumable(base_urls, data, part_size=1024 * 1024, fail_after=None):
+    """
+    Send data as a resumable upload, moving to the next pod after every part
+    to mimic rotations. fail_after drops a part halfway once to simulate a pod dying.
+    """
+    session = requests.Session()
+    session.put(f"{base_urls[0]}/login/benchmark")
+    upload_id = session.post(f"{base_urls[0]}/uploads", json={"filename": "resumable.bin", "size": len(data)}).json()["upload_id"]
+    offset, part, retries = 0, 0, 0
+    while offset < len(data):
+        base_url = base_urls[part % len(base_urls)]
+        chunk = data[offset:offset + part_size]
+        if fail_after is not None and part == fail_after and retries == 0:
+            chunk = chunk[:len(chunk) // 2]
+            retries += 1
+        try:
+            session.put(f"{base_url}/uploads/{upload_id}", data=chunk, headers={"Upload-Offset": str(offset)}, timeout=30)
+        except requests.RequestException:
+            retries += 1
+        # Always ask the server where to continue from
+        offset = session.get(f"{base_url}/uploads/{upload_id}").json()["offset"]
+        part += 1
+    response = session.post(f"{base_urls[-1]}/uploads/{upload_id}/complete")
+    return response.status_code == 201, retries
+
+def upload_twice(base_url, size=20 * 1024 * 1024):
+    """Upload the same content under two names and time both"""
+    session = requests.Session()
+    session.put(f"{base_url}/login/benchmark")
+    data = os.urandom(size)
+    timings = []
+    for name in ("first.bin", "second.bin"):
+        started = time.perf_counter()
+        session.post(f"{base_url}/upload", files={"file": (name, data)}).raise_for_status()
+        timings.append(time.perf_counter() - started)
+    return data, timings
+
+data, timings = upload_twice("http://127.0.0.1:51417")
+print(f"First upload: {timings[0]:.2f}s, identical re-upload: {timings[1]:.2f}s (stored once)")
+
+completed, retries = upload_resumable(["http://127.0.0.1:51417"], data, fail_after=3)
+print(f"Resumable upload {'completed' if completed else 'failed'} after {retries} interrupted part(s)")
@@ -0,0 +1,55 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+import requests
+
+WEBAPP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "webapp1")
+# metrics.py is shared with the load balancer
+SHARED = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "load-balancer")
+BASE_URL = "http://127.0.0.1:8080"
+ENDPOINTS = ["/", "/health", "/download/small.txt"]
+
+def client(args):
+    """Hit one endpoint in a loop for duration seconds and return the number of responses"""
+    path, duration = args
+    session = requests.Session()
+    count = 0
+    end_time = time.perf_counter() + duration
+    while time.perf_counter() < end_time:
+        session.get(f"{BASE_URL}{path}").content
+        count += 1
+    return count
+
+def start_server(workers):
+    """Start gunicorn with a fixed number of workers and wait until it is ready"""
+    env = dict(os.environ, PYTHONPATH=SHARED, WEB_WORKERS=str(workers))
+    process = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=WEBAPP_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        try:
+            if requests.get(f"{BASE_URL}/ready", timeout=1).status_code == 200:
+                return process
+        except requests.RequestException:
+            time.sleep(0.1)
+
+def benchmark(workers, clients=16, duration=10):
+    process = start_server(workers)
+    try:
+        results = {}
+        with multiprocessing.Pool(clients) as pool:
+            for path in ENDPOINTS:
+                counts = pool.map(client, [(path, duration)] * clients)
+                results[path] = sum(counts) / duration
+        return results
+    finally:
+        process.terminate()
+        process.wait()
+
+cores = len(os.sched_getaffinity(0))
+worker_counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+print(f"{cores} cores available")
+for workers in worker_counts:
+    results = benchmark(workers)
+    print(f"{workers} worker(s): " + ", ".join(f"{path} {rate:.0f} req/s" for path, rate in results.items()))
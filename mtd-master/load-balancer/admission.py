@@ -0,0 +1,176 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+import redis
+from redis.exceptions import RedisError
+import metrics
+import utils
+
+REQUESTS = metrics.Counter("lb_requests_total", "Client requests by outcome: proxied, diverted, limited, shed or failed", ["outcome"])
+ADMISSION_INFLIGHT = metrics.Gauge("lb_admission_inflight", "Requests to the webapp holding an admission slot")
+REDIS_SECONDS = metrics.Histogram("lb_redis_seconds", "Round trips to Redis for shared rate limits", ["command"],
+                                  buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+""" Token bucket in Redis: refill by elapsed time, take one token, in a single atomic round trip """
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float, rate: float, burst: float) -> float:
+        """Take one token; returns 0 when allowed, else the seconds until a token is available"""
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / rate
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by client IP or session, RATE requests per second with
+    bursts of BURST. Buckets live in a bounded LRU in memory, so a check is a
+    dict lookup and some arithmetic. With a Redis client the buckets are shared
+    by every load balancer replica instead, and a Redis failure falls back to
+    the local buckets rather than rejecting or admitting everything.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, redis_client: Optional[redis.Redis] = None,
+                 max_keys: int = 100000, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.redis = redis_client
+        self.script = redis_client.register_script(TOKEN_BUCKET_SCRIPT) if redis_client is not None else None
+        self.max_keys = max_keys
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.shared = True
+        self.logger = utils.create_stdout_logger(logging.DEBUG, f"rate-limiter-{name}")
+
+    def check(self, key: str) -> float:
+        """Take a token for key: 0 when the request may proceed, else its Retry-After in seconds"""
+        if self.rate <= 0 or not key:
+            return 0.0
+        if self.script is not None:
+            try:
+                with REDIS_SECONDS.time("token_bucket"):
+                    allowed, tokens = self.script(keys=[f"ratelimit:{self.name}:{key}"], args=[self.rate, self.burst])
+                if not self.shared:
+                    self.shared = True
+                    self.logger.info("Shared rate limit is back")
+                return 0.0 if allowed else (1 - float(tokens)) / self.rate
+            except RedisError as e:
+                if self.shared:
+                    self.shared = False
+                    self.logger.warning(f"Shared rate limit unavailable, using local buckets: {e}")
+        now = self.clock()
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(self.burst, now)
+                if len(self.buckets) > self.max_keys:
+                    self.buckets.popitem(last=False)
+            else:
+                self.buckets.move_to_end(key)
+            return bucket.take(now, self.rate, self.burst)
+
+
+class AdmissionController:
+    """
+    Caps the requests the load balancer has in flight to the webapp at
+    MAX_INFLIGHT_PER_POD per active pod, so excess load is shed with a 503
+    before the pods queue it. The cap follows the pool size, which matters
+    during a rotation when only one generation is taking traffic.
+    """
+    MAX_INFLIGHT_PER_POD = int(os.environ.get("ADMISSION_MAX_INFLIGHT_PER_POD", 64))
+
+    def __init__(self, pod_count: Callable[[], int]):
+        self.pod_count = pod_count
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.stats = {"admitted": 0, "shed": 0}
+
+    @property
+    def limit(self) -> int:
+        return max(1, self.pod_count()) * self.MAX_INFLIGHT_PER_POD
+
+    def try_acquire(self) -> bool:
+        limit = self.limit
+        with self.lock:
+            if self.MAX_INFLIGHT_PER_POD > 0 and self.inflight >= limit:
+                self.stats["shed"] += 1
+                REQUESTS.labels("shed").inc()
+                return False
+            self.inflight += 1
+            self.stats["admitted"] += 1
+        ADMISSION_INFLIGHT.inc()
+        return True
+
+    def release(self):
+        with self.lock:
+            self.inflight = max(0, self.inflight - 1)
+        ADMISSION_INFLIGHT.dec()
+
+
+class RequestGate:
+    """Per-client and per-session rate limits plus admission control, as used by both proxy engines"""
+    CLIENT_RATE = float(os.environ.get("RATE_LIMIT_CLIENT_RATE", 50))
+    CLIENT_BURST = float(os.environ.get("RATE_LIMIT_CLIENT_BURST", 100))
+    SESSION_RATE = float(os.environ.get("RATE_LIMIT_SESSION_RATE", 20))
+    SESSION_BURST = float(os.environ.get("RATE_LIMIT_SESSION_BURST", 40))
+    MAX_KEYS = int(os.environ.get("RATE_LIMIT_MAX_KEYS", 100000))
+    REDIS_HOST = os.environ.get("RATE_LIMIT_REDIS_HOST")  # unset keeps the buckets local to this replica
+    REDIS_PORT = int(os.environ.get("RATE_LIMIT_REDIS_PORT", 6379))
+    REDIS_TIMEOUT = float(os.environ.get("RATE_LIMIT_REDIS_TIMEOUT", 0.05))
+
+    def __init__(self, pod_count: Callable[[], int], redis_client: Optional[redis.Redis] = None):
+        if redis_client is None and self.REDIS_HOST:
+            redis_client = redis.Redis(host=self.REDIS_HOST, port=self.REDIS_PORT,
+                                       socket_timeout=self.REDIS_TIMEOUT, socket_connect_timeout=self.REDIS_TIMEOUT)
+        self.clients = RateLimiter("client", self.CLIENT_RATE, self.CLIENT_BURST, redis_client, self.MAX_KEYS)
+        self.sessions = RateLimiter("session", self.SESSION_RATE, self.SESSION_BURST, redis_client, self.MAX_KEYS)
+        self.admission = AdmissionController(pod_count)
+        self.stats = {"limited": 0}
+
+    def limit(self, client_ip: str, session_id: Optional[str]) -> float:
+        """0 when the client and its session are within their rates, else the Retry-After in seconds"""
+        retry_after = self.clients.check(client_ip) or self.sessions.check(session_id or "")
+        if retry_after:
+            self.stats["limited"] += 1
+            REQUESTS.labels("limited").inc()
+        return retry_after
+
+    def admit(self) -> bool:
+        """Take an admission slot for a request to the webapp; it must be given back with release()"""
+        return self.admission.try_acquire()
+
+    def release(self):
+        self.admission.release()
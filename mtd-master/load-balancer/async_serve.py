@@ -0,0 +1,192 @@
+import logging
+import os
+import time
+from aiohttp import ClientError, ClientSession, ClientTimeout, DummyCookieJar, TCPConnector, web
+from yarl import URL
+import utils
+from admission import REQUESTS, RequestGate
+from balancing import STREAMED_BYTES, transfer_size
+from proxying import STREAM_CHUNK_SIZE, HOP_BY_HOP_HEADERS, forwarded_headers, pod_url, rejection, resume_candidates
+from resume import ResumableDownload
+from traffic_classifier import TrafficClassifier, client_address
+
+CONNECTIONS_PER_POD = int(os.environ.get("PROXY_POOL_MAXSIZE", 64))
+
+logger = utils.create_stdout_logger(logging.INFO, "async-load-balancer")
+# Written on every request, so only a sample is kept, see REQUEST_LOG_SAMPLE_RATE
+request_log = utils.request_logger("async-load-balancer", "requests")
+
+
+def create_app(controller) -> web.Application:
+    """Build the asyncio proxy around the same controller the Flask engine uses"""
+    app = web.Application(client_max_size=0)
+    app["controller"] = controller
+    app["classifier"] = TrafficClassifier()
+    app["gate"] = RequestGate(lambda: len(controller.active_pods))
+
+    async def open_client_session(app: web.Application):
+        # One keep-alive pool per pod: aiohttp pools connections per host
+        connector = TCPConnector(limit=0, limit_per_host=CONNECTIONS_PER_POD, ttl_dns_cache=None)
+        app["client"] = ClientSession(
+            connector=connector,
+            auto_decompress=False,
+            timeout=ClientTimeout(total=None, sock_connect=5),
+            # The session is shared by all clients: never keep upstream cookies
+            cookie_jar=DummyCookieJar(),
+        )
+        yield
+        await app["client"].close()
+
+    app.cleanup_ctx.append(open_client_session)
+    app.router.add_route("GET", "/{path:.*}", route)
+    app.router.add_route("PUT", "/{path:.*}", route)
+    app.router.add_route("POST", "/{path:.*}", route)
+    return app
+
+
+def rejected(status: int, retry_after: float) -> web.Response:
+    body, status, headers = rejection(status, retry_after)
+    return web.json_response(body, status=status, headers=headers)
+
+
+async def resume_upstream(request: web.Request, download: ResumableDownload, failed, headers: dict):
+    """Request the rest of an interrupted download from another pod, or return None"""
+    controller = request.app["controller"]
+    for app_instance in resume_candidates(controller, download, failed):
+        url = URL(pod_url(app_instance, request.raw_path), encoded=True)
+        logger.warning(f"Resuming download from byte {download.next_byte} on {url}")
+
+        controller.balancer.acquire(app_instance)
+        started = time.perf_counter()
+        try:
+            upstream = await request.app["client"].get(url, headers=download.resume_headers(headers), allow_redirects=False)
+        except (ClientError, OSError):
+            controller.balancer.report(app_instance, time.perf_counter() - started, ok=False)
+            controller.balancer.release(app_instance)
+            continue
+        controller.balancer.report(app_instance, time.perf_counter() - started, ok=upstream.status < 500)
+
+        if download.accepts(upstream.status, upstream.headers):
+            return upstream, app_instance
+        # A different representation or no range support: these bytes cannot be spliced in
+        upstream.release()
+        controller.balancer.release(app_instance)
+        return None
+    return None
+
+
+async def route(request: web.Request) -> web.StreamResponse:
+    gate = request.app["gate"]
+    admitted = False
+    try:
+        controller = request.app["controller"]
+        classifier = request.app["classifier"]
+        client_ip = client_address(request.remote, request.headers)
+        retry_after = gate.limit(client_ip, request.cookies.get("session_id"))
+        if retry_after:
+            return rejected(429, retry_after)
+
+        # Suspicious flows go to a honeypot, everything else to the least loaded healthy pod
+        diversion = classifier.classify(client_ip, request.raw_path, request.headers.get("User-Agent"))
+        app_instance = controller.select_honeypot() if diversion else None
+        if app_instance is not None:
+            request_log.info("Diverting %s (%s) to honeypot %s", client_ip, diversion, app_instance.pod_name)
+        else:
+            diversion = None
+            if not gate.admit():
+                return rejected(503, 1)
+            admitted = True
+            app_instance = controller.select_app()
+        # raw_path keeps the client's path and query string exactly as sent
+        url = URL(pod_url(app_instance, request.raw_path), encoded=True)
+
+        request_log.info("Routing %s %s to %s", request.method, request.raw_path, url)
+
+        headers = forwarded_headers(request.headers.items())
+    except Exception as e:
+        if admitted:
+            gate.release()
+        REQUESTS.labels("failed").inc()
+        logger.error(f"Error routing request: {e}")
+        return web.json_response({"error": "Internal server error"}, status=500)
+
+    controller.balancer.acquire(app_instance)
+    try:
+        started = time.perf_counter()
+        try:
+            upstream = await request.app["client"].request(
+                request.method,
+                url,
+                headers=headers,
+                data=request.content if request.body_exists else None,
+                allow_redirects=False,
+            )
+        except Exception as e:
+            controller.balancer.report(app_instance, time.perf_counter() - started, ok=False)
+            REQUESTS.labels("failed").inc()
+            logger.error(f"Error routing request: {e}")
+            return web.json_response({"error": "Internal server error"}, status=500)
+        controller.balancer.report(app_instance, time.perf_counter() - started, ok=upstream.status < 500)
+        REQUESTS.labels("diverted" if diversion else "proxied").inc()
+        if diversion is None:
+            classifier.observe(client_ip, upstream.status)
+
+        """ Once the status line is sent, errors can only abort the client connection """
+        response = web.StreamResponse(status=upstream.status)
+        for key, value in upstream.headers.items():
+            if key.lower() not in HOP_BY_HOP_HEADERS:
+                response.headers.add(key, value)
+        try:
+            await response.prepare(request)
+        except Exception:
+            upstream.release()
+            raise
+        # Honeypot responses are never resumed on the webapp
+        download = None if diversion else ResumableDownload.from_response(request.method, upstream.status, upstream.headers)
+
+        # Relay the body chunk by chunk so long downloads never sit in memory
+        while True:
+            length = transfer_size(upstream.headers)
+            controller.balancer.open_stream(app_instance, length)
+            streamed = STREAMED_BYTES.labels(app_instance.pod_name)
+            try:
+                while True:
+                    try:
+                        chunk = await upstream.content.read(STREAM_CHUNK_SIZE)
+                    except (ClientError, OSError):
+                        if download is None:
+                            raise
+                        break
+                    if not chunk:
+                        break
+                    if download is not None:
+                        download.advance(len(chunk))
+                    streamed.inc(len(chunk))
+                    # A failed write means the client went away: the pod is not to blame and there is nobody to resume for
+                    await response.write(chunk)
+            finally:
+                upstream.release()
+                controller.balancer.close_stream(app_instance, length)
+            if download is None or download.complete:
+                break
+
+            # The pod went away before the last byte: try to carry on on another pod
+            controller.balancer.report(app_instance, 0, ok=False)
+            controller.balancer.release(app_instance)
+            resumed = await resume_upstream(request, download, app_instance, headers)
+            if resumed is None:
+                # Nothing left to release in the finally block
+                app_instance = None
+                raise ConnectionError(f"Download interrupted after {download.delivered} bytes")
+            upstream, app_instance = resumed
+        await response.write_eof()
+        return response
+    finally:
+        if app_instance is not None:
+            controller.balancer.release(app_instance)
+        if admitted:
+            gate.release()
+
+
+def run(controller, host: str = "0.0.0.0", port: int = 5000):
+    web.run_app(create_app(controller), host=host, port=port, access_log=None)
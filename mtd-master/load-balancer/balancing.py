@@ -0,0 +1,272 @@
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional
+import requests as req
+import metrics
+import utils
+
+BACKEND_RESPONSE_SECONDS = metrics.Histogram("lb_backend_response_seconds", "Time until a backend pod answered with its response headers", ["backend"])
+BACKEND_ERRORS = metrics.Counter("lb_backend_errors_total", "Proxied requests a backend pod failed or answered with a 5xx", ["backend"])
+STREAMED_BYTES = metrics.Counter("lb_streamed_bytes_total", "Response body bytes relayed to clients from each backend pod", ["backend"])
+
+""" Bodies at least this long count as large transfers, which a rotation would rather not cut short """
+LARGE_TRANSFER_BYTES = int(os.environ.get("LB_LARGE_TRANSFER_BYTES", 8 * 1024 * 1024))
+
+
+def transfer_size(headers: Mapping[str, str]) -> int:
+    """Length of a response body from its Content-Length, 0 when unknown"""
+    try:
+        return max(0, int(headers.get("Content-Length") or 0))
+    except ValueError:
+        return 0
+
+
+class BackendStats:
+    """Live load and health figures for one backend pod"""
+
+    def __init__(self):
+        self.inflight = 0
+        self.open_streams = 0
+        self.large_streams = 0
+        self.ewma_latency = 0.0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.healthy = True
+        self.probe_failures = 0
+        self.current_weight = 0
+
+
+class Balancer:
+    """
+    Base class for backend selection strategies.
+
+    Every strategy shares passive outlier ejection (a pod that fails
+    OUTLIER_CONSECUTIVE_ERRORS proxied requests in a row is skipped for a
+    growing period) and the verdict of the active /health prober.
+    """
+    name = "base"
+    EWMA_DECAY = float(os.environ.get("LB_EWMA_DECAY", 0.3))
+    OUTLIER_CONSECUTIVE_ERRORS = int(os.environ.get("LB_OUTLIER_CONSECUTIVE_ERRORS", 5))
+    OUTLIER_EJECTION_SECONDS = float(os.environ.get("LB_OUTLIER_EJECTION_SECONDS", 30))
+    OUTLIER_MAX_EJECTION_SECONDS = float(os.environ.get("LB_OUTLIER_MAX_EJECTION_SECONDS", 300))
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.stats: Dict[str, BackendStats] = {}
+        self.lock = threading.Lock()
+
+    def stats_for(self, pod) -> BackendStats:
+        stats = self.stats.get(pod.pod_name)
+        if stats is None:
+            with self.lock:
+                stats = self.stats.setdefault(pod.pod_name, BackendStats())
+        return stats
+
+    def available(self, pods: List) -> List:
+        """Pods that are neither ejected nor failing health checks; all pods if none are left"""
+        now = self.clock()
+        candidates = []
+        for pod in pods:
+            stats = self.stats_for(pod)
+            if stats.healthy and stats.ejected_until <= now:
+                candidates.append(pod)
+        return candidates or list(pods)
+
+    def pick(self, pods: List):
+        if not pods:
+            raise Exception("No active pods available for routing")
+        return self.choose(self.available(pods))
+
+    def choose(self, candidates: List):
+        raise NotImplementedError
+
+    def acquire(self, pod):
+        """Count a request that is about to be sent to pod"""
+        stats = self.stats_for(pod)
+        with self.lock:
+            stats.inflight += 1
+
+    def release(self, pod):
+        """Count a request to pod as finished, including its streamed body"""
+        stats = self.stats_for(pod)
+        with self.lock:
+            stats.inflight = max(0, stats.inflight - 1)
+
+    def open_stream(self, pod, length: Optional[int] = None):
+        """Count a response body that is being relayed from pod, and whether it is a large transfer"""
+        stats = self.stats_for(pod)
+        with self.lock:
+            stats.open_streams += 1
+            if length and length >= LARGE_TRANSFER_BYTES:
+                stats.large_streams += 1
+
+    def close_stream(self, pod, length: Optional[int] = None):
+        """Pass the length given to open_stream"""
+        stats = self.stats_for(pod)
+        with self.lock:
+            stats.open_streams = max(0, stats.open_streams - 1)
+            if length and length >= LARGE_TRANSFER_BYTES:
+                stats.large_streams = max(0, stats.large_streams - 1)
+
+    def outstanding(self, pods: List) -> int:
+        """In-flight requests plus open streams across pods, without tracking new ones"""
+        total = 0
+        for pod in pods:
+            stats = self.stats.get(pod.pod_name)
+            if stats is not None:
+                total += stats.inflight + stats.open_streams
+        return total
+
+    def load(self, pods: List):
+        """Requests in flight and large transfers being relayed across pods"""
+        inflight = large = 0
+        for pod in pods:
+            stats = self.stats.get(pod.pod_name)
+            if stats is not None:
+                inflight += stats.inflight
+                large += stats.large_streams
+        return inflight, large
+
+    def report(self, pod, latency: float, ok: bool):
+        """Feed the outcome of a proxied request into latency and outlier tracking"""
+        stats = self.stats_for(pod)
+        if latency:
+            BACKEND_RESPONSE_SECONDS.labels(pod.pod_name).observe(latency)
+        if not ok:
+            BACKEND_ERRORS.labels(pod.pod_name).inc()
+        with self.lock:
+            if ok:
+                if stats.ewma_latency == 0.0:
+                    stats.ewma_latency = latency
+                else:
+                    stats.ewma_latency += self.EWMA_DECAY * (latency - stats.ewma_latency)
+                stats.consecutive_failures = 0
+                return
+
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.OUTLIER_CONSECUTIVE_ERRORS:
+                stats.ejections += 1
+                ejection = min(self.OUTLIER_EJECTION_SECONDS * stats.ejections, self.OUTLIER_MAX_EJECTION_SECONDS)
+                stats.ejected_until = self.clock() + ejection
+                stats.consecutive_failures = 0
+
+    def mark_health(self, pod, healthy: bool):
+        """Record the result of an active health probe"""
+        stats = self.stats_for(pod)
+        with self.lock:
+            if healthy:
+                stats.probe_failures = 0
+                stats.healthy = True
+                stats.ejections = 0
+            else:
+                stats.probe_failures += 1
+                if stats.probe_failures >= HealthProber.UNHEALTHY_THRESHOLD:
+                    stats.healthy = False
+
+    def retain(self, pods: List):
+        """Forget idle pods that are no longer routable"""
+        names = {pod.pod_name for pod in pods}
+        with self.lock:
+            for name in [name for name, stats in self.stats.items() if name not in names and stats.inflight == 0 and stats.open_streams == 0]:
+                del self.stats[name]
+                BACKEND_RESPONSE_SECONDS.forget(name)
+                BACKEND_ERRORS.forget(name)
+                STREAMED_BYTES.forget(name)
+
+
+class RandomBalancer(Balancer):
+    """Uniform random choice, the historical behaviour"""
+    name = "random"
+
+    def choose(self, candidates: List):
+        return random.choice(candidates)
+
+
+class PowerOfTwoBalancer(Balancer):
+    """Sample two pods and keep the one with fewer requests in flight"""
+    name = "p2c"
+
+    def score(self, stats: BackendStats) -> float:
+        return stats.inflight
+
+    def choose(self, candidates: List):
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        return first if self.score(self.stats_for(first)) <= self.score(self.stats_for(second)) else second
+
+
+class EwmaBalancer(PowerOfTwoBalancer):
+    """Power of two choices on EWMA latency weighted by the requests already queued"""
+    name = "ewma"
+
+    def score(self, stats: BackendStats) -> float:
+        return stats.ewma_latency * (stats.inflight + 1)
+
+
+class WeightedRoundRobinBalancer(Balancer):
+    """Smooth weighted round robin; a pod's weight comes from its mtd-weight label"""
+    name = "wrr"
+
+    def choose(self, candidates: List):
+        with self.lock:
+            total = 0
+            best, best_stats = None, None
+            for pod in candidates:
+                stats = self.stats.setdefault(pod.pod_name, BackendStats())
+                weight = getattr(pod, "weight", 1)
+                stats.current_weight += weight
+                total += weight
+                if best_stats is None or stats.current_weight > best_stats.current_weight:
+                    best, best_stats = pod, stats
+            best_stats.current_weight -= total
+            return best
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (RandomBalancer, PowerOfTwoBalancer, EwmaBalancer, WeightedRoundRobinBalancer)}
+
+
+def create_balancer(name: str) -> Balancer:
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown balancing strategy {name}, expected one of {', '.join(STRATEGIES)}")
+    return STRATEGIES[name]()
+
+
+class HealthProber:
+    """Actively probe the webapp /health endpoint of every routable pod"""
+    INTERVAL_SECONDS = float(os.environ.get("LB_HEALTH_CHECK_INTERVAL", 5))
+    TIMEOUT_SECONDS = float(os.environ.get("LB_HEALTH_CHECK_TIMEOUT", 1))
+    UNHEALTHY_THRESHOLD = int(os.environ.get("LB_HEALTH_CHECK_UNHEALTHY_THRESHOLD", 2))
+
+    def __init__(self, balancer: Balancer, pods_provider: Callable[[], List]):
+        self.balancer = balancer
+        self.pods_provider = pods_provider
+        self.session = req.Session()
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "health-prober")
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def probe(self, pod) -> bool:
+        try:
+            response = self.session.get(f"http://{pod.pod_ip}:{pod.port}/health", timeout=self.TIMEOUT_SECONDS)
+            return response.status_code == 200
+        except req.exceptions.RequestException:
+            return False
+
+    def _run(self):
+        while not self._stopped.wait(self.INTERVAL_SECONDS):
+            for pod in list(self.pods_provider()):
+                healthy = self.probe(pod)
+                if not healthy:
+                    self.logger.warning(f"Health check failed for pod {pod.pod_name} at IP {pod.pod_ip}")
+                self.balancer.mark_health(pod, healthy)
@@ -0,0 +1,53 @@
+import os
+import threading
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
+
+import requests as req
+from requests.adapters import HTTPAdapter
+
+
+class PodSessionPool:
+    """Keep one keep-alive ``requests.Session`` per backend pod IP"""
+    POOL_MAXSIZE = int(os.environ.get("PROXY_POOL_MAXSIZE", 64))
+    MAX_PODS = int(os.environ.get("PROXY_POOL_MAX_PODS", 64))
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, req.Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def session_for(self, pod_ip: str) -> req.Session:
+        """Return the pooled session for a pod, creating it on first use"""
+        with self._lock:
+            session = self._sessions.get(pod_ip)
+            if session is not None:
+                self._sessions.move_to_end(pod_ip)
+                return session
+
+            session = req.Session()
+            # Sessions are shared by all clients: never keep upstream cookies in the jar
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            session.trust_env = False
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.POOL_MAXSIZE, max_retries=0)
+            session.mount("http://", adapter)
+            self._sessions[pod_ip] = session
+
+            """ Rotated pods never come back, so drop the least recently used ones """
+            while len(self._sessions) > self.MAX_PODS:
+                _, stale = self._sessions.popitem(last=False)
+                stale.close()
+            return session
+
+    def discard(self, pod_ip: str):
+        """Close the connections to a pod, e.g. after it stopped answering"""
+        with self._lock:
+            session = self._sessions.pop(pod_ip, None)
+        if session is not None:
+            session.close()
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
@@ -1,55 +1,164 @@
-from kubernetes import client, config
-import random
-import datetime
-import os
-
-"""Create decoy pods """
-def create_decoy_pods(namespace: str, num_pods: int, label: str):
-    """
-    Create decoy pods to confuse attackers.
-    """
-    try:
-        decoy_pods = []
-        for i in range(num_pods):
-            
-            """Generate decoy pod names and random IP addresses for each """
-
-            pod_name = f"decoy-pod-{random.randint(1000, 9999)}"
-            decoy_pod = client.V1Pod(
-                metadata=client.V1ObjectMeta(
-                    name=pod_name,
-                    labels={'app': 'decoy', 'mtd-rotation': label}
-                ),
-                spec=client.V1PodSpec(
-                    containers=[client.V1Container(
-                        name="decoy-container",
-                        image="nginx",  # Use a simple decoy container like NGINX
-                    )]
-                )
-            )
-            decoy_pods.append(decoy_pod)
-            api_instance = client.CoreV1Api()
-            api_instance.create_namespaced_pod(namespace=namespace, body=decoy_pod)
-        
-        print(f"Created {num_pods} decoy pods with label {label}")
-    except Exception as e:
-        print(f"Error creating decoy pods: {e}")
-
-"""Rotate decoy pods (delete old ones and create new ones)"""
-def rotate_decoy_pods(namespace: str, label: str):
-    """
-    Rotate decoy pods periodically to confuse attackers.
-    """
-    try:
-        """Delete existing decoy pods"""
-        
-        api_instance = client.CoreV1Api()
-        pods = api_instance.list_namespaced_pod(namespace=namespace, label_selector=f"app=decoy,mtd-rotation={label}")
-        
-        for pod in pods.items:
-            api_instance.delete_namespaced_pod(pod.metadata.name, namespace)
-            print(f"Deleted decoy pod {pod.metadata.name}")
-        
-        create_decoy_pods(namespace, 3, label)  # Create 3 new decoy pods with the new label
-    except Exception as e:
-        print(f"Error rotating decoy pods: {e}")
+import datetime
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import List, Optional
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+import utils
+from pod_cache import instrument_api_client
+
+
+class DecoyPodManager:
+    """
+    Keeps DECOY_PODS decoy pods running next to the webapp and replaces them on rotation.
+
+    Pods are created and deleted concurrently on a bounded thread pool sharing one
+    API client, so a rotation costs about one API round trip plus the pod start-up
+    time however many decoys there are (up to WORKERS). Rotation is make-before-break:
+    the old decoys are only deleted once the new ones are running.
+
+    Decoys carry app=decoy and an mtd-decoy label rather than mtd-rotation, so they
+    are never mistaken for pods of a webapp generation.
+    """
+    ENABLED = os.environ.get("DECOY_ENABLED", "true").lower() == "true"
+    TARGET = int(os.environ.get("DECOY_PODS", 3))
+    WORKERS = int(os.environ.get("DECOY_WORKERS", 8))
+    IMAGE = os.environ.get("DECOY_IMAGE", "nginx")  # Use a simple decoy container like NGINX
+    READY_TIMEOUT_SECONDS = float(os.environ.get("DECOY_READY_TIMEOUT", 30))
+
+    def __init__(self, namespace: str, pod_cache, k8s_api=None):
+        self.namespace = namespace
+        self.pod_cache = pod_cache
+        self.k8s_api = k8s_api or self.create_api()
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "decoy-manager")
+        self.executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="decoy")
+        """ Rotation and reconciliation must not interleave """
+        self.lock = threading.Lock()
+        self.label: Optional[str] = None
+        self.stats = {"created": 0, "deleted": 0, "failures": 0, "rotations": 0}
+        # Workers count while the rotating thread holds self.lock, so the counters need their own
+        self.stats_lock = threading.Lock()
+
+    def create_api(self) -> client.CoreV1Api:
+        """One API client for every worker, with a connection per worker so none is thrown away"""
+        configuration = client.Configuration.get_default_copy()
+        configuration.connection_pool_maxsize = max(configuration.connection_pool_maxsize or 0, self.WORKERS)
+        return client.CoreV1Api(instrument_api_client(client.ApiClient(configuration)))
+
+    def decoys(self, label: Optional[str] = None) -> List:
+        """Decoy pods in the pod cache that are not being deleted, of one label or all of them"""
+        selector = {"app": "decoy"} if label is None else {"app": "decoy", "mtd-decoy": label}
+        return [pod for pod in self.pod_cache.pods(selector) if not pod.terminating]
+
+    def decoy_body(self, label: str) -> client.V1Pod:
+        return client.V1Pod(
+            metadata=client.V1ObjectMeta(
+                generate_name="decoy-pod-",
+                labels={"app": "decoy", "mtd-decoy": label}
+            ),
+            spec=client.V1PodSpec(
+                containers=[client.V1Container(name="decoy-container", image=self.IMAGE)]
+            )
+        )
+
+    def _count(self, key: str):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _create(self, label: str) -> Optional[str]:
+        try:
+            pod = self.k8s_api.create_namespaced_pod(namespace=self.namespace, body=self.decoy_body(label))
+            self._count("created")
+            return pod.metadata.name
+        except Exception as e:
+            self._count("failures")
+            self.logger.error(f"Error creating decoy pod: {e}")
+            return None
+
+    def _delete(self, name: str):
+        try:
+            self.k8s_api.delete_namespaced_pod(name, self.namespace, grace_period_seconds=0)
+            self._count("deleted")
+        except ApiException as e:
+            if e.status != 404:
+                self._count("failures")
+                self.logger.error(f"Error deleting decoy pod {name}: {e}")
+        except Exception as e:
+            self._count("failures")
+            self.logger.error(f"Error deleting decoy pod {name}: {e}")
+
+    def create(self, label: str, count: int) -> List[str]:
+        """Create count decoys concurrently and return the names that were accepted"""
+        futures = [self.executor.submit(self._create, label) for _ in range(count)]
+        wait(futures)
+        return [future.result() for future in futures if future.result()]
+
+    def delete(self, names: List[str]):
+        wait([self.executor.submit(self._delete, name) for name in names])
+
+    def wait_running(self, label: str, count: int) -> int:
+        """Wait, on watch events, until count decoys of a label are running; returns how many are"""
+        running = lambda: sum(1 for pod in self.decoys(label) if pod.phase == "Running")
+        self.pod_cache.wait_for(lambda: running() >= count, timeout=self.READY_TIMEOUT_SECONDS)
+        return running()
+
+    def start(self):
+        """Adopt the decoys left by a previous controller and top them up in the background"""
+        if not self.ENABLED:
+            self.logger.info("Decoy pods are disabled")
+            return
+        labels = sorted({pod.labels.get("mtd-decoy") for pod in self.decoys() if pod.labels.get("mtd-decoy")})
+        self.label = labels[-1] if labels else None
+        threading.Thread(target=self.reconcile, name="decoy-reconcile", daemon=True).start()
+
+    def reconcile(self):
+        """Bring the current label back to TARGET decoys and delete failed, surplus and stray ones"""
+        if not self.ENABLED:
+            return
+        with self.lock:
+            if self.label is None:
+                self._rotate()
+                return
+            current = self.decoys(self.label)
+            failed = [pod.name for pod in current if pod.phase in ("Failed", "Succeeded")]
+            healthy = [pod.name for pod in current if pod.name not in failed]
+            stray = [pod.name for pod in self.decoys() if pod.labels.get("mtd-decoy") != self.label]
+            surplus = healthy[self.TARGET:]
+            missing = self.TARGET - len(healthy)
+            if missing > 0:
+                self.create(self.label, missing)
+            if failed or surplus or stray:
+                self.delete(failed + surplus + stray)
+            if missing > 0 or failed or surplus or stray:
+                self.logger.info(f"Reconciled decoys: {max(missing, 0)} created, {len(failed + surplus + stray)} deleted")
+
+    def rotate(self):
+        """Replace every decoy with a new one under a new label, make-before-break"""
+        if not self.ENABLED:
+            return
+        with self.lock:
+            self._rotate()
+
+    def _rotate(self):
+        started = datetime.datetime.now()
+        label = started.strftime("%Y%m%d%H%M%S%f")
+        old = [pod.name for pod in self.decoys() if pod.labels.get("mtd-decoy") != label]
+
+        created = self.create(label, self.TARGET)
+        running = self.wait_running(label, len(created)) if created else 0
+        if running == 0:
+            # Keep the old decoys rather than leave none at all; reconcile will retry
+            self.logger.error(f"No new decoy pod became ready, keeping the {len(old)} current ones")
+            self.delete(created)
+            return
+
+        self.label = label
+        self.delete(old)
+        self._count("rotations")
+        elapsed = (datetime.datetime.now() - started).total_seconds()
+        self.logger.info(f"Rotated decoys to mtd-decoy={label}: {running}/{self.TARGET} running, {len(old)} retired in {elapsed:.3f}s")
+
+    def stop(self):
+        self.executor.shutdown(wait=False)
@@ -1,39 +1,171 @@
-import boto3
-import os
-
-# This function will update the DNS record with a new IP address
-def update_dns_record(new_ip: str):
-    """
-    Update the DNS record for the given IP address using AWS Route 53.
-    """
-    try:
-        # Create Route 53 client
-        route53_client = boto3.client('route53')
-        
-        hosted_zone_id = os.getenv('ROUTE53_HOSTED_ZONE_ID')
-        domain_name = os.getenv('DOMAIN_NAME')  # e.g., "app.example.com"
-        
-        # Prepare the DNS record change request
-        change_batch = {
-            'Changes': [
-                {
-                    'Action': 'UPSERT', 
-                    'ResourceRecordSet': {
-                        'Name': domain_name,
-                        'Type': 'A',
-                        'TTL': 60,  # Time-to-live for the DNS record
-                        'ResourceRecords': [{'Value': new_ip}]
-                    }
-                }
-            ]
-        }
-        
-        # Update the DNS record
-        route53_client.change_resource_record_sets(
-            HostedZoneId=hosted_zone_id,
-            ChangeBatch=change_batch
-        )
-        
-        print(f"DNS record for {domain_name} updated to IP: {new_ip}")
-    except Exception as e:
-        print(f"Error updating DNS record: {e}")
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Iterable, List, Optional
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+import utils
+
+
+class DnsUpdater:
+    """
+    Keeps a multi-value A record in Route 53 pointing at every active pod.
+
+    update() only records the wanted addresses and returns, so rotation never
+    waits on Route 53. A background thread waits until updates have been
+    quiet for DEBOUNCE_SECONDS (or MAX_DELAY_SECONDS have passed), sends one
+    UPSERT for the latest set, and polls the change until it is INSYNC,
+    retrying failures with jittered exponential backoff. Intermediate sets
+    that were superseded before being sent are never sent at all.
+    """
+    HOSTED_ZONE_ID = os.environ.get("ROUTE53_HOSTED_ZONE_ID")
+    DOMAIN_NAME = os.environ.get("DOMAIN_NAME")  # e.g., "app.example.com"
+    ENDPOINT_URL = os.environ.get("ROUTE53_ENDPOINT_URL")  # e.g. a local moto server
+    RECORD_TTL = int(os.environ.get("DNS_RECORD_TTL", 60))
+    DEBOUNCE_SECONDS = float(os.environ.get("DNS_DEBOUNCE_SECONDS", 2))
+    MAX_DELAY_SECONDS = float(os.environ.get("DNS_MAX_DELAY_SECONDS", 10))
+    MAX_ATTEMPTS = int(os.environ.get("DNS_MAX_ATTEMPTS", 5))
+    BACKOFF_BASE = float(os.environ.get("DNS_BACKOFF_BASE", 0.5))
+    BACKOFF_CAP = float(os.environ.get("DNS_BACKOFF_CAP", 30))
+    CONFIRM_TIMEOUT = float(os.environ.get("DNS_CONFIRM_TIMEOUT", 300))
+
+    def __init__(self, client=None, hosted_zone_id: Optional[str] = None, domain_name: Optional[str] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "dns-updater")
+        self._client = client
+        self.hosted_zone_id = hosted_zone_id or self.HOSTED_ZONE_ID
+        self.domain_name = domain_name or self.DOMAIN_NAME
+        self.clock = clock
+        self.condition = threading.Condition()
+        self.pending: Optional[List[str]] = None
+        self.first_requested = 0.0
+        self.last_requested = 0.0
+        self.published: Optional[List[str]] = None
+        self.stats = {"requested": 0, "coalesced": 0, "changes": 0, "failures": 0}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.hosted_zone_id and self.domain_name)
+
+    @property
+    def client(self):
+        """One Route 53 client for the life of the updater, created on first use"""
+        if self._client is None:
+            self._client = boto3.client(
+                "route53",
+                endpoint_url=self.ENDPOINT_URL,
+                config=Config(retries={"max_attempts": 1}, connect_timeout=5, read_timeout=10)
+            )
+        return self._client
+
+    def start(self):
+        if not self.enabled:
+            self.logger.warning("ROUTE53_HOSTED_ZONE_ID or DOMAIN_NAME not set, DNS updates are disabled")
+            return
+        self._thread = threading.Thread(target=self._run, name="dns-updater", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopped.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def update(self, ips: Iterable[str]):
+        """Ask for the record to hold exactly these addresses, without waiting for Route 53"""
+        wanted = sorted(set(ip for ip in ips if ip))
+        if not self.enabled or not wanted:
+            return
+        with self.condition:
+            now = self.clock()
+            self.stats["requested"] += 1
+            if self.pending is None:
+                self.first_requested = now
+            else:
+                self.stats["coalesced"] += 1
+            self.pending = wanted
+            self.last_requested = now
+            self.condition.notify_all()
+
+    def _next_batch(self) -> Optional[List[str]]:
+        """Block until a debounced set of addresses is due, or the updater stops"""
+        with self.condition:
+            while not self._stopped.is_set():
+                if self.pending is None:
+                    self.condition.wait()
+                    continue
+                due = min(self.last_requested + self.DEBOUNCE_SECONDS, self.first_requested + self.MAX_DELAY_SECONDS)
+                remaining = due - self.clock()
+                if remaining <= 0:
+                    batch, self.pending = self.pending, None
+                    return batch
+                self.condition.wait(remaining)
+        return None
+
+    def _superseded(self) -> bool:
+        with self.condition:
+            return self.pending is not None
+
+    def _run(self):
+        while True:
+            ips = self._next_batch()
+            if ips is None:
+                return
+            if ips != self.published:
+                self.publish(ips)
+
+    def publish(self, ips: List[str]) -> bool:
+        """UPSERT the record and wait for the change to be INSYNC, retrying with backoff"""
+        change_batch = {
+            "Comment": "MTD pod rotation",
+            "Changes": [{
+                "Action": "UPSERT",
+                "ResourceRecordSet": {
+                    "Name": self.domain_name,
+                    "Type": "A",
+                    "TTL": self.RECORD_TTL,
+                    "ResourceRecords": [{"Value": ip} for ip in ips],
+                },
+            }],
+        }
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                response = self.client.change_resource_record_sets(HostedZoneId=self.hosted_zone_id, ChangeBatch=change_batch)
+                self.stats["changes"] += 1
+                if self._confirm(response["ChangeInfo"]["Id"]):
+                    self.published = ips
+                    self.logger.info(f"DNS record for {self.domain_name} now points at {', '.join(ips)}")
+                return True
+            except (BotoCoreError, ClientError, TimeoutError) as e:
+                self.stats["failures"] += 1
+                self.logger.warning(f"DNS update attempt {attempt}/{self.MAX_ATTEMPTS} failed: {e}")
+            if self._superseded():
+                # Newer addresses are waiting: retrying this set would only delay them
+                return False
+            if self._stopped.wait(random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))):
+                return False
+        self.logger.error(f"Giving up on DNS update to {', '.join(ips)} after {self.MAX_ATTEMPTS} attempts")
+        return False
+
+    def _confirm(self, change_id: str) -> bool:
+        """
+        Poll a change until Route 53 reports it INSYNC. Returns False when a
+        newer update makes waiting pointless; raises TimeoutError past CONFIRM_TIMEOUT.
+        """
+        deadline = self.clock() + self.CONFIRM_TIMEOUT
+        delay = 1.0
+        while self.client.get_change(Id=change_id)["ChangeInfo"]["Status"] != "INSYNC":
+            if self._superseded() or self._stopped.is_set():
+                return False
+            if self.clock() > deadline:
+                raise TimeoutError(f"DNS change {change_id} not in sync after {self.CONFIRM_TIMEOUT:.0f}s")
+            self._stopped.wait(delay)
+            delay = min(delay * 2, 15)
+        return True
@@ -1,253 +1,473 @@
-import datetime
-import logging
-import os
-import random
-import signal
-import uuid
-from flask import Flask, request, Response
-from typing import List, Dict
-from markupsafe import escape
-from apscheduler.job import Job
-from apscheduler.schedulers.background import BackgroundScheduler
-from pytimeparse.timeparse import timeparse
-from kubernetes import client, config
-import utils
-import dns_updater 
-
-class KubernetesApp:
-    def __init__(self, pod_name: str, pod_ip: str):
-        self.pod_name = pod_name
-        self.pod_ip = pod_ip
-        self.hostname = pod_name
-        self.initialized = datetime.datetime.now()
-        self.logger = utils.create_stdout_logger(logging.DEBUG, pod_name)
-        self.logger.info(f"tracking pod {pod_name} at IP {pod_ip}")
-
-
-class KubernetesController:
-    LIVE_APPS = int(os.environ.get("REPLICAS", 3))
-    TIME_TO_LIVE = datetime.timedelta(seconds=timeparse(os.environ.get("APP_TTL", "3000s")))
-    DECOMMISSION_PERIOD = datetime.timedelta(seconds=timeparse(os.environ.get("APP_DECOMMISSION_PERIOD", "1500s")))
-    APP_NAMESPACE = os.environ.get("APP_NAMESPACE", "default")
-    APP_LABEL_SELECTOR = os.environ.get("APP_LABEL_SELECTOR", "app=webapp")
-    IP_SHUFFLE_ENABLED = os.environ.get("IP_SHUFFLE_ENABLED", "true").lower() == "true"
-    GRACEFUL_ROTATION = os.environ.get("GRACEFUL_ROTATION", "true").lower() == "true"
-
-    def __init__(self):
-
-        """ Load kubeconfig """
-
-        if os.path.exists(os.path.expanduser("~/.kube/config")):
-            config.load_kube_config()
-        else:
-            config.load_incluster_config()  # In-cluster configuration
-        
-        self.k8s_api = client.CoreV1Api()
-        self.k8s_apps_api = client.AppsV1Api()
-        
-        self.logger = utils.create_stdout_logger(logging.DEBUG, "k8s-controller")
-        
-        """Track active pods"""
-
-        self.active_pods: List[KubernetesApp] = []
-        self.next_pods: List[KubernetesApp] = []
-        
-        """ Initialize pods """
-        self.active_pods = self.get_current_pods()
-        self.next_pods = self.create_new_pods()
-
-        """ Setup scheduler for pod rotation """
-        self.scheduler: BackgroundScheduler = BackgroundScheduler()
-        self.rotation_job: Job = self.scheduler.add_job(
-            func=lambda: self.rotate_pods(),
-            trigger="interval",
-            seconds=self.TIME_TO_LIVE.seconds,
-            max_instances=1,
-            replace_existing=False
-        )
-        self.scheduler.start()
-        
-        # Handle shutdown
-        signal.signal(signal.SIGTERM, lambda signum, frame: self.shutdown())
-        signal.signal(signal.SIGINT, lambda signum, frame: self.shutdown())
-
-    def get_current_pods(self) -> List[KubernetesApp]:
-        """Get list of currently running pods with the webapp label"""
-        pods = []
-        try:
-            pod_list = self.k8s_api.list_namespaced_pod(
-                namespace=self.APP_NAMESPACE,
-                label_selector=self.APP_LABEL_SELECTOR
-            )
-            
-            for pod in pod_list.items:
-                if pod.status.phase == 'Running' and pod.status.pod_ip:
-                    pods.append(KubernetesApp(pod.metadata.name, pod.status.pod_ip))
-            
-            honeypot_pods = self.k8s_api.list_namespaced_pod(
-                namespace=self.APP_NAMESPACE,
-                label_selector="app=opencanary"
-            )
-            for pod in honeypot_pods.items:
-                if pod.status.phase == 'Running' and pod.status.pod_ip:
-                   self.logger.info(f"Honeypot running at IP: {pod.status.pod_ip}")
-
-            self.logger.info(f"Found {len(pods)} running pods")
-            return pods
-        except Exception as e:
-            self.logger.error(f"Error getting current pods: {e}")
-            return []
-
-    def create_new_pods(self) -> List[KubernetesApp]:
-        """Create a new set of pods for the next rotation"""
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        deployment_name = f"webapp-{timestamp}"
-        
-        try:
-            deployment = self.k8s_apps_api.read_namespaced_deployment(
-                name="webapp",
-                namespace=self.APP_NAMESPACE
-            )
-            
-            # Modify the deployment for the new instance
-            deployment.metadata.name = deployment_name
-            deployment.metadata.resource_version = None
-            deployment.spec.template.metadata.labels["mtd-rotation"] = timestamp
-            deployment.spec.selector.match_labels["mtd-rotation"] = timestamp
-            
-            self.k8s_apps_api.create_namespaced_deployment(
-                namespace=self.APP_NAMESPACE,
-                body=deployment
-            )
-            
-            self.logger.info(f"Created new deployment {deployment_name}")
-            
-            # Wait for the pods to be get ready
-            ready_pods = []
-            retry_count = 0
-            max_retries = 30
-            
-            while len(ready_pods) < self.LIVE_APPS and retry_count < max_retries:
-                pod_list = self.k8s_api.list_namespaced_pod(
-                    namespace=self.APP_NAMESPACE,
-                    label_selector=f"mtd-rotation={timestamp}"
-                )
-                
-                ready_pods = []
-                for pod in pod_list.items:
-                    if pod.status.phase == 'Running' and pod.status.pod_ip:
-                        ready_pods.append(KubernetesApp(pod.metadata.name, pod.status.pod_ip))
-                
-                if len(ready_pods) < self.LIVE_APPS:
-                    import time
-                    time.sleep(1)
-                    retry_count += 1
-            
-            if len(ready_pods) < self.LIVE_APPS:
-                self.logger.warning(f"Only {len(ready_pods)} pods are ready after max retries")
-            
-            return ready_pods
-            
-        except Exception as e:
-            self.logger.error(f"Error creating new pods: {e}")
-            return []
-
-    def rotate_pods(self):
-        """Rotate active pods with the next set of pods"""
-        self.logger.info("Rotating pods")
-        
-        # Store old pods for later cleanup
-        old_pods = self.active_pods
-        old_pod_labels = {}
-        
-        # Extract mtd-rotation labels from old pods
-        try:
-            for pod in old_pods:
-                pod_details = self.k8s_api.read_namespaced_pod(
-                    name=pod.pod_name, 
-                    namespace=self.APP_NAMESPACE
-                )
-                if 'mtd-rotation' in pod_details.metadata.labels:
-                    old_pod_labels[pod_details.metadata.labels['mtd-rotation']] = True
-        except Exception as e:
-            self.logger.error(f"Error getting pod labels: {e}")
-        
-        # Update service selector to point to new pods
-        if self.next_pods:
-            try:
-                # Get first pod to extract the rotation label
-                pod_details = self.k8s_api.read_namespaced_pod(
-                    name=self.next_pods[0].pod_name, 
-                    namespace=self.APP_NAMESPACE
-                )
-                new_rotation_label = pod_details.metadata.labels.get('mtd-rotation')
-                
-                if new_rotation_label:
-                    """ Update service to new rotation label """ 
-                    
-                    service = self.k8s_api.read_namespaced_service(
-                        name="webapp-service",
-                        namespace=self.APP_NAMESPACE
-                    )
-                    service.spec.selector['mtd-rotation'] = new_rotation_label
-                    
-                    self.k8s_api.patch_namespaced_service(
-                        name="webapp-service",
-                        namespace=self.APP_NAMESPACE,
-                        body=service
-                    )
-                    self.logger.info(f"Updated service selector to mtd-rotation={new_rotation_label}")
-                    
-                    # Update DNS with the new pod IPs
-                    new_ip = self.next_pods[0].pod_ip  
-                    dns_updater.update_dns_record(new_ip)
-            
-            except Exception as e:
-                self.logger.error(f"Error updating service selector: {e}")
-        
-        
-        self.active_pods = self.next_pods
-        
-        # cleanup of old pods
-        def cleanup_old_deployments():
-            try:
-                for label in old_pod_labels:
-                    self.logger.info(f"Deleting deployment with label mtd-rotation={label}")
-                    self.k8s_apps_api.delete_collection_namespaced_deployment(
-                        namespace=self.APP_NAMESPACE,
-                        label_selector=f"mtd-rotation={label}"
-                    )
-            except Exception as e:
-                self.logger.error(f"Error cleaning up old deployments: {e}")
-        
-        self.scheduler.add_job(
-            func=cleanup_old_deployments,
-            trigger="date",
-            run_date=datetime.datetime.now() + self.DECOMMISSION_PERIOD
-        )
-        
-        """ Create new set of pods for next rotation """
-
-
-
-        self.next_pods = self.create_new_pods()
-
-    def random_app(self) -> KubernetesApp:
-        """Return a random app from the active pool"""
-        if not self.active_pods:
-            self.logger.warning("No active pods available, getting current pods")
-            self.active_pods = self.get_current_pods()
-            
-        if self.active_pods:
-            return random.choice(self.active_pods)
-        else:
-            raise Exception("No active pods available for routing")
-
-    def shutdown(self):
-        """ shutdown the controller"""
-        self.logger.info("Shutting down controller")
-        if self.rotation_job:
-            self.rotation_job.remove()
-        
-        self.scheduler.shutdown(wait=False)
-        exit(0)
+import datetime
+import logging
+import os
+import signal
+import threading
+import uuid
+from flask import Flask, request, Response
+from typing import List, Optional, Set, Tuple
+from markupsafe import escape
+from apscheduler.job import Job
+from apscheduler.schedulers.background import BackgroundScheduler
+from pytimeparse.timeparse import timeparse
+from kubernetes import client, config
+import metrics
+import utils
+from decoy_pod_manager import DecoyPodManager
+from dns_updater import DnsUpdater
+from leader_election import LeaderElector
+from pod_cache import PodInformer, instrument_api_client, parse_label_selector
+from pod_registry import KubernetesApp, PodRegistry
+from balancing import HealthProber, create_balancer
+from rotation_pipeline import Generation, RotationPipeline
+from rotation_scheduler import RotationScheduler, RotationSignals
+from traffic_classifier import DIVERSIONS
+
+
+class KubernetesController:
+    LIVE_APPS = int(os.environ.get("REPLICAS", 3))
+    TIME_TO_LIVE = datetime.timedelta(seconds=timeparse(os.environ.get("APP_TTL", "3000s")))
+    DECOMMISSION_PERIOD = datetime.timedelta(seconds=timeparse(os.environ.get("APP_DECOMMISSION_PERIOD", "1500s")))
+    APP_NAMESPACE = os.environ.get("APP_NAMESPACE", "default")
+    APP_LABEL_SELECTOR = os.environ.get("APP_LABEL_SELECTOR", "app=webapp")
+    IP_SHUFFLE_ENABLED = os.environ.get("IP_SHUFFLE_ENABLED", "true").lower() == "true"
+    GRACEFUL_ROTATION = os.environ.get("GRACEFUL_ROTATION", "true").lower() == "true"
+    READY_TIMEOUT = datetime.timedelta(seconds=timeparse(os.environ.get("APP_READY_TIMEOUT", "30s")))
+    LB_STRATEGY = os.environ.get("LB_STRATEGY", "p2c").lower()
+    HONEYPOT_LABEL_SELECTOR = os.environ.get("HONEYPOT_LABEL_SELECTOR", "app=opencanary")
+    HONEYPOT_PORT = int(os.environ.get("HONEYPOT_PORT", 8000))
+    DECOY_RECONCILE_INTERVAL = datetime.timedelta(seconds=timeparse(os.environ.get("DECOY_RECONCILE_INTERVAL", "30s")))
+    ROTATION_SCHEDULE = os.environ.get("ROTATION_SCHEDULE", "adaptive").lower()  # adaptive, or fixed to rotate every APP_TTL
+    ROLE_LABEL = "mtd-role"  # active, standby or retiring, set by the leader on webapp pods
+
+    def __init__(self):
+
+        """ Load kubeconfig """
+
+        if os.path.exists(os.path.expanduser("~/.kube/config")):
+            config.load_kube_config()
+        else:
+            config.load_incluster_config()  # In-cluster configuration
+        
+        """ One API client, timed, for both API groups """
+        api_client = instrument_api_client(client.ApiClient())
+        self.k8s_api = client.CoreV1Api(api_client)
+        self.k8s_apps_api = client.AppsV1Api(api_client)
+        
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "k8s-controller")
+        
+        """ Watch-fed pod inventory, so reads never poll the API server """
+        self.app_labels = parse_label_selector(self.APP_LABEL_SELECTOR)
+        self.honeypot_labels = parse_label_selector(self.HONEYPOT_LABEL_SELECTOR)
+        self.pod_cache = PodInformer(self.k8s_api, self.APP_NAMESPACE)
+        if not self.pod_cache.start(timeout=self.READY_TIMEOUT.total_seconds()):
+            self.logger.warning("Pod cache has not synced yet")
+        
+        """ Track pods by generation; request threads read the registry's snapshot without locking """
+
+        self.registry = PodRegistry()
+        self.honeypot_version = -1
+        self.role_version = -1
+        self.scale_lock = threading.Lock()
+        self.leadership_lock = threading.Lock()
+        self.rotation: Optional[RotationPipeline] = None
+        self.rotation_scheduler: Optional[RotationScheduler] = None
+        self.rotation_job: Optional[Job] = None
+        self.decoy_job: Optional[Job] = None
+
+        """ One replica drives rotations; the others follow the pod roles it labels """
+        self.elector = LeaderElector(self.APP_NAMESPACE, self.start_leading, self.stop_leading,
+                                     coordination_api=client.CoordinationV1Api(api_client))
+        
+        """ Backend selection with passive outlier ejection and active health checks """
+        self.balancer = create_balancer(self.LB_STRATEGY)
+        self.health_prober = HealthProber(self.balancer, lambda: self.registry.snapshot.routable)
+
+        """ Route 53 record of the active pods, updated in the background """
+        self.dns_updater = DnsUpdater()
+        self.dns_updater.start()
+
+        """ Decoy pods, replaced together with every rotation """
+        self.decoy_manager = DecoyPodManager(self.APP_NAMESPACE, self.pod_cache)
+        
+        """ Initialize pods as the leader labelled them, or every serving pod before there is one """
+        self.follow()
+        self.health_prober.start()
+
+        """ Rotation and decoy jobs only run on the leader, see start_leading """
+        self.scheduler: BackgroundScheduler = BackgroundScheduler()
+        self.scheduler.start()
+        
+        self.register_metrics()
+        self.elector.start()
+
+        # Handle shutdown
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.shutdown())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.shutdown())
+
+    def register_metrics(self):
+        """Gauges and counters read from the controller's own state when /metrics is scraped"""
+        backends = lambda field: [((name,), getattr(stats, field)) for name, stats in list(self.balancer.stats.items())]
+        metrics.CallbackGauge("lb_backend_inflight", "Requests in flight to each backend pod, bodies included", ["backend"], lambda: backends("inflight"))
+        metrics.CallbackGauge("lb_backend_open_streams", "Response bodies being relayed from each backend pod", ["backend"], lambda: backends("open_streams"))
+        metrics.CallbackGauge("lb_backend_healthy", "1 when a backend pod passes health checks and is not ejected", ["backend"], lambda: [
+            ((name,), int(stats.healthy and stats.ejected_until <= self.balancer.clock())) for name, stats in list(self.balancer.stats.items())
+        ])
+        metrics.CallbackGauge("mtd_pods", "Webapp pods by role", ["role"], lambda: [
+            ((role,), len(pods)) for role, pods in self.pod_roles()
+        ])
+        metrics.CallbackGauge("mtd_leader", "1 on the replica that drives rotations", [], lambda: [((), int(self.elector.is_leader))])
+        metrics.CallbackCounter("mtd_leader_election_total", "Lease acquisitions, renewals, losses, conflicts and failed calls", ["event"],
+                                lambda: [((event,), count) for event, count in self.elector.stats.items()])
+        # Exported once this replica first leads, and kept at their last values after it steps down
+        metrics.CallbackGauge("mtd_generations_retiring", "Generations draining or being deleted", [],
+                              lambda: [((), len(self.rotation.retiring))] if self.rotation else [])
+        metrics.CallbackCounter("mtd_rotation_decisions_total", "Rotations by trigger, shortened intervals and deferred checks by cause", ["decision"],
+                                lambda: [((decision,), count) for decision, count in self.rotation_scheduler.stats.items()] if self.rotation_scheduler else [])
+        metrics.CallbackGauge("mtd_rotation_due_seconds", "Seconds until the next rotation is due, negative while deferred", [],
+                              lambda: [((), self.rotation_scheduler.seconds_until_due())] if self.rotation_scheduler else [])
+        metrics.CallbackCounter("mtd_dns_updates_total", "Route 53 updates requested, coalesced, sent and failed", ["event"],
+                                lambda: [((event,), count) for event, count in self.dns_updater.stats.items()])
+        metrics.CallbackCounter("mtd_decoy_operations_total", "Decoy pods created and deleted, failed calls and rotations", ["event"],
+                                lambda: [((event,), count) for event, count in self.decoy_manager.stats.items()])
+
+    def start_leading(self):
+        """
+        Take over rotations. The pods keep the roles the previous leader
+        labelled; its standby generation and draining pods are retired, since
+        no rotation it had started can be finished from here.
+        """
+        with self.leadership_lock:
+            self.role_version = -1
+            self._follow()
+            snapshot = self.registry.snapshot
+            leftovers = Generation({pod.label for pod in snapshot.standby + snapshot.retiring if pod.label})
+            leftovers.pods = list(snapshot.standby + snapshot.retiring)
+            self.registry.restore(snapshot.active, (), leftovers.pods)
+
+            self.rotation = RotationPipeline(self, self.current_generation())
+            if leftovers.pods:
+                self.logger.info(f"Retiring {len(leftovers.pods)} pods left by the previous leader")
+                self.rotation.retire(leftovers, delete=self.delete_pods)
+
+            """ Setup scheduler for pod rotation: checked every few seconds when adaptive, else every TTL """
+            """ A rolling rotation replaces one slice per step, so a pod still lives for about a TTL """
+            step_seconds = self.TIME_TO_LIVE.total_seconds() / self.rotation.steps
+            self.rotation_scheduler = RotationScheduler(step_seconds, self.LIVE_APPS,
+                                                        max_pods=self.rotation.max_pods, step_pods=self.rotation.batch)
+            adaptive = self.ROTATION_SCHEDULE == "adaptive"
+            self.rotation_job = self.scheduler.add_job(
+                func=lambda: self.check_rotation() if adaptive else self.rotate_pods(),
+                trigger="interval",
+                seconds=RotationScheduler.CHECK_INTERVAL_SECONDS if adaptive else step_seconds,
+                max_instances=1,
+                replace_existing=False
+            )
+            self.decoy_manager.start()
+            self.decoy_job = self.scheduler.add_job(
+                func=lambda: self.decoy_manager.reconcile(),
+                trigger="interval",
+                seconds=self.DECOY_RECONCILE_INTERVAL.total_seconds(),
+                max_instances=1,
+                replace_existing=False
+            )
+        # Label pods that no leader has labelled yet, e.g. on the first start
+        self.label_roles()
+
+    def stop_leading(self):
+        """Another replica drives rotations now: stop the jobs and the pipeline, and follow its labels"""
+        with self.leadership_lock:
+            for job in (self.rotation_job, self.decoy_job):
+                if job is not None:
+                    job.remove()
+            self.rotation_job = self.decoy_job = None
+            if self.rotation is not None:
+                self.rotation.stop()
+            self.role_version = -1
+
+    def follow(self):
+        """Follower: take the pod roles from the watch cache, rebuilt only once the cache has changed"""
+        if self.elector.is_leader or self.pod_cache.version == self.role_version:
+            return
+        with self.leadership_lock:
+            if not self.elector.is_leader:
+                self._follow()
+
+    def _follow(self):
+        self.role_version = self.pod_cache.version
+        roles = {"active": [], "standby": [], "retiring": []}
+        unlabelled = []
+        for pod in self.pod_cache.pods(self.app_labels):
+            role = pod.labels.get(self.ROLE_LABEL)
+            if not pod.pod_ip or not (pod.serving or role == "retiring"):
+                continue
+            app = self.registry.record(pod.name, pod.pod_ip, pod.weight, label=pod.labels.get("mtd-rotation"))
+            roles.get(role, unlabelled).append(app)
+        # Before any leader labelled pods, every serving webapp pod is active, as without election
+        self.registry.restore(roles["active"] or unlabelled, roles["standby"], roles["retiring"])
+        self.balancer.retain(self.registry.snapshot.tracked)
+
+    def label_roles(self):
+        """Leader: mirror the registry's pod roles onto the pods, where followers read them from the watch cache"""
+        if not self.elector.is_leader:
+            return
+        snapshot = self.registry.snapshot
+        for role, pods in (("active", snapshot.active), ("standby", snapshot.standby), ("retiring", snapshot.retiring)):
+            for pod in pods:
+                record = self.pod_cache.get(pod.pod_name)
+                if record is None or record.labels.get(self.ROLE_LABEL) == role:
+                    continue
+                try:
+                    self.k8s_api.patch_namespaced_pod(
+                        name=pod.pod_name,
+                        namespace=self.APP_NAMESPACE,
+                        body={"metadata": {"labels": {self.ROLE_LABEL: role}}}
+                    )
+                except Exception as e:
+                    self.logger.error(f"Error labelling pod {pod.pod_name} as {role}: {e}")
+
+    def pod_roles(self) -> List[Tuple[str, Tuple[KubernetesApp, ...]]]:
+        snapshot = self.registry.snapshot
+        return [("active", snapshot.active), ("standby", snapshot.standby), ("retiring", snapshot.retiring), ("honeypot", snapshot.honeypots)]
+
+    def get_current_pods(self) -> List[KubernetesApp]:
+        """Get list of currently running pods with the webapp label"""
+        pods = []
+        try:
+            for pod in self.pod_cache.pods(self.app_labels):
+                if pod.serving:
+                    pods.append(self.registry.record(pod.name, pod.pod_ip, pod.weight, label=pod.labels.get("mtd-rotation")))
+            
+            for honeypot in self.honeypot_pods():
+                self.logger.info(f"Honeypot running at IP: {honeypot.pod_ip}")
+
+            self.logger.info(f"Found {len(pods)} running pods")
+            return pods
+        except Exception as e:
+            self.logger.error(f"Error getting current pods: {e}")
+            return []
+
+    def honeypot_pods(self) -> Tuple[KubernetesApp, ...]:
+        """Serving honeypot pods, only looked up again once the pod cache has changed"""
+        version = self.pod_cache.version
+        if version != self.honeypot_version:
+            self.registry.set_honeypots(
+                self.registry.record(pod.name, pod.pod_ip, pod.weight, self.HONEYPOT_PORT)
+                for pod in self.pod_cache.pods(self.honeypot_labels) if pod.serving
+            )
+            self.honeypot_version = version
+        return self.registry.snapshot.honeypots
+
+    def create_deployment(self, label: str, replicas: Optional[int] = None):
+        """Clone the webapp deployment for a new rotation generation, or a slice of one when rolling"""
+        deployment_name = f"webapp-{label}"
+        deployment = self.k8s_apps_api.read_namespaced_deployment(
+            name="webapp",
+            namespace=self.APP_NAMESPACE
+        )
+        
+        # Modify the deployment for the new instance
+        deployment.metadata.name = deployment_name
+        deployment.metadata.resource_version = None
+        if replicas is not None:
+            deployment.spec.replicas = replicas
+        deployment.metadata.labels["mtd-rotation"] = label
+        deployment.spec.template.metadata.labels["mtd-rotation"] = label
+        deployment.spec.selector.match_labels["mtd-rotation"] = label
+        
+        self.k8s_apps_api.create_namespaced_deployment(
+            namespace=self.APP_NAMESPACE,
+            body=deployment
+        )
+        
+        self.logger.info(f"Created new deployment {deployment_name}")
+
+    def wait_for_pods(self, label: str, count: Optional[int] = None) -> List[KubernetesApp]:
+        """Wait for count pods (a whole generation by default) to be ready, woken up by watch events"""
+        count = count or self.LIVE_APPS
+        def generation_pods():
+            return [pod for pod in self.pod_cache.pods({"mtd-rotation": label}) if pod.serving]
+        
+        self.pod_cache.wait_for(
+            lambda: len(generation_pods()) >= count,
+            timeout=self.READY_TIMEOUT.total_seconds()
+        )
+        ready_pods = [self.registry.record(pod.name, pod.pod_ip, pod.weight, label=label) for pod in generation_pods()]
+        
+        if len(ready_pods) < count:
+            self.logger.warning(f"Only {len(ready_pods)} pods are ready after {self.READY_TIMEOUT.total_seconds():.0f}s")
+        
+        return ready_pods
+
+    def current_generation(self) -> Generation:
+        """Wrap the pods found at startup, with whatever mtd-rotation labels they carry"""
+        active = self.active_pods
+        generation = Generation({pod.label for pod in active if pod.label})
+        generation.pods = list(active)
+        return generation
+
+    def publish_generation(self, generation: Generation):
+        """Point the webapp Service and DNS at a generation that just went live"""
+        try:
+            new_rotation_label = next(iter(generation.labels))
+            
+            """ Update service to new rotation label """ 
+            
+            service = self.k8s_api.read_namespaced_service(
+                name="webapp-service",
+                namespace=self.APP_NAMESPACE
+            )
+            service.spec.selector['mtd-rotation'] = new_rotation_label
+            
+            self.k8s_api.patch_namespaced_service(
+                name="webapp-service",
+                namespace=self.APP_NAMESPACE,
+                body=service
+            )
+            self.logger.info(f"Updated service selector to mtd-rotation={new_rotation_label}")
+            
+            # Point DNS at every pod of the generation, in the background
+            self.dns_updater.update(pod.pod_ip for pod in generation.pods)
+        
+        except Exception as e:
+            self.logger.error(f"Error updating service selector: {e}")
+        self.label_roles()
+
+    def publish_pods(self, pods: List[KubernetesApp]):
+        """Rolling rotation: the webapp Service selects every slice, DNS lists the active pods"""
+        try:
+            service = self.k8s_api.read_namespaced_service(
+                name="webapp-service",
+                namespace=self.APP_NAMESPACE
+            )
+            # A patch merges selectors, only a replace drops the generation key
+            if service.spec.selector.pop("mtd-rotation", None) is not None:
+                self.k8s_api.replace_namespaced_service(
+                    name="webapp-service",
+                    namespace=self.APP_NAMESPACE,
+                    body=service
+                )
+                self.logger.info("Service selector no longer pinned to a generation")
+        except Exception as e:
+            self.logger.error(f"Error updating service selector: {e}")
+        self.dns_updater.update(pod.pod_ip for pod in pods)
+        self.label_roles()
+
+    def delete_pods(self, generation: Generation):
+        """
+        Remove single pods that were rotated out: each pod is marked as the one
+        to go and its Deployment is scaled down by one, or deleted with its
+        last pod. Deleting the pod alone would only make its ReplicaSet replace it.
+        """
+        for pod in generation.pods:
+            deployment_name = f"webapp-{pod.label}" if pod.label else "webapp"
+            try:
+                self.k8s_api.patch_namespaced_pod(
+                    name=pod.pod_name,
+                    namespace=self.APP_NAMESPACE,
+                    body={"metadata": {"annotations": {"controller.kubernetes.io/pod-deletion-cost": str(-2 ** 31)}}}
+                )
+                with self.scale_lock:
+                    scale = self.k8s_apps_api.read_namespaced_deployment_scale(name=deployment_name, namespace=self.APP_NAMESPACE)
+                    replicas = max(0, scale.spec.replicas - 1)
+                    if replicas == 0 and pod.label:
+                        self.k8s_apps_api.delete_namespaced_deployment(name=deployment_name, namespace=self.APP_NAMESPACE)
+                        self.logger.info(f"Deleted deployment {deployment_name} with its last pod {pod.pod_name}")
+                    else:
+                        # The webapp template itself is only scaled down, clones are made from it
+                        self.k8s_apps_api.patch_namespaced_deployment_scale(
+                            name=deployment_name,
+                            namespace=self.APP_NAMESPACE,
+                            body={"spec": {"replicas": replicas}}
+                        )
+                        self.logger.info(f"Scaled deployment {deployment_name} to {replicas} without pod {pod.pod_name}")
+            except Exception as e:
+                self.logger.error(f"Error removing pod {pod.pod_name}: {e}")
+        self.registry.forget(generation.pods)
+        self.balancer.retain(self.registry.snapshot.tracked)
+
+    def delete_generation(self, generation: Generation):
+        """Delete the deployments of a retired generation"""
+        for label in generation.labels:
+            # By name: the Role grants delete on deployments, not deletecollection
+            deployment_name = f"webapp-{label}"
+            self.logger.info(f"Deleting deployment {deployment_name}")
+            try:
+                self.k8s_apps_api.delete_namespaced_deployment(name=deployment_name, namespace=self.APP_NAMESPACE)
+            except Exception as e:
+                self.logger.error(f"Error deleting deployment {deployment_name}: {e}")
+        self.registry.forget(generation.pods)
+        self.balancer.retain(self.registry.snapshot.tracked)
+
+    @property
+    def active_pods(self) -> Tuple[KubernetesApp, ...]:
+        """Pods taking traffic"""
+        return self.registry.snapshot.active
+
+    @property
+    def next_pods(self) -> Tuple[KubernetesApp, ...]:
+        """Warmed standby pods for the next rotation"""
+        return self.registry.snapshot.standby
+
+    def rotate_pods(self):
+        """Rotate active pods with the next set of pods"""
+        if not self.elector.is_leader:
+            # A job that was already running when this replica stepped down
+            return
+        self.logger.info("Rotating pods")
+        rolled = self.rotation.rolled
+        self.rotation.rotate()
+        # Rolling steps move the decoys once per full cycle
+        if not self.rotation.rolling or (self.rotation.rolled != rolled and self.rotation.rolled % self.rotation.steps == 0):
+            self.decoy_manager.rotate()
+
+    def rotation_signals(self) -> RotationSignals:
+        snapshot = self.registry.snapshot
+        inflight, _ = self.balancer.load(snapshot.active)
+        # Only transfers on the pods the next rotation retires can be cut
+        _, large_transfers = self.balancer.load(self.rotation.outgoing(snapshot.active))
+        honeypot_hits = sum(values[0] for _, values in DIVERSIONS.samples())
+        return RotationSignals(len(snapshot.active), inflight, large_transfers, honeypot_hits, len(snapshot.tracked))
+
+    def check_rotation(self):
+        """Rotate when the adaptive scheduler says so"""
+        decision = self.rotation_scheduler.decide(self.rotation_signals())
+        if decision is None:
+            return
+        self.logger.info(f"Rotation due ({decision})")
+        started = self.rotation_scheduler.clock()
+        self.rotate_pods()
+        # A rolling step provisions its slice first, counting from the start keeps lifetimes to the TTL
+        self.rotation_scheduler.rotated(started)
+
+    def select_app(self, exclude: Optional[Set[str]] = None) -> KubernetesApp:
+        """Return an app from the active pool, chosen by the configured balancing strategy"""
+        self.follow()
+        snapshot = self.registry.snapshot
+        if not snapshot.active:
+            self.logger.warning("No active pods available, getting current pods")
+            # Only fills the pool if it is still the one read above: a cutover meanwhile wins
+            self.registry.activate(self.get_current_pods(), expected_version=snapshot.version)
+            snapshot = self.registry.snapshot
+
+        if exclude:
+            return self.balancer.pick([pod for pod in snapshot.active if pod.pod_name not in exclude])
+        return self.balancer.pick(snapshot.active)
+
+    def select_honeypot(self) -> Optional[KubernetesApp]:
+        """Return a honeypot pod for a diverted request, or None when no honeypot is serving"""
+        honeypots = self.honeypot_pods()
+        return self.balancer.pick(honeypots) if honeypots else None
+
+    def shutdown(self):
+        """ shutdown the controller"""
+        self.logger.info("Shutting down controller")
+        # Hands the Lease over, which stops the rotation pipeline and jobs if leading
+        self.elector.stop()
+        self.pod_cache.stop()
+        self.health_prober.stop()
+        self.dns_updater.stop(timeout=5)
+        self.decoy_manager.stop()
+        
+        self.scheduler.shutdown(wait=False)
+        exit(0)
@@ -1,37 +1,244 @@
-from flask import Flask, request
-import requests as req
-from improved_k8s_controller import KubernetesController
-from markupsafe import escape
-
-app = Flask("kubernetes load balancer")
-controller = KubernetesController()
-
-@app.route("/", defaults={"path": ""}, methods=["GET", "PUT", "POST"])
-@app.route("/<path:path>", methods=["GET", "PUT", "POST"])
-def route(path):
-    try:
-        # Get a random pod from our controller
-        app_instance = controller.random_app()
-        url = f"http://{app_instance.pod_ip}:8080/{path}"
-        
-        app.logger.info(f"Routing to {url}")
-        
-        # Forward the request to the selected pod
-        response = req.request(
-            method=request.method,
-            url=url,
-            headers={key: value for key, value in request.headers if key != 'Host'},
-            cookies=request.cookies,
-            data=request.get_data(),
-            params=request.args
-        )
-        
-        # Return the response from the pod
-        return response.text, response.status_code, response.headers.items()
-    
-    except Exception as e:
-        app.logger.error(f"Error routing request: {e}")
-        return {"error": "Internal server error"}, 500
-
-if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
+import logging
+import os
+import time
+from typing import Optional
+from flask import Flask, Response, request
+import requests as req
+from urllib3.exceptions import HTTPError as UpstreamError
+from improved_k8s_controller import KubernetesController
+from connection_pool import PodSessionPool
+from resume import ResumableDownload
+from proxying import STREAM_CHUNK_SIZE, forwarded_headers, pod_url, rejection, resume_candidates
+import metrics
+from admission import REQUESTS, RequestGate
+from balancing import STREAMED_BYTES, transfer_size
+from traffic_classifier import TrafficClassifier, client_address
+from markupsafe import escape
+import utils
+
+app = Flask("kubernetes load balancer")
+controller = KubernetesController()
+pod_sessions = PodSessionPool()
+classifier = TrafficClassifier()
+gate = RequestGate(lambda: len(controller.active_pods))
+logger = utils.create_stdout_logger(logging.INFO, "load-balancer")
+# Written on every request, so only a sample is kept, see REQUEST_LOG_SAMPLE_RATE
+request_log = utils.request_logger("load-balancer", "requests")
+
+LB_ENGINE = os.environ.get("LB_ENGINE", "flask").lower()
+
+
+class RequestBodyStream:
+    """Read-only view of the client body that requests can forward without buffering it"""
+
+    def __init__(self, stream, length: int):
+        self.stream = stream
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        return self.stream.read(size)
+
+
+def upstream_body():
+    """Return the client body as a stream, or None when there is nothing to forward"""
+    if request.content_length:
+        return RequestBodyStream(request.stream, request.content_length)
+    if request.headers.get("Transfer-Encoding", "").lower() == "chunked":
+        return iter(lambda: request.stream.read(STREAM_CHUNK_SIZE), b"")
+    return None
+
+
+def resume_upstream(download: ResumableDownload, failed, path: str, headers: dict):
+    """Request the rest of an interrupted download from another pod, or return None"""
+    for app_instance in resume_candidates(controller, download, failed):
+        url = pod_url(app_instance, path)
+        logger.warning(f"Resuming download from byte {download.next_byte} on {url}")
+
+        controller.balancer.acquire(app_instance)
+        started = time.perf_counter()
+        try:
+            upstream = pod_sessions.session_for(app_instance.pod_ip).request(
+                method="GET",
+                url=url,
+                headers=download.resume_headers(headers),
+                stream=True,
+                allow_redirects=False
+            )
+        except req.exceptions.RequestException:
+            pod_sessions.discard(app_instance.pod_ip)
+            controller.balancer.report(app_instance, time.perf_counter() - started, ok=False)
+            controller.balancer.release(app_instance)
+            continue
+        controller.balancer.report(app_instance, time.perf_counter() - started, ok=upstream.status_code < 500)
+
+        if download.accepts(upstream.status_code, upstream.headers):
+            return upstream, app_instance
+        # A different representation or no range support: these bytes cannot be spliced in
+        upstream.close()
+        controller.balancer.release(app_instance)
+        return None
+    return None
+
+
+def relay(upstream: req.Response, app_instance, path: str, headers: dict, download: Optional[ResumableDownload]):
+    """
+    Yield the upstream body chunk by chunk and hand the connection back to the pool.
+
+    When the pod dies mid-transfer and the response is resumable, the missing
+    bytes are fetched from another pod and the client never notices.
+    """
+    length = transfer_size(upstream.headers)
+    controller.balancer.open_stream(app_instance, length)
+    try:
+        while True:
+            streamed = STREAMED_BYTES.labels(app_instance.pod_name)
+            try:
+                for chunk in upstream.raw.stream(STREAM_CHUNK_SIZE, decode_content=False):
+                    if download is not None:
+                        download.advance(len(chunk))
+                    streamed.inc(len(chunk))
+                    yield chunk
+            except (UpstreamError, OSError):
+                if download is None:
+                    raise
+            if download is None or download.complete:
+                return
+
+            # The pod went away before the last byte: try to carry on elsewhere
+            pod_sessions.discard(app_instance.pod_ip)
+            controller.balancer.report(app_instance, 0, ok=False)
+            upstream.close()
+            controller.balancer.close_stream(app_instance, length)
+            controller.balancer.release(app_instance)
+            resumed = resume_upstream(download, app_instance, path, headers)
+            if resumed is None:
+                # Nothing left to release in the finally block
+                upstream = app_instance = None
+                raise ConnectionError(f"Download interrupted after {download.delivered} bytes")
+            upstream, app_instance = resumed
+            length = transfer_size(upstream.headers)
+            controller.balancer.open_stream(app_instance, length)
+    finally:
+        if app_instance is not None:
+            upstream.close()
+            controller.balancer.close_stream(app_instance, length)
+            controller.balancer.release(app_instance)
+
+
+class RelayBody:
+    """
+    The relayed body as handed to the WSGI server, which calls close() whether or
+    not it read the body: HEAD and 304 responses are never iterated. A body that
+    was never read hands its pod connection back here, and the admission slot of
+    the request is always returned here.
+    """
+
+    def __init__(self, upstream: req.Response, app_instance, path: str, headers: dict, download: Optional[ResumableDownload], admitted: bool):
+        self.upstream = upstream
+        self.app_instance = app_instance
+        self.chunks = relay(upstream, app_instance, path, headers, download)
+        self.admitted = admitted
+        self.started = False
+        self.closed = False
+
+    def __iter__(self):
+        self.started = True
+        return self.chunks
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.chunks.close()
+        if not self.started:
+            self.upstream.close()
+            controller.balancer.release(self.app_instance)
+        if self.admitted:
+            gate.release()
+
+
+@app.route("/", defaults={"path": ""}, methods=["GET", "PUT", "POST"])
+@app.route("/<path:path>", methods=["GET", "PUT", "POST"])
+def route(path):
+    admitted = False
+    try:
+        path = f"/{path}"
+        if request.query_string:
+            path = f"{path}?{request.query_string.decode('latin-1')}"
+
+        client_ip = client_address(request.remote_addr, request.headers)
+        retry_after = gate.limit(client_ip, request.cookies.get("session_id"))
+        if retry_after:
+            return rejection(429, retry_after)
+
+        # Suspicious flows go to a honeypot, everything else to the least loaded healthy pod
+        diversion = classifier.classify(client_ip, path, request.headers.get("User-Agent"))
+        app_instance = controller.select_honeypot() if diversion else None
+        if app_instance is not None:
+            request_log.info("Diverting %s (%s) to honeypot %s", client_ip, diversion, app_instance.pod_name)
+        else:
+            diversion = None
+            if not gate.admit():
+                return rejection(503, 1)
+            admitted = True
+            app_instance = controller.select_app()
+        url = pod_url(app_instance, path)
+
+        request_log.info("Routing %s %s to %s", request.method, path, url)
+
+        # Forward the request to the selected pod, streaming the body in both directions
+        session = pod_sessions.session_for(app_instance.pod_ip)
+        headers = forwarded_headers(request.headers)
+        controller.balancer.acquire(app_instance)
+        started = time.perf_counter()
+        try:
+            upstream = session.request(
+                method=request.method,
+                url=url,
+                headers=headers,
+                data=upstream_body(),
+                stream=True,
+                allow_redirects=False
+            )
+        except Exception as e:
+            if isinstance(e, req.exceptions.ConnectionError):
+                pod_sessions.discard(app_instance.pod_ip)
+            controller.balancer.report(app_instance, time.perf_counter() - started, ok=False)
+            controller.balancer.release(app_instance)
+            raise
+        controller.balancer.report(app_instance, time.perf_counter() - started, ok=upstream.status_code < 500)
+        REQUESTS.labels("diverted" if diversion else "proxied").inc()
+        if diversion is None:
+            classifier.observe(client_ip, upstream.status_code)
+
+        # Return the response from the pod; honeypot responses are never resumed on the webapp
+        download = None if diversion else ResumableDownload.from_response(request.method, upstream.status_code, upstream.headers)
+        response_headers = list(forwarded_headers(upstream.raw.headers.items()).items())
+        # From here on the slot is held until the body has been relayed or the client went away
+        body, admitted = RelayBody(upstream, app_instance, path, headers, download, admitted), False
+        return Response(
+            body,
+            status=upstream.status_code,
+            headers=response_headers,
+            direct_passthrough=True
+        )
+
+    except Exception as e:
+        if admitted:
+            gate.release()
+        REQUESTS.labels("failed").inc()
+        logger.error(f"Error routing request: {e}")
+        return {"error": "Internal server error"}, 500
+
+if __name__ == "__main__":
+    metrics.serve()
+    if LB_ENGINE == "asyncio":
+        import async_serve
+        async_serve.run(controller, host="0.0.0.0", port=5000)
+    else:
+        # Werkzeug's own line per request is replaced by the sampled request log
+        utils.create_stdout_logger(logging.WARNING, "werkzeug")
+        app.run(host="0.0.0.0", port=5000, debug=True, use_reloader=False)
@@ -0,0 +1,202 @@
+import datetime
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+from kubernetes import client
+from kubernetes.client.rest import ApiException
+import utils
+
+
+class LeaderElector:
+    """
+    Lease-based leader election among the load-balancer replicas.
+
+    The leader renews a coordination.k8s.io Lease every RETRY_PERIOD. Every
+    write carries the resourceVersion that was read, so when two replicas race
+    the API server accepts one and answers 409 to the other. A follower takes
+    the Lease over once its record has not changed for LEASE_DURATION by the
+    follower's own clock, so clock skew between nodes does not matter. A leader
+    that could not renew for RENEW_DEADLINE steps down, before any follower
+    can consider the Lease expired.
+    """
+    ENABLED = os.environ.get("LEADER_ELECTION", "true").lower() == "true"
+    LEASE_NAME = os.environ.get("LEADER_ELECTION_LEASE", "mtd-controller")
+    LEASE_DURATION_SECONDS = float(os.environ.get("LEADER_ELECTION_LEASE_DURATION", 15))
+    RENEW_DEADLINE_SECONDS = float(os.environ.get("LEADER_ELECTION_RENEW_DEADLINE", 10))
+    RETRY_PERIOD_SECONDS = float(os.environ.get("LEADER_ELECTION_RETRY_PERIOD", 2))
+
+    def __init__(self, namespace: str, on_started_leading: Callable[[], None], on_stopped_leading: Callable[[], None],
+                 coordination_api=None, identity: Optional[str] = None, clock: Callable[[], float] = time.monotonic,
+                 wall_clock: Callable[[], datetime.datetime] = lambda: datetime.datetime.now(datetime.timezone.utc)):
+        self.namespace = namespace
+        self.on_started_leading = on_started_leading
+        self.on_stopped_leading = on_stopped_leading
+        self.coordination_api = coordination_api
+        # The pod name says which replica leads, the suffix tells a restarted container from its predecessor
+        self.identity = identity or f"{os.environ.get('POD_NAME') or socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "leader-election")
+
+        self.leader = False
+        self.holder: Optional[str] = None
+        self.observed_version: Optional[str] = None
+        self.observed_at = 0.0
+        self.renewed_at = 0.0
+        self.stats = {"acquired": 0, "renewed": 0, "lost": 0, "conflicts": 0, "failures": 0}
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.leader
+
+    def start(self):
+        if not self.ENABLED:
+            # A single replica, or elections handled elsewhere: always lead
+            self.logger.info("Leader election is disabled, leading")
+            self._become_leader()
+            return
+        if self.coordination_api is None:
+            self.coordination_api = client.CoordinationV1Api()
+        self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop campaigning; a leader hands the Lease back so a follower takes over at once"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.RETRY_PERIOD_SECONDS)
+        if self.leader:
+            if self.ENABLED:
+                self.release()
+            self._step_down("shutting down")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.step()
+            # Followers spread their attempts, so a freed Lease is not raced for in lockstep
+            delay = self.RETRY_PERIOD_SECONDS * (1 if self.leader else random.uniform(1, 1.2))
+            self._stopped.wait(delay)
+
+    def step(self):
+        """One round: renew or try to acquire the Lease, and step down if it can no longer be renewed"""
+        # Measured from before the request: the write may have landed any time after this
+        started = self.clock()
+        if self.try_acquire_or_renew():
+            self.renewed_at = started
+            if not self.leader:
+                self._become_leader()
+        elif self.leader and (self.holder not in (None, self.identity) or self.clock() - self.renewed_at >= self.RENEW_DEADLINE_SECONDS):
+            self._step_down(f"Lease held by {self.holder}" if self.holder != self.identity else "Lease could not be renewed")
+
+    def _become_leader(self):
+        self.leader = True
+        self.stats["acquired"] += 1
+        self.logger.info(f"{self.identity} is now leading")
+        self.on_started_leading()
+
+    def _step_down(self, reason: str):
+        self.leader = False
+        self.stats["lost"] += 1
+        self.logger.warning(f"{self.identity} stopped leading: {reason}")
+        self.on_stopped_leading()
+
+    def try_acquire_or_renew(self) -> bool:
+        now = self.clock()
+        try:
+            lease = self.coordination_api.read_namespaced_lease(name=self.LEASE_NAME, namespace=self.namespace)
+        except ApiException as e:
+            if e.status != 404:
+                self.stats["failures"] += 1
+                self.logger.error(f"Error reading lease {self.LEASE_NAME}: {e.reason}")
+                return False
+            return self._create(now)
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.logger.error(f"Error reading lease {self.LEASE_NAME}: {e}")
+            return False
+
+        spec = lease.spec
+        if lease.metadata.resource_version != self.observed_version:
+            self.observed_version = lease.metadata.resource_version
+            self.observed_at = now
+        self.holder = spec.holder_identity
+        duration = spec.lease_duration_seconds or self.LEASE_DURATION_SECONDS
+        if self.holder and self.holder != self.identity and now < self.observed_at + duration:
+            return False
+
+        wall = self.wall_clock()
+        if self.holder != self.identity:
+            spec.acquire_time = wall
+            spec.lease_transitions = (spec.lease_transitions or 0) + 1
+        spec.holder_identity = self.identity
+        spec.lease_duration_seconds = int(self.LEASE_DURATION_SECONDS)
+        spec.renew_time = wall
+        try:
+            # Replacing with the resourceVersion just read fails with 409 if anyone wrote meanwhile
+            updated = self.coordination_api.replace_namespaced_lease(name=self.LEASE_NAME, namespace=self.namespace, body=lease)
+        except ApiException as e:
+            self.stats["conflicts" if e.status == 409 else "failures"] += 1
+            if e.status != 409:
+                self.logger.error(f"Error updating lease {self.LEASE_NAME}: {e.reason}")
+            return False
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.logger.error(f"Error updating lease {self.LEASE_NAME}: {e}")
+            return False
+        self._observe(updated, now)
+        self.stats["renewed"] += 1
+        return True
+
+    def _create(self, now: float) -> bool:
+        wall = self.wall_clock()
+        body = client.V1Lease(
+            metadata=client.V1ObjectMeta(name=self.LEASE_NAME, namespace=self.namespace),
+            spec=client.V1LeaseSpec(
+                holder_identity=self.identity,
+                lease_duration_seconds=int(self.LEASE_DURATION_SECONDS),
+                acquire_time=wall,
+                renew_time=wall,
+                lease_transitions=0
+            )
+        )
+        try:
+            created = self.coordination_api.create_namespaced_lease(namespace=self.namespace, body=body)
+        except ApiException as e:
+            # 409: another replica created it first
+            self.stats["conflicts" if e.status == 409 else "failures"] += 1
+            if e.status != 409:
+                self.logger.error(f"Error creating lease {self.LEASE_NAME}: {e.reason}")
+            return False
+        except Exception as e:
+            self.stats["failures"] += 1
+            self.logger.error(f"Error creating lease {self.LEASE_NAME}: {e}")
+            return False
+        self._observe(created, now)
+        self.stats["renewed"] += 1
+        return True
+
+    def _observe(self, lease, now: float):
+        self.observed_version = lease.metadata.resource_version
+        self.observed_at = now
+        self.holder = self.identity
+
+    def release(self):
+        """Clear the holder so that a follower does not wait out the Lease"""
+        try:
+            lease = self.coordination_api.read_namespaced_lease(name=self.LEASE_NAME, namespace=self.namespace)
+            if lease.spec.holder_identity != self.identity:
+                return
+            lease.spec.holder_identity = None
+            lease.spec.lease_duration_seconds = 1
+            lease.spec.renew_time = self.wall_clock()
+            self.coordination_api.replace_namespaced_lease(name=self.LEASE_NAME, namespace=self.namespace, body=lease)
+            self.logger.info(f"Released lease {self.LEASE_NAME}")
+        except Exception as e:
+            self.logger.error(f"Error releasing lease {self.LEASE_NAME}: {e}")
@@ -0,0 +1,341 @@
+import bisect
+import glob
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import get_ident
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+""" Prometheus text exposition, without the client library: same shape on every service """
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9100))
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class ShardedValues:
+    """
+    Values of one labelled series, split into one shard per thread.
+
+    A thread only ever writes its own shard, so recording is a dict lookup and an
+    in-place add, with no lock. Readers sum the shards. Shards are keyed by thread
+    ident, which is reused once a thread ends, so short-lived request threads
+    share shards instead of piling up new ones.
+    """
+    __slots__ = ("width", "shards", "lock")
+
+    def __init__(self, width: int):
+        self.width = width
+        self.shards: Dict[int, List[float]] = {}
+        self.lock = threading.Lock()
+
+    def shard(self) -> List[float]:
+        shard = self.shards.get(get_ident())
+        if shard is None:
+            with self.lock:
+                shard = self.shards.setdefault(get_ident(), [0.0] * self.width)
+        return shard
+
+    def totals(self) -> List[float]:
+        with self.lock:
+            shards = list(self.shards.values())
+        return [sum(column) for column in zip(*shards)] if shards else [0.0] * self.width
+
+
+class CounterChild(ShardedValues):
+    __slots__ = ()
+
+    def __init__(self, metric):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1):
+        self.shard()[0] += amount
+
+
+class GaugeChild(ShardedValues):
+    """inc() and dec() may run on different threads: only the sum of the shards is meaningful"""
+    __slots__ = ("value",)
+
+    def __init__(self, metric):
+        super().__init__(1)
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.shard()[0] += amount
+
+    def dec(self, amount: float = 1):
+        self.shard()[0] -= amount
+
+    def set(self, value: float):
+        with self.lock:
+            for shard in self.shards.values():
+                shard[0] = 0.0
+            self.value = value
+
+    def totals(self) -> List[float]:
+        return [self.value + super().totals()[0]]
+
+
+class HistogramChild(ShardedValues):
+    """Per-bucket counts followed by the sum of the observations"""
+    __slots__ = ("bounds",)
+
+    def __init__(self, metric):
+        super().__init__(len(metric.buckets) + 2)
+        self.bounds = metric.buckets
+
+    def observe(self, value: float):
+        shard = self.shard()
+        shard[bisect.bisect_left(self.bounds, value)] += 1
+        shard[-1] += value
+
+
+class Metric:
+    kind = "untyped"
+    child_class = CounterChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: "Registry" = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], ShardedValues] = {}
+        self.lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values) -> ShardedValues:
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            with self.lock:
+                child = self.children.setdefault(key, self.child_class(self))
+        return child
+
+    def forget(self, *values):
+        """Drop a series, e.g. the latency of a pod that was rotated away"""
+        with self.lock:
+            self.children.pop(tuple(str(value) for value in values), None)
+
+    def samples(self) -> Iterable[Tuple[Tuple[str, ...], List[float]]]:
+        with self.lock:
+            children = list(self.children.items())
+        for key, child in children:
+            yield key, child.totals()
+
+
+class Counter(Metric):
+    kind = "counter"
+    child_class = CounterChild
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    child_class = GaugeChild
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+    child_class = HistogramChild
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: "Registry" = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self, *values):
+        return Timer(self.labels(*values))
+
+
+class CallbackGauge(Metric):
+    """A gauge read from live state when scraped, so the hot path records nothing at all"""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], callback: Callable[[], Iterable[Tuple[Sequence, float]]],
+                 registry: "Registry" = None):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self):
+        for values, value in self.callback():
+            yield tuple(str(v) for v in values), [value]
+
+
+class CallbackCounter(CallbackGauge):
+    """A counter kept by the code it describes, e.g. a stats dict, read when scraped"""
+    kind = "counter"
+
+
+class Timer:
+    __slots__ = ("child", "started")
+
+    def __init__(self, child: HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.child.observe(time.perf_counter() - self.started)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        self.metrics[metric.name] = metric
+
+    def snapshot(self) -> dict:
+        """Every series of every metric, as JSON-friendly data that snapshots of other processes can be added to"""
+        return {
+            name: {
+                "kind": metric.kind,
+                "help": metric.documentation,
+                "labelnames": list(metric.labelnames),
+                "buckets": list(getattr(metric, "buckets", ())),
+                "samples": {json.dumps(key): values for key, values in metric.samples()},
+            }
+            for name, metric in list(self.metrics.items())
+        }
+
+    def render(self) -> str:
+        return render(self.snapshot())
+
+
+REGISTRY = Registry()
+
+
+def label_text(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(snapshot: dict) -> str:
+    """Prometheus text format for a snapshot"""
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric["labelnames"]
+        for key, values in sorted(metric["samples"].items()):
+            labels = json.loads(key)
+            if metric["kind"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric["buckets"] + ["+Inf"], values):
+                    cumulative += count
+                    le = f'le="{bound}"'
+                    lines.append(f"{name}_bucket{label_text(labelnames, labels, le)} {cumulative:g}")
+                lines.append(f"{name}_sum{label_text(labelnames, labels)} {values[-1]:g}")
+                lines.append(f"{name}_count{label_text(labelnames, labels)} {cumulative:g}")
+            else:
+                lines.append(f"{name}{label_text(labelnames, labels)} {values[0]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def merge(snapshots: Iterable[dict], include_gauges: Callable[[int], bool] = lambda index: True) -> dict:
+    """Add up the series of several processes; gauges only from the snapshots include_gauges() accepts"""
+    merged: dict = {}
+    for index, snapshot in enumerate(snapshots):
+        for name, metric in snapshot.items():
+            if metric["kind"] == "gauge" and not include_gauges(index):
+                continue
+            target = merged.setdefault(name, dict(metric, samples={}))
+            for key, values in metric["samples"].items():
+                current = target["samples"].get(key)
+                target["samples"][key] = values if current is None else [a + b for a, b in zip(current, values)]
+    return merged
+
+
+""" Multi-process servers: each worker writes its snapshot to a directory that one exporter merges """
+
+
+def write_snapshot(directory: str, registry: Registry = None):
+    path = os.path.join(directory, f"worker-{os.getpid()}.json")
+    with open(f"{path}.tmp", "w") as f:
+        json.dump((registry or REGISTRY).snapshot(), f)
+    os.replace(f"{path}.tmp", path)
+
+
+def start_snapshots(directory: str, interval: float, registry: Registry = None):
+    """Write this worker's snapshot every interval seconds"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(directory, registry)
+            except OSError:
+                pass
+
+    threading.Thread(target=run, name="metrics-snapshot", daemon=True).start()
+
+
+def retire_snapshot(directory: str, pid: int):
+    """Keep the counters of a worker that exited, but no longer its gauges"""
+    path = os.path.join(directory, f"worker-{pid}.json")
+    if os.path.exists(path):
+        os.replace(path, os.path.join(directory, f"exited-{pid}.json"))
+
+
+def render_directory(directory: str) -> str:
+    snapshots, live = [], []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+        live.append(os.path.basename(path).startswith("worker-"))
+    return render(merge(snapshots, include_gauges=lambda index: live[index]))
+
+
+def serve(port: int = METRICS_PORT, render_metrics: Optional[Callable[[], str]] = None) -> ThreadingHTTPServer:
+    """
+    Serve /metrics on its own port from a background thread. It is kept off the
+    service port so the metrics never pass through the public proxy.
+    """
+    render_metrics = render_metrics or REGISTRY.render
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_metrics().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,210 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from kubernetes import client, watch
+from kubernetes.client.rest import ApiException
+import metrics
+import utils
+
+KUBERNETES_API_SECONDS = metrics.Histogram(
+    "mtd_kubernetes_api_seconds", "Kubernetes API calls by verb, resource and status code, until the response headers",
+    ["verb", "resource", "code"]
+)
+
+
+def api_resource(url: str) -> str:
+    """The resource type a Kubernetes API URL addresses, e.g. pods for /api/v1/namespaces/default/pods/x"""
+    parts = url.split("?")[0].split("/")
+    if "namespaces" in parts:
+        index = parts.index("namespaces") + 2
+        if index < len(parts):
+            return parts[index]
+        return "namespaces"
+    for part in reversed(parts):
+        if part and not part[0].isdigit() and part not in ("api", "apis"):
+            return part
+    return "unknown"
+
+
+def instrument_api_client(api_client: client.ApiClient) -> client.ApiClient:
+    """Count and time every request this API client makes, at the REST layer every API call goes through"""
+    rest_client = api_client.rest_client
+    request = rest_client.request
+
+    def timed_request(method, url, *args, **kwargs):
+        watching = "watch=true" in url.lower() or any(key == "watch" and value for key, value in (kwargs.get("query_params") or []))
+        code = "error"
+        started = time.perf_counter()
+        try:
+            response = request(method, url, *args, **kwargs)
+            code = str(response.status)
+            return response
+        except ApiException as e:
+            code = str(e.status)
+            raise
+        finally:
+            KUBERNETES_API_SECONDS.labels("WATCH" if watching else method, api_resource(url), code).observe(time.perf_counter() - started)
+
+    rest_client.request = timed_request
+    return api_client
+
+
+def parse_label_selector(selector: str) -> Dict[str, str]:
+    """Turn an equality selector such as "app=webapp,tier=web" into a dict"""
+    labels = {}
+    for term in filter(None, (part.strip() for part in (selector or "").split(","))):
+        key, _, value = term.replace("==", "=").partition("=")
+        labels[key.strip()] = value.strip()
+    return labels
+
+
+class PodRecord:
+    """The parts of a pod the controller cares about, as last seen by the watch"""
+
+    def __init__(self, pod):
+        self.name: str = pod.metadata.name
+        self.labels: Dict[str, str] = dict(pod.metadata.labels or {})
+        self.phase: Optional[str] = pod.status.phase if pod.status else None
+        self.pod_ip: Optional[str] = pod.status.pod_ip if pod.status else None
+        self.ready: bool = any(
+            condition.type == "Ready" and condition.status == "True"
+            for condition in ((pod.status.conditions if pod.status else None) or [])
+        )
+        self.terminating: bool = pod.metadata.deletion_timestamp is not None
+
+    @property
+    def serving(self) -> bool:
+        """Running, addressable, reporting Ready and not being deleted"""
+        return self.phase == "Running" and bool(self.pod_ip) and self.ready and not self.terminating
+
+    @property
+    def weight(self) -> int:
+        """Relative routing weight taken from the optional mtd-weight label"""
+        try:
+            return max(1, int(self.labels.get("mtd-weight", 1)))
+        except ValueError:
+            return 1
+
+    def matches(self, selector: Dict[str, str]) -> bool:
+        return all(self.labels.get(key) == value for key, value in selector.items())
+
+
+class PodInformer:
+    """
+    Local pod inventory for one namespace, kept current by the Kubernetes watch API.
+
+    A full list seeds the cache and provides the resourceVersion the watch resumes
+    from. When the server reports that version as expired (410 Gone) the cache is
+    rebuilt from a fresh list. Readers never touch the API server.
+    """
+    WATCH_TIMEOUT_SECONDS = 300
+    RETRY_BACKOFF_SECONDS = 1
+    MAX_BACKOFF_SECONDS = 30
+
+    def __init__(self, k8s_api, namespace: str, watch_factory: Callable = watch.Watch):
+        self.k8s_api = k8s_api
+        self.namespace = namespace
+        self.watch_factory = watch_factory
+        self.resource_version: Optional[str] = None
+        # Bumped on every change, so readers can tell whether anything they derived is stale
+        self.version = 0
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "pod-informer")
+
+        self._pods: Dict[str, PodRecord] = {}
+        self._changed = threading.Condition()
+        self._synced = threading.Event()
+        self._stopped = threading.Event()
+        self._watch = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, timeout: float = 30) -> bool:
+        """Start watching in the background and wait for the initial list"""
+        self._thread = threading.Thread(target=self._run, name="pod-informer", daemon=True)
+        self._thread.start()
+        return self._synced.wait(timeout)
+
+    def stop(self):
+        self._stopped.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    @property
+    def has_synced(self) -> bool:
+        return self._synced.is_set()
+
+    def _relist(self):
+        pod_list = self.k8s_api.list_namespaced_pod(namespace=self.namespace)
+        with self._changed:
+            self._pods = {pod.metadata.name: PodRecord(pod) for pod in pod_list.items}
+            self.resource_version = pod_list.metadata.resource_version
+            self.version += 1
+            self._changed.notify_all()
+        self._synced.set()
+        self.logger.info(f"Listed {len(pod_list.items)} pods at resourceVersion {self.resource_version}")
+
+    def apply_event(self, event: dict):
+        """Fold one watch event into the cache"""
+        event_type = event["type"]
+        pod = event["object"]
+        with self._changed:
+            self.resource_version = pod.metadata.resource_version
+            if event_type in ("ADDED", "MODIFIED"):
+                self._pods[pod.metadata.name] = PodRecord(pod)
+            elif event_type == "DELETED":
+                self._pods.pop(pod.metadata.name, None)
+            else:
+                # BOOKMARK events only move the resourceVersion forward: the pods are unchanged
+                return
+            self.version += 1
+            self._changed.notify_all()
+
+    def _run(self):
+        backoff = self.RETRY_BACKOFF_SECONDS
+        while not self._stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self._relist()
+                self._watch = self.watch_factory()
+                for event in self._watch.stream(
+                    self.k8s_api.list_namespaced_pod,
+                    namespace=self.namespace,
+                    resource_version=self.resource_version,
+                    allow_watch_bookmarks=True,
+                    timeout_seconds=self.WATCH_TIMEOUT_SECONDS
+                ):
+                    if event["type"] == "ERROR":
+                        raise ApiException(status=event["raw_object"].get("code"), reason=event["raw_object"].get("message"))
+                    self.apply_event(event)
+                    backoff = self.RETRY_BACKOFF_SECONDS
+            except ApiException as e:
+                if e.status == 410:
+                    self.logger.info("Watch resourceVersion expired, relisting pods")
+                    self.resource_version = None
+                    continue
+                self.logger.error(f"Pod watch failed: {e}")
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF_SECONDS)
+            except Exception as e:
+                self.logger.error(f"Pod watch failed: {e}")
+                self._stopped.wait(backoff)
+                backoff = min(backoff * 2, self.MAX_BACKOFF_SECONDS)
+
+    def get(self, name: str) -> Optional[PodRecord]:
+        with self._changed:
+            return self._pods.get(name)
+
+    def pods(self, selector: Optional[Dict[str, str]] = None) -> List[PodRecord]:
+        with self._changed:
+            return [pod for pod in self._pods.values() if pod.matches(selector or {})]
+
+    def wait_for(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """Block until predicate() holds for the cached state, re-checking on every event"""
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while not predicate():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+            return True
@@ -0,0 +1,156 @@
+import datetime
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+import utils
+
+POD_LOGGER = utils.create_stdout_logger(logging.DEBUG, "kubernetes-app")
+
+
+class KubernetesApp:
+    """
+    A routable pod. Records never change once created: a pod that comes back
+    with another address gets a new record, so snapshots can share them.
+    """
+    __slots__ = ("pod_name", "pod_ip", "weight", "port", "label", "initialized")
+
+    def __init__(self, pod_name: str, pod_ip: str, weight: int = 1, port: int = 8080, label: Optional[str] = None):
+        self.pod_name = pod_name
+        self.pod_ip = pod_ip
+        self.weight = weight
+        self.port = port
+        self.label = label  # mtd-rotation label of the pod's generation
+        self.initialized = datetime.datetime.now()
+        POD_LOGGER.info(f"tracking pod {pod_name} at IP {pod_ip}", extra={"fields": {"pod": pod_name, "pod_ip": pod_ip}})
+
+    @property
+    def hostname(self) -> str:
+        return self.pod_name
+
+    def __repr__(self) -> str:
+        return f"KubernetesApp({self.pod_name}, {self.pod_ip}:{self.port})"
+
+
+class RegistrySnapshot:
+    """
+    Every tracked pod by role, and indexed by name, IP and rotation label.
+
+    A snapshot is never modified: the registry builds the next one and swaps it
+    in with a single assignment, so request threads read a consistent pool
+    without taking a lock, even while the scheduler thread cuts over.
+    """
+    __slots__ = ("version", "active", "standby", "retiring", "honeypots", "by_name", "by_ip", "by_label")
+
+    def __init__(self, version: int, active: Iterable[KubernetesApp], standby: Iterable[KubernetesApp],
+                 retiring: Iterable[KubernetesApp], honeypots: Iterable[KubernetesApp]):
+        self.version = version
+        self.active: Tuple[KubernetesApp, ...] = tuple(active)
+        self.standby: Tuple[KubernetesApp, ...] = tuple(standby)
+        self.retiring: Tuple[KubernetesApp, ...] = tuple(retiring)
+        self.honeypots: Tuple[KubernetesApp, ...] = tuple(honeypots)
+        self.by_name: Dict[str, KubernetesApp] = {}
+        self.by_ip: Dict[str, KubernetesApp] = {}
+        by_label: Dict[str, list] = {}
+        for pod in self.active + self.standby + self.retiring + self.honeypots:
+            self.by_name[pod.pod_name] = pod
+            self.by_ip[pod.pod_ip] = pod
+            if pod.label:
+                by_label.setdefault(pod.label, []).append(pod)
+        self.by_label: Dict[str, Tuple[KubernetesApp, ...]] = {label: tuple(pods) for label, pods in by_label.items()}
+
+    @property
+    def routable(self) -> Tuple[KubernetesApp, ...]:
+        """Pods that take traffic now or after the next cutover"""
+        return self.active + self.standby
+
+    @property
+    def tracked(self) -> Tuple[KubernetesApp, ...]:
+        """Every webapp pod, the draining ones included"""
+        return self.active + self.standby + self.retiring
+
+
+class PodRegistry:
+    """Generation-aware pod registry; writers serialize on a lock, readers use the current snapshot"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.snapshot = RegistrySnapshot(0, (), (), (), ())
+
+    def _replace(self, **changes) -> RegistrySnapshot:
+        """Copy-on-write, callers hold the lock"""
+        current = self.snapshot
+        roles = dict(active=current.active, standby=current.standby, retiring=current.retiring, honeypots=current.honeypots)
+        roles.update(changes)
+        self.snapshot = RegistrySnapshot(current.version + 1, **roles)
+        return self.snapshot
+
+    def record(self, pod_name: str, pod_ip: str, weight: int = 1, port: int = 8080, label: Optional[str] = None) -> KubernetesApp:
+        """The record already tracked for this pod, or a new one if the pod is new or was readdressed"""
+        known = self.snapshot.by_name.get(pod_name)
+        if known is not None and known.pod_ip == pod_ip and known.port == port and known.weight == weight and known.label == label:
+            return known
+        return KubernetesApp(pod_name, pod_ip, weight, port, label)
+
+    def get(self, pod_name: str) -> Optional[KubernetesApp]:
+        return self.snapshot.by_name.get(pod_name)
+
+    def by_ip(self, pod_ip: str) -> Optional[KubernetesApp]:
+        return self.snapshot.by_ip.get(pod_ip)
+
+    def with_label(self, label: str) -> Tuple[KubernetesApp, ...]:
+        return self.snapshot.by_label.get(label, ())
+
+    def activate(self, pods: Iterable[KubernetesApp], expected_version: Optional[int] = None) -> bool:
+        """
+        Make pods the active pool. With expected_version the pool is only
+        replaced if nothing changed since that snapshot, so a refill from a
+        request thread never undoes a cutover that happened meanwhile.
+        """
+        with self.lock:
+            if expected_version is not None and self.snapshot.version != expected_version:
+                return False
+            self._replace(active=pods)
+            return True
+
+    def restore(self, active: Iterable[KubernetesApp], standby: Iterable[KubernetesApp], retiring: Iterable[KubernetesApp]):
+        """Set every webapp role at once, from state kept elsewhere such as the leader's pod labels"""
+        with self.lock:
+            self._replace(active=active, standby=standby, retiring=retiring)
+
+    def set_standby(self, pods: Iterable[KubernetesApp]):
+        with self.lock:
+            self._replace(standby=pods)
+
+    def cutover(self, pods: Iterable[KubernetesApp]) -> Tuple[KubernetesApp, ...]:
+        """Promote pods to the active pool in one swap; the pods they replace are kept as retiring until forgotten"""
+        pods = tuple(pods)
+        with self.lock:
+            current = self.snapshot
+            promoted = {pod.pod_name for pod in pods}
+            standby = tuple(pod for pod in current.standby if pod.pod_name not in promoted)
+            retired = tuple(pod for pod in current.active if pod.pod_name not in promoted)
+            self._replace(active=pods, standby=standby, retiring=current.retiring + retired)
+            return retired
+
+    def replace(self, old: Iterable[KubernetesApp], new: Iterable[KubernetesApp]):
+        """Rolling cutover: swap some active pods for new ones in one step, the old ones are kept as retiring"""
+        old, new = tuple(old), tuple(new)
+        names = {pod.pod_name for pod in old}
+        with self.lock:
+            current = self.snapshot
+            self._replace(active=tuple(pod for pod in current.active if pod.pod_name not in names) + new,
+                          retiring=current.retiring + old)
+
+    def forget(self, pods: Iterable[KubernetesApp]):
+        """Stop tracking pods that are gone, e.g. a deleted generation"""
+        names = {pod.pod_name for pod in pods}
+        with self.lock:
+            current = self.snapshot
+            self._replace(
+                standby=[pod for pod in current.standby if pod.pod_name not in names],
+                retiring=[pod for pod in current.retiring if pod.pod_name not in names],
+            )
+
+    def set_honeypots(self, pods: Iterable[KubernetesApp]):
+        with self.lock:
+            self._replace(honeypots=pods)
@@ -0,0 +1,43 @@
+import math
+import os
+from typing import Iterable, Iterator, Tuple
+from resume import ResumableDownload
+
+""" What the Flask and asyncio engines share, so that both proxy requests the same way """
+STREAM_CHUNK_SIZE = int(os.environ.get("PROXY_CHUNK_SIZE", 64 * 1024))
+
+""" Headers that only apply to a single connection and must not be forwarded """
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host",
+}
+
+
+def forwarded_headers(headers: Iterable[Tuple[str, str]]) -> dict:
+    return {key: value for key, value in headers if key.lower() not in HOP_BY_HOP_HEADERS}
+
+
+def pod_url(app_instance, path: str) -> str:
+    """The URL of path on a pod; path is the client's path and query string as sent"""
+    return f"http://{app_instance.pod_ip}:{app_instance.port}{path}"
+
+
+def rejection(status: int, retry_after: float) -> Tuple[dict, int, dict]:
+    """Body, status and headers: 429 for a client over its rate, 503 when the webapp is at capacity"""
+    message = "Too many requests" if status == 429 else "Service overloaded"
+    return {"error": message}, status, {"Retry-After": str(max(1, math.ceil(retry_after)))}
+
+
+def resume_candidates(controller, download: ResumableDownload, failed) -> Iterator:
+    """
+    Pods to request the rest of an interrupted download from, one per attempt,
+    never the same pod twice, until the download can no longer be resumed.
+    """
+    excluded = {failed.pod_name}
+    while download.can_resume():
+        try:
+            app_instance = controller.select_app(exclude=excluded)
+        except Exception:
+            return
+        excluded.add(app_instance.pod_name)
+        yield app_instance
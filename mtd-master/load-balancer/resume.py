@@ -0,0 +1,75 @@
+import os
+import re
+from typing import Mapping, Optional
+
+CONTENT_RANGE_PATTERN = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class ResumableDownload:
+    """
+    Byte position of a GET response the proxy is relaying.
+
+    A response can be resumed when the pod announced a strong ETag, byte
+    ranges and a known length. If the pod goes away mid-transfer, the rest is
+    requested from another pod with Range from the next undelivered byte and
+    If-Range set to the ETag, so the client keeps its connection and only ever
+    receives bytes of the same representation.
+    """
+    MAX_ATTEMPTS = int(os.environ.get("PROXY_RESUME_ATTEMPTS", 3))
+
+    def __init__(self, etag: str, start: int, end: int, total: int):
+        self.etag = etag
+        self.start = start
+        self.end = end
+        self.total = total
+        self.delivered = 0
+        self.attempts = 0
+
+    @classmethod
+    def from_response(cls, method: str, status: int, headers: Mapping[str, str]) -> Optional["ResumableDownload"]:
+        """Return a tracker for the response, or None when it cannot be resumed safely"""
+        etag = headers.get("ETag")
+        if method != "GET" or not etag or etag.startswith("W/"):
+            return None
+        if headers.get("Accept-Ranges", "").lower() != "bytes" or headers.get("Content-Encoding"):
+            return None
+
+        if status == 200 and headers.get("Content-Length", "").isdigit():
+            total = int(headers["Content-Length"])
+            return cls(etag, 0, total - 1, total) if total else None
+        if status == 206:
+            match = CONTENT_RANGE_PATTERN.match(headers.get("Content-Range", ""))
+            if match:
+                start, end, total = (int(value) for value in match.groups())
+                return cls(etag, start, end, total)
+        return None
+
+    @property
+    def next_byte(self) -> int:
+        return self.start + self.delivered
+
+    @property
+    def complete(self) -> bool:
+        return self.next_byte > self.end
+
+    def advance(self, length: int):
+        self.delivered += length
+
+    def can_resume(self) -> bool:
+        return not self.complete and self.attempts < self.MAX_ATTEMPTS
+
+    def resume_headers(self, headers: Mapping[str, str]) -> dict:
+        """The original request headers, asking only for the bytes still missing"""
+        self.attempts += 1
+        resumed = {key: value for key, value in headers.items() if key.lower() not in ("range", "if-range")}
+        resumed["Range"] = f"bytes={self.next_byte}-{self.end}"
+        resumed["If-Range"] = self.etag
+        return resumed
+
+    def accepts(self, status: int, headers: Mapping[str, str]) -> bool:
+        """Whether a resumed response continues exactly where the last one stopped"""
+        return (
+            status == 206
+            and headers.get("ETag") == self.etag
+            and headers.get("Content-Range") == f"bytes {self.next_byte}-{self.end}/{self.total}"
+        )
@@ -0,0 +1,253 @@
+import datetime
+import logging
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Set
+import metrics
+import utils
+
+ROTATION_STAGE_SECONDS = metrics.Histogram(
+    "mtd_rotation_stage_seconds", "Duration of each rotation stage", ["stage"],
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 1800)
+)
+
+
+class Generation:
+    """One set of webapp pods that is provisioned, serves traffic and is retired together"""
+
+    def __init__(self, labels: Set[str]):
+        self.labels = labels
+        self.pods: List = []
+        self.stage = "pending"
+        self.created = datetime.datetime.now()
+
+    @property
+    def name(self) -> str:
+        return ",".join(sorted(self.labels)) or "unlabelled"
+
+
+class RotationPipeline:
+    """
+    Rotation as explicit stages: provision, warm, cutover, drain and delete.
+
+    The next generation is provisioned and warmed in the background as soon as
+    the previous cutover finished, so a rotation only swaps the registry's
+    snapshot in memory. Retiring the old generation runs concurrently with warming the
+    next one. Every stage records its duration in stage_durations and in the
+    mtd_rotation_stage_seconds histogram.
+
+    In rolling mode a rotation is one step that replaces the ROLLING_BATCH
+    oldest active pods with a slice of new ones, provisioned on demand; a pod
+    then lives for about steps rotations, and the webapp never runs more than
+    ROLLING_MAX_SURGE pods above its replica count instead of two extra generations.
+    """
+    STAGES = ("provision", "warm", "cutover", "drain", "delete")
+    MODE = os.environ.get("ROTATION_MODE", "generation").lower()  # generation, or rolling
+    ROLLING_BATCH = int(os.environ.get("ROTATION_ROLLING_BATCH", 1))
+    ROLLING_MAX_SURGE = int(os.environ.get("ROTATION_ROLLING_MAX_SURGE", 1))
+    WORKERS = int(os.environ.get("ROTATION_WORKERS", 4))
+    WARM_PROBE_INTERVAL_SECONDS = float(os.environ.get("ROTATION_WARM_PROBE_INTERVAL", 0.5))
+    DRAIN_GRACE_SECONDS = float(os.environ.get("ROTATION_DRAIN_GRACE", 5))
+    DRAIN_POLL_INTERVAL_SECONDS = float(os.environ.get("ROTATION_DRAIN_POLL_INTERVAL", 1))
+
+    def __init__(self, controller, initial_generation: Generation):
+        self.controller = controller
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "rotation-pipeline")
+        self.executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="rotation")
+        self.stage_durations: Dict[str, Deque[float]] = {stage: deque(maxlen=100) for stage in self.STAGES}
+        self.stopped = threading.Event()
+
+        self.active = initial_generation
+        self.active.stage = "active"
+        self.retiring: List[Generation] = []
+        self.rolled = 0
+        self.rolling = self.MODE == "rolling"
+        self.standby_future: Optional[Future] = None if self.rolling else self.prepare_standby()
+
+    @property
+    def batch(self) -> int:
+        """Pods replaced by one rotation"""
+        live_apps = self.controller.LIVE_APPS
+        return max(1, min(self.ROLLING_BATCH, self.ROLLING_MAX_SURGE, live_apps)) if self.rolling else live_apps
+
+    @property
+    def steps(self) -> int:
+        """Rotations it takes to replace every active pod"""
+        return math.ceil(self.controller.LIVE_APPS / self.batch)
+
+    @property
+    def max_pods(self) -> Optional[int]:
+        """Webapp pods the scheduler may run at once, None for its default"""
+        return self.controller.LIVE_APPS + max(self.ROLLING_MAX_SURGE, self.batch) if self.rolling else None
+
+    @contextmanager
+    def stage(self, name: str, generation: Generation):
+        generation.stage = name
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.stage_durations[name].append(elapsed)
+            ROTATION_STAGE_SECONDS.labels(name).observe(elapsed)
+            self.logger.info(f"Stage {name} for generation {generation.name} took {elapsed:.3f}s")
+
+    def prepare_standby(self) -> Future:
+        return self.executor.submit(self._provision_and_warm)
+
+    def _provision_and_warm(self) -> Generation:
+        generation = Generation({datetime.datetime.now().strftime("%Y%m%d%H%M%S")})
+        label = next(iter(generation.labels))
+        with self.stage("provision", generation):
+            self.controller.create_deployment(label, replicas=self.controller.LIVE_APPS)
+        with self.stage("warm", generation):
+            generation.pods = self.warm(self.controller.wait_for_pods(label))
+        if self.stopped.is_set():
+            # This replica stopped leading meanwhile, nobody would ever cut over to or delete these pods
+            self.controller.delete_generation(generation)
+            return generation
+        self.controller.registry.set_standby(generation.pods)
+        self.controller.label_roles()
+        generation.stage = "standby"
+        return generation
+
+    def warm(self, pods: List) -> List:
+        """Health-check the new pods until they all answer, keeping only the ones that did"""
+        deadline = time.monotonic() + self.controller.READY_TIMEOUT.total_seconds()
+        pending = list(pods)
+        warmed = []
+        while pending and not self.stopped.is_set():
+            for pod in list(pending):
+                if self.controller.health_prober.probe(pod):
+                    self.controller.balancer.mark_health(pod, True)
+                    warmed.append(pod)
+                    pending.remove(pod)
+            if not pending or time.monotonic() >= deadline:
+                break
+            self.stopped.wait(self.WARM_PROBE_INTERVAL_SECONDS)
+
+        if pending:
+            self.logger.warning(f"{len(pending)} pods did not pass health checks while warming")
+        return warmed
+
+    def rotate(self):
+        """Cut over to the warmed standby generation and retire the active one"""
+        if self.stopped.is_set():
+            return
+        if self.rolling:
+            self.roll()
+            return
+        try:
+            standby = self.standby_future.result(timeout=self.controller.READY_TIMEOUT.total_seconds())
+        except Exception as e:
+            self.logger.error(f"Standby generation is not available, skipping rotation: {e}")
+            if self.standby_future.done():
+                self.standby_future = self.prepare_standby()
+            return
+
+        if not standby.pods:
+            self.logger.warning(f"Standby generation {standby.name} has no healthy pods, skipping rotation")
+            self.executor.submit(self.controller.delete_generation, standby)
+            self.standby_future = self.prepare_standby()
+            return
+
+        old = self.active
+        with self.stage("cutover", standby):
+            """ Requests pick from the registry's snapshot, so swapping it is the whole cutover """
+            self.controller.registry.cutover(standby.pods)
+            self.active = standby
+            self.controller.publish_generation(standby)
+        standby.stage = "active"
+
+        self.standby_future = self.prepare_standby()
+        self.retire(old)
+
+    def outgoing(self, active: Sequence, fresh: Optional[int] = None) -> List:
+        """The active pods the next rotation retires: all of them, or the oldest that fresh pods replace when rolling"""
+        if not self.rolling:
+            return list(active)
+        surplus = max(0, len(active) + (self.batch if fresh is None else fresh) - self.controller.LIVE_APPS)
+        # Unlabelled pods came with the webapp deployment, labels sort by creation time
+        return sorted(active, key=lambda pod: (pod.label or "", pod.initialized))[:surplus]
+
+    def roll(self):
+        """Replace the oldest active pods with a freshly provisioned and warmed slice"""
+        batch = self.batch
+        fresh = Generation({datetime.datetime.now().strftime("%Y%m%d%H%M%S")})
+        label = next(iter(fresh.labels))
+        with self.stage("provision", fresh):
+            self.controller.create_deployment(label, replicas=batch)
+        with self.stage("warm", fresh):
+            fresh.pods = self.warm(self.controller.wait_for_pods(label, count=batch))
+
+        if self.stopped.is_set():
+            self.controller.delete_generation(fresh)
+            return
+        if not fresh.pods:
+            self.logger.warning(f"Slice {fresh.name} has no healthy pods, skipping rotation")
+            self.executor.submit(self.controller.delete_generation, fresh)
+            return
+
+        active = self.controller.registry.snapshot.active
+        oldest = self.outgoing(active, len(fresh.pods))
+        old = Generation({pod.label for pod in oldest if pod.label})
+        old.pods = oldest
+        with self.stage("cutover", fresh):
+            self.controller.registry.replace(old.pods, fresh.pods)
+            self.controller.publish_pods(self.controller.registry.snapshot.active)
+        self.active = self.controller.current_generation()
+        self.active.stage = "active"
+        self.rolled += 1
+
+        if old.pods:
+            self.retire(old, delete=self.controller.delete_pods)
+
+    def retire(self, generation: Generation, delete: Optional[Callable[[Generation], None]] = None):
+        """Drain a generation, then delete it; by default with its deployments"""
+        self.retiring.append(generation)
+        self.executor.submit(self._drain_and_delete, generation, delete or self.controller.delete_generation)
+
+    def _drain_and_delete(self, generation: Generation, delete: Callable[[Generation], None]):
+        try:
+            with self.stage("drain", generation):
+                self.drain(generation)
+            if self.stopped.is_set():
+                return
+            with self.stage("delete", generation):
+                delete(generation)
+            generation.stage = "deleted"
+        except Exception as e:
+            self.logger.error(f"Error retiring generation {generation.name}: {e}")
+        finally:
+            self.retiring.remove(generation)
+
+    def drain(self, generation: Generation):
+        """
+        Wait until no request or download stream is left on the old generation.
+
+        A short grace period covers requests that picked a pod just before the
+        cutover, and the decommission period stays the upper bound.
+        """
+        deadline = time.monotonic() + self.controller.DECOMMISSION_PERIOD.total_seconds()
+        if self.stopped.wait(min(self.DRAIN_GRACE_SECONDS, self.controller.DECOMMISSION_PERIOD.total_seconds())):
+            return
+        while True:
+            outstanding = self.controller.balancer.outstanding(generation.pods)
+            if outstanding == 0:
+                self.logger.info(f"Generation {generation.name} drained")
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.logger.warning(f"Generation {generation.name} still had {outstanding} requests after the decommission period")
+                return
+            if self.stopped.wait(min(self.DRAIN_POLL_INTERVAL_SECONDS, remaining)):
+                return
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,122 @@
+import logging
+import os
+import random
+import time
+from typing import Callable, Dict, Optional
+import utils
+
+
+class RotationSignals:
+    """What the scheduler looks at on every check, as sampled from the controller"""
+    __slots__ = ("active_pods", "inflight", "large_transfers", "honeypot_hits", "tracked_pods")
+
+    def __init__(self, active_pods: int, inflight: int, large_transfers: int, honeypot_hits: float, tracked_pods: int):
+        self.active_pods = active_pods
+        self.inflight = inflight
+        self.large_transfers = large_transfers
+        self.honeypot_hits = honeypot_hits  # cumulative, the scheduler works out the rate
+        self.tracked_pods = tracked_pods
+
+
+class RotationScheduler:
+    """
+    Decides, on every check, whether the active generation should rotate now.
+
+    Each interval is the TTL with random jitter, so an attacker cannot time a
+    rotation. A rotation that falls due during a traffic peak, or while large
+    downloads are being relayed from the active pods, waits for them; never
+    longer than MAX_DEFER of the TTL, which bounds the exposure window. When
+    requests diverted to the honeypot spike, the next rotation is brought
+    forward to THREAT_TTL_FACTOR of the TTL. A rotation is only started if the
+    step_pods it provisions (a whole generation by default) fit in max_pods
+    webapp pods.
+    """
+    CHECK_INTERVAL_SECONDS = float(os.environ.get("ROTATION_CHECK_INTERVAL", 5))
+    JITTER = float(os.environ.get("ROTATION_JITTER", 0.2))
+    PEAK_LOAD = float(os.environ.get("ROTATION_PEAK_LOAD", 0.75))
+    PEAK_INFLIGHT_PER_POD = int(os.environ.get("ROTATION_PEAK_INFLIGHT_PER_POD", 64))
+    MAX_LARGE_TRANSFERS = int(os.environ.get("ROTATION_MAX_LARGE_TRANSFERS", 0))
+    MAX_DEFER = float(os.environ.get("ROTATION_MAX_DEFER", 0.5))
+    THREAT_HITS_PER_MINUTE = float(os.environ.get("ROTATION_THREAT_HITS_PER_MINUTE", 60))
+    THREAT_TTL_FACTOR = float(os.environ.get("ROTATION_THREAT_TTL_FACTOR", 0.2))
+    MAX_PODS = int(os.environ.get("ROTATION_MAX_PODS", 0))  # 0: three generations, active, standby and one draining
+
+    def __init__(self, ttl_seconds: float, live_apps: int, clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None, max_pods: Optional[int] = None, step_pods: Optional[int] = None):
+        self.ttl = ttl_seconds
+        self.live_apps = live_apps
+        self.max_pods = max_pods or self.MAX_PODS or 3 * live_apps
+        self.step_pods = step_pods or live_apps
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.logger = utils.create_stdout_logger(logging.DEBUG, "rotation-scheduler")
+        self.last_hits: Optional[float] = None
+        self.last_check: Optional[float] = None
+        self.threatened = False
+        self.deferred: Optional[str] = None
+        self.next_due = self.clock() + self.interval()
+        self.stats: Dict[str, int] = {
+            "scheduled": 0, "threat": 0, "forced": 0, "shortened": 0,
+            "deferred_load": 0, "deferred_transfers": 0, "deferred_capacity": 0,
+        }
+
+    def interval(self) -> float:
+        base = self.ttl * (self.THREAT_TTL_FACTOR if self.threatened else 1)
+        return base * self.rng.uniform(1 - self.JITTER, 1 + self.JITTER)
+
+    def hit_rate(self, now: float, hits: float) -> float:
+        """Honeypot hits per minute since the previous check"""
+        rate = 0.0
+        if self.last_check is not None and now > self.last_check:
+            rate = max(0.0, hits - self.last_hits) / (now - self.last_check) * 60
+        self.last_check, self.last_hits = now, hits
+        return rate
+
+    def defer_reason(self, signals: RotationSignals) -> Optional[str]:
+        capacity = max(1, signals.active_pods) * self.PEAK_INFLIGHT_PER_POD
+        if signals.inflight >= self.PEAK_LOAD * capacity:
+            return "load"
+        if signals.large_transfers > self.MAX_LARGE_TRANSFERS:
+            return "transfers"
+        return None
+
+    def decide(self, signals: RotationSignals) -> Optional[str]:
+        """Why the active generation should rotate now, or None to keep it"""
+        now = self.clock()
+        threatened = self.THREAT_HITS_PER_MINUTE > 0 and self.hit_rate(now, signals.honeypot_hits) >= self.THREAT_HITS_PER_MINUTE
+        if threatened != self.threatened:
+            self.threatened = threatened
+            self.logger.info(f"Honeypot hits {'spiking, shortening' if threatened else 'back to normal, restoring'} the rotation interval")
+            shortened = now + self.interval() if threatened else self.next_due
+            if shortened < self.next_due:
+                self.next_due = shortened
+                self.stats["shortened"] += 1
+
+        if now < self.next_due:
+            return None
+
+        # A hard limit: never provision past the pod budget, however long it has been
+        if signals.tracked_pods + self.step_pods > self.max_pods:
+            self._defer("capacity", f"{signals.tracked_pods} webapp pods leave no room for {self.step_pods} more")
+            return None
+        reason = self.defer_reason(signals)
+        if reason is not None and now - self.next_due < self.MAX_DEFER * self.ttl:
+            self._defer(reason, f"{signals.inflight} requests and {signals.large_transfers} large transfers in flight")
+            return None
+        self.deferred = None
+        decision = "forced" if reason else "threat" if self.threatened else "scheduled"
+        self.stats[decision] += 1
+        return decision
+
+    def _defer(self, reason: str, detail: str):
+        self.stats[f"deferred_{reason}"] += 1
+        if self.deferred != reason:
+            self.deferred = reason
+            self.logger.info(f"Deferring rotation ({reason}): {detail}")
+
+    def rotated(self, started: Optional[float] = None):
+        """Schedule the next rotation, counted from when the one that just happened started"""
+        self.next_due = (self.clock() if started is None else started) + self.interval()
+
+    def seconds_until_due(self) -> float:
+        return self.next_due - self.clock()
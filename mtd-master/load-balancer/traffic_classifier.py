@@ -0,0 +1,176 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+import metrics
+import utils
+from admission import RequestGate
+
+DIVERSIONS = metrics.Counter("lb_diversions_total", "Requests diverted to the honeypot, by the reason the client was flagged", ["reason"])
+
+""" Set when a trusted proxy in front of the LB reports the client address, e.g. X-Forwarded-For """
+CLIENT_IP_HEADER = os.environ.get("CLIENT_IP_HEADER", "")
+
+""" User agents of common scanners and attack tools, matched against the lowercased header:
+IGNORECASE would defeat the regex engine's literal search and cost ten times as much """
+SCANNER_AGENTS = re.compile(
+    r"sqlmap|nikto|nmap|masscan|zgrab|gobuster|dirbuster|dirb/|wfuzz|ffuf|feroxbuster|nuclei|"
+    r"acunetix|nessus|openvas|w3af|arachni|skipfish|hydra|jaeles|whatweb|wpscan|netsparker|burp"
+)
+
+""" Paths the webapp never serves but vulnerability scanners always try """
+PROBE_PATHS = re.compile(
+    r"/\.(?:env|git|svn|hg|aws|ssh|htaccess|htpasswd|DS_Store)|"
+    r"/(?:wp-admin|wp-login|wp-content|wp-includes|xmlrpc|phpmyadmin|pma|myadmin|cgi-bin|"
+    r"actuator|server-status|server-info|console|manager/html|solr|jenkins|boaform|HNAP1)(?:/|\.|$)|"
+    r"\.(?:php|asp|aspx|jsp|cgi)(?:$|\?)|"
+    r"\.\./|%2e%2e|/etc/passwd|/proc/self",
+    re.IGNORECASE
+)
+
+""" Injection attempts in the path or query string """
+INJECTION = re.compile(
+    r"union(?:\s|\+|%20)+select|'(?:\s|\+|%20)*or(?:\s|\+|%20)+'?1'?\s*=|<script|%3cscript|"
+    r"\$\{jndi:|;(?:\s|%20)*(?:cat|wget|curl)(?:\s|%20)|sleep\(\d+\)",
+    re.IGNORECASE
+)
+
+
+class SlidingWindowCounter:
+    """
+    Approximate count of events over the last window seconds, in constant space:
+    the previous fixed window is weighted by how much of it still overlaps
+    """
+    __slots__ = ("index", "previous", "current")
+
+    def __init__(self):
+        self.index = 0
+        self.previous = 0
+        self.current = 0
+
+    def add(self, now: float, window: float) -> float:
+        index, elapsed = divmod(now, window)
+        if index != self.index:
+            self.previous = self.current if index == self.index + 1 else 0
+            self.current = 0
+            self.index = index
+        self.current += 1
+        return self.previous * (1 - elapsed / window) + self.current
+
+
+class ClientState:
+    __slots__ = ("requests", "not_found", "diverted_until", "reason")
+
+    def __init__(self):
+        self.requests = SlidingWindowCounter()
+        self.not_found = SlidingWindowCounter()
+        self.diverted_until = 0.0
+        self.reason: Optional[str] = None
+
+
+def client_address(remote_addr: Optional[str], headers) -> str:
+    """The client IP, taken from CLIENT_IP_HEADER when the LB sits behind a trusted proxy"""
+    if CLIENT_IP_HEADER:
+        forwarded = headers.get(CLIENT_IP_HEADER)
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return remote_addr or ""
+
+
+class TrafficClassifier:
+    """
+    In-line verdict on every request: None for legitimate traffic, or the reason
+    the flow should be diverted to the honeypot.
+
+    A request is suspicious when its user agent is a known scanner, its path or
+    query is a probe or an injection, or its client is sending requests or
+    collecting 404s faster than a browser would. A client flagged once stays
+    diverted for DIVERT_SECONDS, so an attacker keeps seeing the same service.
+    Everything is a precompiled regex search or an O(1) counter update.
+
+    Both engines classify only what RequestGate let through, and its per-client
+    token bucket admits at most CLIENT_BURST + CLIENT_RATE * WINDOW_SECONDS
+    requests per window. MAX_REQUESTS defaults to twice that, so a client, or a
+    NAT full of users, within the rate limit is throttled with 429s but never
+    diverted for its rate. Without a client rate limit it is 30 requests a second.
+    """
+    ENABLED = os.environ.get("HONEYPOT_DIVERSION_ENABLED", "true").lower() == "true"
+    WINDOW_SECONDS = float(os.environ.get("CLASSIFIER_WINDOW_SECONDS", 10))
+    RATE_LIMITED_REQUESTS = RequestGate.CLIENT_BURST + RequestGate.CLIENT_RATE * WINDOW_SECONDS if RequestGate.CLIENT_RATE > 0 else 0
+    MAX_REQUESTS = float(os.environ.get("CLASSIFIER_MAX_REQUESTS", 2 * RATE_LIMITED_REQUESTS or 300))
+    MAX_NOT_FOUND = float(os.environ.get("CLASSIFIER_MAX_NOT_FOUND", 15))
+    DIVERT_SECONDS = float(os.environ.get("CLASSIFIER_DIVERT_SECONDS", 600))
+    MAX_CLIENTS = int(os.environ.get("CLASSIFIER_MAX_CLIENTS", 100000))
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.clients: "OrderedDict[str, ClientState]" = OrderedDict()
+        self.stats: Dict[str, int] = {"classified": 0, "diverted": 0}
+        self.logger = utils.create_stdout_logger(logging.INFO, "traffic-classifier")
+        if self.MAX_REQUESTS <= self.RATE_LIMITED_REQUESTS:
+            self.logger.warning(f"CLASSIFIER_MAX_REQUESTS={self.MAX_REQUESTS:.0f} diverts clients within the rate limit, "
+                                f"which admits up to {self.RATE_LIMITED_REQUESTS:.0f} requests per {self.WINDOW_SECONDS:.0f}s")
+
+    def _state(self, client_ip: str) -> ClientState:
+        state = self.clients.get(client_ip)
+        if state is None:
+            state = self.clients[client_ip] = ClientState()
+            if len(self.clients) > self.MAX_CLIENTS:
+                self.clients.popitem(last=False)
+        else:
+            self.clients.move_to_end(client_ip)
+        return state
+
+    def classify(self, client_ip: str, path: str, user_agent: Optional[str]) -> Optional[str]:
+        """Why this request should go to the honeypot, or None; path includes the query string"""
+        if not self.ENABLED:
+            return None
+        now = self.clock()
+        reason = None
+        if user_agent and SCANNER_AGENTS.search(user_agent.lower()):
+            reason = "scanner"
+        elif PROBE_PATHS.search(path):
+            reason = "probe"
+        elif INJECTION.search(path):
+            reason = "injection"
+
+        with self.lock:
+            self.stats["classified"] += 1
+            state = self._state(client_ip)
+            rate = state.requests.add(now, self.WINDOW_SECONDS)
+            if reason is None:
+                if state.diverted_until > now:
+                    reason = state.reason
+                elif rate > self.MAX_REQUESTS:
+                    reason = "rate"
+            if reason is None:
+                return None
+            flagged = state.diverted_until <= now
+            if flagged:
+                state.reason = reason
+            state.diverted_until = now + self.DIVERT_SECONDS
+            self.stats["diverted"] += 1
+            self.stats[reason] = self.stats.get(reason, 0) + 1
+        DIVERSIONS.labels(reason).inc()
+        # Once per flagged client, not once per diverted request
+        if flagged:
+            self.logger.warning(f"Diverting {client_ip} to the honeypot ({reason})")
+        return reason
+
+    def observe(self, client_ip: str, status: int):
+        """Feed back the webapp's answer: a burst of 404s is a client guessing paths"""
+        if not self.ENABLED or status != 404:
+            return
+        now = self.clock()
+        with self.lock:
+            state = self._state(client_ip)
+            flagged = state.not_found.add(now, self.WINDOW_SECONDS) > self.MAX_NOT_FOUND and state.diverted_until <= now
+            if flagged:
+                state.reason = "not-found"
+                state.diverted_until = now + self.DIVERT_SECONDS
+        if flagged:
+            self.logger.warning(f"Diverting {client_ip} to the honeypot (not-found)")
@@ -1,15 +1,134 @@
-import logging
-
-
-def create_stdout_logger(level, *labels) -> logging.Logger:
-    logger = logging.getLogger(" - ".join(labels))
-    logger.setLevel(level)
-
-    h = logging.StreamHandler()
-    h.setLevel(level)
-
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s')
-    h.setFormatter(formatter)
-
-    logger.addHandler(h)
-    return logger
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+""" One logging pipeline per process: loggers enqueue records, a single thread formats and writes them """
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()  # json, or text for the old one-line format
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", 10000))
+REQUEST_LOG_SAMPLE_RATE = float(os.environ.get("REQUEST_LOG_SAMPLE_RATE", 0.01))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the fields bound to the logger or passed as extra={"fields": ...}"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Never blocks the caller: when the writer falls behind and the queue is full,
+    the record is dropped and counted instead of stalling a request.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, the objects may change before the writer gets to them
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Keeps one in every 1 / rate records below WARNING, for logs written on every
+    request. Warnings and errors are always kept. The message is only formatted
+    for the records that are kept, so pass arguments rather than an f-string.
+    """
+
+    def __init__(self, logger: logging.Logger, rate: float):
+        super().__init__(logger, {})
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self.counter = itertools.count()
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level >= logging.WARNING:
+            return self.logger.isEnabledFor(level)
+        return self.every > 0 and self.logger.isEnabledFor(level) and next(self.counter) % self.every == 0
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+class BoundLogger(logging.LoggerAdapter):
+    """A shared logger that adds fixed fields, e.g. the pod, to each of its records"""
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get("extra") or {}
+        kwargs["extra"] = dict(extra, fields=dict(self.extra, **extra.get("fields", {})))
+        return msg, kwargs
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def log_handler() -> DroppingQueueHandler:
+    """The process-wide queue handler, and the thread writing its records to stdout"""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            stream = logging.StreamHandler(sys.stdout)
+            stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+            log_queue = queue.Queue(LOG_QUEUE_SIZE)
+            listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+            listener.start()
+            # Flush what is still queued when the process exits
+            atexit.register(listener.stop)
+            _handler = DroppingQueueHandler(log_queue)
+        return _handler
+
+
+def create_stdout_logger(level, *labels) -> logging.Logger:
+    """
+    The logger named after labels, writing through the shared queue. Calling it
+    again for the same name returns the same logger without adding a handler.
+    """
+    logger = logging.getLogger(" - ".join(labels))
+    logger.setLevel(level)
+    handler = log_handler()
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+        logger.propagate = False
+    return logger
+
+
+def bind(logger: logging.Logger, **fields) -> BoundLogger:
+    return BoundLogger(logger, fields)
+
+
+def request_logger(*labels, rate: float = REQUEST_LOG_SAMPLE_RATE) -> SampledLogger:
+    """Logger for per-request records, sampled at REQUEST_LOG_SAMPLE_RATE"""
+    return SampledLogger(create_stdout_logger(logging.INFO, *labels), rate)
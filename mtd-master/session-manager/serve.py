@@ -1,24 +1,110 @@
-from typing import Dict
-from flask import Flask, Response, request
-from markupsafe import escape
-
-app = Flask("session manager")
-
-sessions: Dict[str, dict] = {}
-
-
-@app.route("/session/<session_id>", methods=["PUT"])
-def create_session(session_id):
-    if request.json is not None:
-        sessions[session_id] = request.json
-        return Response(status=202)
-    else:
-        return Response(status=400)
-
-
-@app.route("/session/<session_id>", methods=["GET"])
-def get_session(session_id):
-    return sessions[session_id], 200 if session_id in sessions else Response(status=404)
-
-
-app.run(host="0.0.0.0", port=8888, debug=True)
+import os
+import signal
+import sys
+import threading
+from flask import Flask, Response, jsonify, request
+from markupsafe import escape
+from sharded_store import ShardedStore
+
+app = Flask("session manager")
+
+SESSION_TTL = int(os.environ.get("SESSION_TTL", 3600))
+SESSION_SHARDS = int(os.environ.get("SESSION_SHARDS", 16))
+SESSION_MAX_BYTES = int(os.environ.get("SESSION_MAX_BYTES", 256 * 1024 * 1024))
+SNAPSHOT_PATH = os.environ.get("SESSION_SNAPSHOT_PATH")
+SNAPSHOT_INTERVAL = int(os.environ.get("SESSION_SNAPSHOT_INTERVAL", 60))
+
+sessions = ShardedStore(shards=SESSION_SHARDS, default_ttl=SESSION_TTL, max_bytes=SESSION_MAX_BYTES)
+
+
+def checked_ttl(ttl):
+    """A per-entry TTL in whole seconds, 0 or more, or None for the default; ValueError otherwise"""
+    # bool is an int subclass, but "ttl": true is not a number of seconds
+    if ttl is not None and (not isinstance(ttl, int) or isinstance(ttl, bool) or ttl < 0):
+        raise ValueError(f"Invalid ttl {ttl!r}")
+    return ttl
+
+
+def request_ttl():
+    """Optional per-entry TTL in seconds from the ?ttl= query parameter"""
+    ttl = request.args.get("ttl")
+    return checked_ttl(None if ttl is None else int(ttl))
+
+
+@app.route("/session/<session_id>", methods=["PUT"])
+def create_session(session_id):
+    if request.json is not None:
+        try:
+            ttl = request_ttl()
+        except ValueError:
+            return Response(status=400)
+        sessions.put(session_id, request.json, ttl=ttl)
+        return Response(status=202)
+    else:
+        return Response(status=400)
+
+
+@app.route("/session/<session_id>", methods=["GET"])
+def get_session(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        return Response(status=404)
+    return session, 200
+
+
+@app.route("/session/<session_id>", methods=["DELETE"])
+def delete_session(session_id):
+    return Response(status=204 if sessions.delete(session_id) else 404)
+
+
+@app.route("/sessions/batch-get", methods=["POST"])
+def batch_get_sessions():
+    body = request.get_json(silent=True)
+    if not body or not isinstance(body.get("ids"), list):
+        return Response(status=400)
+    found = {key: value for key, value in sessions.get_many(body["ids"]).items() if value is not None}
+    return jsonify({"sessions": found}), 200
+
+
+@app.route("/sessions", methods=["PUT"])
+def batch_put_sessions():
+    body = request.get_json(silent=True)
+    if not body or not isinstance(body.get("sessions"), dict):
+        return Response(status=400)
+    try:
+        ttl = checked_ttl(body.get("ttl"))
+    except ValueError:
+        return Response(status=400)
+    sessions.put_many(body["sessions"], ttl=ttl)
+    return Response(status=202)
+
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify(sessions.stats()), 200
+
+
+def snapshot_periodically(stopped: threading.Event):
+    while not stopped.wait(SNAPSHOT_INTERVAL):
+        sessions.snapshot(SNAPSHOT_PATH)
+
+
+def shutdown(stopped: threading.Event):
+    stopped.set()
+    sessions.stop()
+    if SNAPSHOT_PATH:
+        sessions.snapshot(SNAPSHOT_PATH)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    stopped = threading.Event()
+    sessions.run_expiry()
+    if SNAPSHOT_PATH:
+        restored = sessions.restore(SNAPSHOT_PATH)
+        app.logger.warning(f"Restored {restored} sessions from {SNAPSHOT_PATH}")
+        threading.Thread(target=snapshot_periodically, args=(stopped,), daemon=True).start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: shutdown(stopped))
+    signal.signal(signal.SIGINT, lambda signum, frame: shutdown(stopped))
+
+    app.run(host="0.0.0.0", port=8888, threaded=True)
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from zlib import crc32
+
+
+class Shard:
+    """One lock-striped slice of the store, kept in LRU order"""
+
+    def __init__(self, max_bytes: int):
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[dict, float, int]]" = OrderedDict()
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _remove(self, key: str):
+        _, _, size = self.entries.pop(key)
+        self.used_bytes -= size
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel with one-second ticks.
+
+    Keys are filed under the slot of their expiry second; every tick only looks
+    at one slot, so expiry costs nothing for keys that are not due. Keys whose
+    TTL is longer than the wheel simply come round again and are re-checked.
+    """
+
+    def __init__(self, slots: int):
+        self.slots: List[Set[Tuple[int, str]]] = [set() for _ in range(slots)]
+        self.lock = threading.Lock()
+        self.current_tick = int(time.time())
+
+    def schedule(self, shard_index: int, key: str, expires_at: float):
+        tick = max(int(expires_at), self.current_tick + 1)
+        with self.lock:
+            self.slots[tick % len(self.slots)].add((shard_index, key))
+
+    def advance(self, now: float) -> Iterable[Tuple[int, str]]:
+        """Pop every slot between the last tick and now"""
+        due = []
+        with self.lock:
+            while self.current_tick < int(now):
+                self.current_tick += 1
+                slot = self.current_tick % len(self.slots)
+                due.extend(self.slots[slot])
+                self.slots[slot] = set()
+        return due
+
+
+class ShardedStore:
+    """
+    In-memory session store: lock-striped shards, per-entry TTL expired by a
+    timer wheel, and a memory cap enforced with per-shard LRU eviction.
+    """
+
+    def __init__(self, shards: int = 16, default_ttl: int = 3600, max_bytes: int = 256 * 1024 * 1024, wheel_slots: int = 3600):
+        self.default_ttl = default_ttl
+        self.shards = [Shard(max_bytes // shards) for _ in range(shards)]
+        self.wheel = TimerWheel(wheel_slots)
+        self._stopped = threading.Event()
+
+    def _shard_index(self, key: str) -> int:
+        return crc32(key.encode()) % len(self.shards)
+
+    def put(self, key: str, value: dict, ttl: Optional[int] = None):
+        expires_at = time.time() + (self.default_ttl if ttl is None else ttl)
+        size = len(key) + len(json.dumps(value))
+        index = self._shard_index(key)
+        shard = self.shards[index]
+        with shard.lock:
+            if key in shard.entries:
+                shard._remove(key)
+            shard.entries[key] = (value, expires_at, size)
+            shard.used_bytes += size
+            while shard.used_bytes > shard.max_bytes and len(shard.entries) > 1:
+                oldest = next(iter(shard.entries))
+                shard._remove(oldest)
+                shard.evictions += 1
+        self.wheel.schedule(index, key, expires_at)
+
+    def get(self, key: str) -> Optional[dict]:
+        shard = self.shards[self._shard_index(key)]
+        with shard.lock:
+            entry = shard.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                shard._remove(key)
+                shard.expirations += 1
+                return None
+            shard.entries.move_to_end(key)
+            return entry[0]
+
+    def delete(self, key: str) -> bool:
+        shard = self.shards[self._shard_index(key)]
+        with shard.lock:
+            if key not in shard.entries:
+                return False
+            shard._remove(key)
+            return True
+
+    def get_many(self, keys: List[str]) -> Dict[str, Optional[dict]]:
+        return {key: self.get(key) for key in keys}
+
+    def put_many(self, values: Dict[str, dict], ttl: Optional[int] = None):
+        for key, value in values.items():
+            self.put(key, value, ttl)
+
+    def expire_due(self, now: Optional[float] = None) -> int:
+        """Drop every entry whose expiry second has passed"""
+        now = now or time.time()
+        expired = 0
+        for index, key in self.wheel.advance(now):
+            shard = self.shards[index]
+            with shard.lock:
+                entry = shard.entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    shard._remove(key)
+                    shard.expirations += 1
+                    expired += 1
+                    continue
+            # Re-put with a later TTL, or a TTL longer than one turn of the wheel
+            self.wheel.schedule(index, key, entry[1])
+        return expired
+
+    def run_expiry(self):
+        threading.Thread(target=self._expiry_loop, name="session-expiry", daemon=True).start()
+
+    def _expiry_loop(self):
+        while not self._stopped.wait(1):
+            self.expire_due()
+
+    def stop(self):
+        self._stopped.set()
+
+    def stats(self) -> dict:
+        return {
+            "entries": sum(len(shard.entries) for shard in self.shards),
+            "used_bytes": sum(shard.used_bytes for shard in self.shards),
+            "max_bytes": sum(shard.max_bytes for shard in self.shards),
+            "evictions": sum(shard.evictions for shard in self.shards),
+            "expirations": sum(shard.expirations for shard in self.shards),
+            "shards": len(self.shards),
+        }
+
+    def snapshot(self, path: str):
+        """Write all live entries to path atomically, one JSON record per line"""
+        now = time.time()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            for shard in self.shards:
+                with shard.lock:
+                    items = [(key, value, expires_at) for key, (value, expires_at, _) in shard.entries.items() if expires_at > now]
+                for key, value, expires_at in items:
+                    f.write(json.dumps({"key": key, "value": value, "expires_at": expires_at}) + "\n")
+        os.replace(tmp_path, path)
+
+    def restore(self, path: str) -> int:
+        """Load a snapshot written by snapshot(), skipping entries that expired meanwhile"""
+        if not os.path.exists(path):
+            return 0
+        now = time.time()
+        restored = 0
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                remaining = record["expires_at"] - now
+                if remaining > 0:
+                    self.put(record["key"], record["value"], ttl=remaining)
+                    restored += 1
+        return restored
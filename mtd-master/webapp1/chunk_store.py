@@ -0,0 +1,267 @@
+import fcntl
+import hashlib
+import json
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional
+
+
+class UploadOffsetMismatch(Exception):
+    """The client resumed an upload from another byte than the one the server expects"""
+
+    def __init__(self, expected: int):
+        super().__init__(f"Upload continues at byte {expected}")
+        self.expected = expected
+
+
+class ChunkWriter:
+    """
+    Writable stream that cuts what it receives into stored chunks.
+
+    The chunk being filled lives in partial_path and is hashed as bytes arrive;
+    once full it is moved into the store under its digest, or dropped when the
+    store already has it. Werkzeug can use it directly as a file part container.
+    A scratch writer keeps its full chunks aside until finish(), so a part that
+    is never finished leaves nothing in the store.
+    """
+
+    def __init__(self, store: "ChunkStore", partial_path: str, scratch: bool = False):
+        self.store = store
+        self.partial_path = partial_path
+        self.scratch = scratch
+        self.chunks: List[str] = []
+        self.pending: List[str] = []
+        self.written = 0
+        self.file = open(partial_path, "ab+")
+        self.file.seek(0)
+        self.digest = hashlib.sha256()
+        for block in iter(lambda: self.file.read(1024 * 1024), b""):
+            self.digest.update(block)
+        self.filled = self.file.tell()
+
+    def write(self, data) -> int:
+        view = memoryview(data)
+        while view:
+            part = view[:self.store.CHUNK_SIZE - self.filled]
+            self.file.write(part)
+            self.digest.update(part)
+            self.filled += len(part)
+            self.written += len(part)
+            view = view[len(part):]
+            if self.filled == self.store.CHUNK_SIZE:
+                self._seal()
+        return len(data)
+
+    def _seal(self):
+        self.file.close()
+        digest = self.digest.hexdigest()
+        if self.scratch:
+            sealed = f"{self.partial_path}.{len(self.chunks)}"
+            os.replace(self.partial_path, sealed)
+            self.pending.append(sealed)
+        else:
+            self.store.adopt(self.partial_path, digest)
+        self.chunks.append(digest)
+        self.file = open(self.partial_path, "ab+")
+        self.digest = hashlib.sha256()
+        self.filled = 0
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        # Werkzeug rewinds file parts once they are complete; the data is already stored
+        return 0
+
+    def tell(self) -> int:
+        return self.written
+
+    def close(self):
+        self.file.close()
+        if self.scratch:
+            # A one-shot upload that is never finished leaves nothing behind
+            for path in self.pending + [self.partial_path]:
+                if os.path.exists(path):
+                    os.unlink(path)
+            self.pending = []
+
+    def finish(self) -> List[str]:
+        """Store the last, shorter chunk and return the digests of every chunk written"""
+        if self.filled:
+            self._seal()
+        self.file.close()
+        for path, digest in zip(self.pending, self.chunks):
+            self.store.adopt(path, digest)
+        self.pending = []
+        if os.path.exists(self.partial_path):
+            os.unlink(self.partial_path)
+        return self.chunks
+
+
+class ManifestSource:
+    """A stored file seen through its manifest, readable by byte range"""
+
+    def __init__(self, store: "ChunkStore", manifest: dict):
+        self.store = store
+        self.manifest = manifest
+        self.path = None
+        self.size = manifest["size"]
+        self.mtime = manifest["created"]
+        self.etag = manifest["content_id"]
+
+    def chunks(self, start: int, length: int):
+        chunk_size = self.manifest["chunk_size"]
+        index, skip = divmod(start, chunk_size)
+        while length > 0:
+            with open(self.store.chunk_path(self.manifest["chunks"][index]), "rb") as f:
+                f.seek(skip)
+                while length > 0:
+                    block = f.read(min(length, 256 * 1024))
+                    if not block:
+                        break
+                    length -= len(block)
+                    yield block
+            index, skip = index + 1, 0
+
+
+class ChunkStore:
+    """
+    Content-addressed file storage on a volume shared by every pod.
+
+    Files are cut into fixed-size chunks stored once under their SHA-256, and
+    each user file is a small manifest listing its chunks, so identical content
+    costs no extra disk and files outlive the pod that received them. Resumable
+    uploads keep their state next to the chunks, so any pod can continue them.
+    """
+    CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+
+    def __init__(self, root: str):
+        self.root = root
+        for directory in ("chunks", "manifests", "uploads", "tmp"):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.root, "chunks", digest[:2], digest)
+
+    def manifest_path(self, user: str, filename: str) -> str:
+        return os.path.join(self.root, "manifests", user, f"{filename}.json")
+
+    def upload_path(self, upload_id: str, suffix: str) -> str:
+        return os.path.join(self.root, "uploads", f"{upload_id}.{suffix}")
+
+    def adopt(self, path: str, digest: str) -> str:
+        """Move a finished chunk file into the store, or drop it when the content is already there"""
+        target = self.chunk_path(digest)
+        if os.path.exists(target):
+            os.unlink(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+        return digest
+
+    def writer(self) -> ChunkWriter:
+        """A writer for a one-shot upload, filling a private scratch file"""
+        return ChunkWriter(self, os.path.join(self.root, "tmp", uuid.uuid4().hex), scratch=True)
+
+    def _write_json(self, path: str, data: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def save_manifest(self, user: str, filename: str, chunks: List[str], size: int) -> dict:
+        manifest = {
+            "name": filename,
+            "size": size,
+            "chunk_size": self.CHUNK_SIZE,
+            "chunks": chunks,
+            "content_id": hashlib.sha256(":".join(chunks).encode()).hexdigest()[:32],
+            "created": time.time(),
+        }
+        self._write_json(self.manifest_path(user, filename), manifest)
+        return manifest
+
+    def load_manifest(self, user: str, filename: str) -> Optional[dict]:
+        try:
+            with open(self.manifest_path(user, filename)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def list_manifests(self, user: str) -> List[dict]:
+        directory = os.path.join(self.root, "manifests", user)
+        if not os.path.isdir(directory):
+            return []
+        manifests = []
+        for entry in os.listdir(directory):
+            if entry.endswith(".json"):
+                manifest = self.load_manifest(user, entry[:-len(".json")])
+                if manifest is not None:
+                    manifests.append(manifest)
+        return manifests
+
+    @contextmanager
+    def _locked(self, upload_id: str):
+        """Serialise work on one upload across threads and pods sharing the volume"""
+        with open(self.upload_path(upload_id, "lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def create_upload(self, user: str, filename: str, size: Optional[int] = None) -> dict:
+        upload = {"id": uuid.uuid4().hex, "user": user, "filename": filename, "size": size, "chunks": []}
+        self._write_json(self.upload_path(upload["id"], "json"), upload)
+        return dict(upload, offset=0)
+
+    def get_upload(self, upload_id: str) -> Optional[dict]:
+        """Upload state, with the offset the next part has to start at"""
+        try:
+            with open(self.upload_path(upload_id, "json")) as f:
+                upload = json.load(f)
+        except FileNotFoundError:
+            return None
+        partial_path = self.upload_path(upload_id, "part")
+        partial = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+        upload["offset"] = len(upload["chunks"]) * self.CHUNK_SIZE + partial
+        return upload
+
+    def append_upload(self, upload_id: str, offset: int, stream, block_size: int = 256 * 1024) -> dict:
+        """
+        Append the bytes of stream at offset.
+
+        Everything received is kept even if the client goes away mid-part: the
+        offset is derived from the sealed chunks and the partial chunk on disk,
+        so a chunk sealed after the last state write is simply sent again and
+        deduplicated.
+        """
+        with self._locked(upload_id):
+            upload = self.get_upload(upload_id)
+            if upload is None:
+                raise KeyError(upload_id)
+            if upload["offset"] != offset:
+                raise UploadOffsetMismatch(upload["offset"])
+            writer = ChunkWriter(self, self.upload_path(upload_id, "part"))
+            try:
+                for block in iter(lambda: stream.read(block_size), b""):
+                    writer.write(block)
+            finally:
+                writer.close()
+                upload["chunks"].extend(writer.chunks)
+                self._write_json(self.upload_path(upload_id, "json"), {key: value for key, value in upload.items() if key != "offset"})
+            return self.get_upload(upload_id)
+
+    def complete_upload(self, upload_id: str) -> dict:
+        """Turn a finished upload into a manifest in the user's files"""
+        with self._locked(upload_id):
+            upload = self.get_upload(upload_id)
+            if upload is None:
+                raise KeyError(upload_id)
+            if upload["size"] is not None and upload["offset"] != upload["size"]:
+                raise UploadOffsetMismatch(upload["offset"])
+            chunks = upload["chunks"] + ChunkWriter(self, self.upload_path(upload_id, "part")).finish()
+            manifest = self.save_manifest(upload["user"], upload["filename"], chunks, upload["offset"])
+            os.unlink(self.upload_path(upload_id, "json"))
+        os.unlink(self.upload_path(upload_id, "lock"))
+        return manifest
@@ -1,414 +1,625 @@
-import os
-import uuid
-import json
-import redis
-from flask import Flask, request, jsonify, Response, send_file, render_template_string
-from werkzeug.utils import secure_filename
-import requests as req
-from markupsafe import escape
-
-app = Flask("mtd_webapp")
-
-# Redis configuration
-REDIS_HOST = os.environ.get("REDIS_HOST", "redis-service")
-REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
-REDIS_DB = int(os.environ.get("REDIS_DB", "0"))
-
-# Configure upload directory
-UPLOAD_FOLDER = '/app/uploads'
-DOWNLOAD_FOLDER = '/app/downloads'
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(DOWNLOAD_FOLDER, exist_ok=True)
-
-# Predefined files for download testing
-SAMPLE_FILES = {
-    'small.txt': 1024 * 10,      # 10KB
-    'medium.txt': 1024 * 1024,   # 1MB
-    'large.txt': 10 * 1024 * 1024, # 10MB
-    'huge.txt': 100 * 1024 * 1024  # 100MB
-}
-
-# Initialize Redis client
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=REDIS_DB)
-
-# Create sample files if they don't exist
-def create_sample_files():
-    for filename, size in SAMPLE_FILES.items():
-        filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-        if not os.path.exists(filepath):
-            app.logger.info(f"Creating sample file {filename} of size {size} bytes")
-            with open(filepath, 'wb') as f:
-                f.write(os.urandom(size))
-
-# Function to get pod info for debugging
-def get_pod_info():
-    return {
-        'pod_name': os.environ.get('HOSTNAME'),
-        'pod_ip': os.environ.get('POD_IP'),
-    }
-
-@app.route("/", methods=["GET"])
-def hello():
-    session_id = request.cookies.get("session_id")
-    pod_info = get_pod_info()
-    generic_message = jsonify({
-        "message": "Hello stranger",
-        "pod_info": pod_info,
-    }), 200
-
-    if session_id is None:
-        return generic_message
-
-    app.logger.info(f"Request with session id {session_id[:10]}...")
-    
-    # Try to get session data from Redis
-    user_data = redis_client.get(f"session:{session_id}")
-    
-    if user_data is None:
-        return generic_message
-    
-    user = json.loads(user_data)["user"]
-    app.logger.info(f"Request from user {user}")
-    
-    return jsonify({
-        "message": f"Hello {user}",
-        "pod_info": pod_info
-    }), 200
-
-@app.route("/login/<name>", methods=["PUT"])
-def login(name):
-    session_id = request.cookies.get("session_id")
-
-    if session_id is None:
-        session_id = uuid.uuid4().hex
-        app.logger.info(f"Setting new session id {session_id[:10]}...")
-
-    # Store session data in Redis
-    redis_client.set(
-        f"session:{session_id}", 
-        json.dumps({"user": name}),
-        ex=3600  # Set expiration to 1 hour
-    )
-
-    response = jsonify({
-        "message": f"{name} is now logged in!",
-        "pod_info": get_pod_info()
-    })
-    response.set_cookie(key="session_id", value=session_id, httponly=True, samesite='Strict')
-    return response, 202
-
-@app.route("/files", methods=["GET"])
-def list_files():
-    files = []
-    
-    for filename in SAMPLE_FILES.keys():
-        filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-        if os.path.exists(filepath):
-            size = os.path.getsize(filepath)
-            files.append({
-                "name": filename,
-                "size": size,
-                "type": "sample"
-            })
-    
-    session_id = request.cookies.get("session_id")
-    if session_id:
-        user_data = redis_client.get(f"session:{session_id}")
-        if user_data:
-            user = json.loads(user_data)["user"]
-            user_upload_dir = os.path.join(UPLOAD_FOLDER, user)
-            if os.path.exists(user_upload_dir):
-                for filename in os.listdir(user_upload_dir):
-                    filepath = os.path.join(user_upload_dir, filename)
-                    if os.path.isfile(filepath):
-                        size = os.path.getsize(filepath)
-                        files.append({
-                            "name": filename,
-                            "size": size,
-                            "type": "user"
-                        })
-    
-    return jsonify({
-        "files": files,
-        "pod_info": get_pod_info()
-    }), 200
-
-@app.route("/download/<filename>", methods=["GET"])
-def download_file(filename):
-    filepath = os.path.join(DOWNLOAD_FOLDER, filename)
-    
-    if not os.path.exists(filepath):
-        session_id = request.cookies.get("session_id")
-        if session_id:
-            user_data = redis_client.get(f"session:{session_id}")
-            if user_data:
-                user = json.loads(user_data)["user"]
-                filepath = os.path.join(UPLOAD_FOLDER, user, filename)
-    
-    if os.path.exists(filepath):
-        return send_file(filepath, as_attachment=True)
-    else:
-        return jsonify({
-            "error": "File not found",
-            "pod_info": get_pod_info()
-        }), 404
-
-@app.route("/upload", methods=["POST"])
-def upload_file():
-    session_id = request.cookies.get("session_id")
-    if not session_id:
-        return jsonify({
-            "error": "Authentication required",
-            "pod_info": get_pod_info()
-        }), 401
-    
-    user_data = redis_client.get(f"session:{session_id}")
-    if not user_data:
-        return jsonify({
-            "error": "Session expired",
-            "pod_info": get_pod_info()
-        }), 401
-    
-    user = json.loads(user_data)["user"]
-    
-    if 'file' not in request.files:
-        return jsonify({
-            "error": "No file part",
-            "pod_info": get_pod_info()
-        }), 400
-    
-    file = request.files['file']
-    if file.filename == '':
-        return jsonify({
-            "error": "No selected file",
-            "pod_info": get_pod_info()
-        }), 400
-    
-    user_upload_dir = os.path.join(UPLOAD_FOLDER, user)
-    os.makedirs(user_upload_dir, exist_ok=True)
-    
-
-    filename = secure_filename(file.filename)
-    filepath = os.path.join(user_upload_dir, filename)
-    file.save(filepath)
-    
-    return jsonify({
-        "message": "File uploaded successfully",
-        "filename": filename,
-        "size": os.path.getsize(filepath),
-        "pod_info": get_pod_info()
-    }), 201
-
-@app.route("/health", methods=["GET"])
-def health_check():
-    # Simple health check endpoint
-    return jsonify({
-        "status": "ok",
-        "pod_info": get_pod_info()
-    }), 200
-
-@app.route("/ui", methods=["GET"])
-def ui():
-    # A simple HTML UI for testing file uploads and downloads
-    html = """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>MTD Web Application</title>
-        <style>
-            body { font-family: Arial, sans-serif; margin: 20px; }
-            .container { max-width: 800px; margin: 0 auto; }
-            .card { border: 1px solid #ddd; border-radius: 4px; padding: 20px; margin-bottom: 20px; }
-            .btn { background-color: #4CAF50; color: white; padding: 10px 15px; border: none; border-radius: 4px; cursor: pointer; }
-            .btn:hover { background-color: #45a049; }
-            .file-list { margin-top: 20px; }
-            .file-item { padding: 10px; border-bottom: 1px solid #eee; display: flex; justify-content: space-between; }
-            #pod-info { font-size: 12px; color: #666; margin-top: 30px; }
-            .reconnect-info { background-color: #f8f9fa; padding: 10px; border-left: 4px solid #17a2b8; margin-bottom: 15px; }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>MTD Web Application</h1>
-            
-            <div class="reconnect-info">
-                <p><strong>Connection Info:</strong> This app uses automatic reconnection if the connection is lost due to pod rotation or IP changes.</p>
-            </div>
-            
-            <div class="card">
-                <h2>Login</h2>
-                <input type="text" id="username" placeholder="Enter username">
-                <button class="btn" onclick="login()">Login</button>
-                <div id="login-status"></div>
-            </div>
-            
-            <div class="card">
-                <h2>Upload File</h2>
-                <input type="file" id="file-upload">
-                <button class="btn" onclick="uploadFile()">Upload</button>
-                <div id="upload-status"></div>
-            </div>
-            
-            <div class="card">
-                <h2>Available Files</h2>
-                <button class="btn" onclick="listFiles()">Refresh File List</button>
-                <div id="file-list" class="file-list"></div>
-            </div>
-            
-            <div id="pod-info"></div>
-        </div>
-        
-        <script>
-            // Add reconnection logic and exponential backoff
-            class ReconnectingFetch {
-                constructor(maxRetries = 5, initialBackoff = 300) {
-                    this.maxRetries = maxRetries;
-                    this.initialBackoff = initialBackoff;
-                }
-                
-                async fetch(url, options = {}) {
-                    let retries = 0;
-                    let backoff = this.initialBackoff;
-                    
-                    while (retries <= this.maxRetries) {
-                        try {
-                            const response = await fetch(url, options);
-                            if (response.ok) {
-                                return response;
-                            }
-                        } catch (error) {
-                            console.log(`Request failed (attempt ${retries + 1}/${this.maxRetries + 1}): ${error.message}`);
-                        }
-                        
-                        if (retries === this.maxRetries) {
-                            break;
-                        }
-                        
-                        // Wait before retrying with exponential backoff
-                        await new Promise(resolve => setTimeout(resolve, backoff));
-                        backoff *= 2; // Exponential backoff
-                        retries++;
-                    }
-                    
-                    throw new Error(`Failed after ${this.maxRetries + 1} attempts`);
-                }
-            }
-            
-            const rfetch = new ReconnectingFetch();
-            
-            async function login() {
-                const username = document.getElementById('username').value;
-                if (!username) {
-                    alert('Please enter a username');
-                    return;
-                }
-                
-                try {
-                    const response = await rfetch.fetch(`/login/${username}`, {
-                        method: 'PUT',
-                        credentials: 'same-origin'
-                    });
-                    const data = await response.json();
-                    document.getElementById('login-status').innerText = data.message;
-                    document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
-                    listFiles();
-                } catch (error) {
-                    document.getElementById('login-status').innerText = `Error: ${error.message}`;
-                }
-            }
-            
-            async function uploadFile() {
-                const fileInput = document.getElementById('file-upload');
-                if (!fileInput.files.length) {
-                    alert('Please select a file');
-                    return;
-                }
-                
-                const formData = new FormData();
-                formData.append('file', fileInput.files[0]);
-                
-                try {
-                    const response = await rfetch.fetch('/upload', {
-                        method: 'POST',
-                        body: formData,
-                        credentials: 'same-origin'
-                    });
-                    const data = await response.json();
-                    document.getElementById('upload-status').innerText = data.message;
-                    document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
-                    listFiles();
-                } catch (error) {
-                    document.getElementById('upload-status').innerText = `Error: ${error.message}`;
-                }
-            }
-            
-            async function listFiles() {
-                try {
-                    const response = await rfetch.fetch('/files', {
-                        credentials: 'same-origin'
-                    });
-                    const data = await response.json();
-                    const fileList = document.getElementById('file-list');
-                    fileList.innerHTML = '';
-                    
-                    if (data.files.length === 0) {
-                        fileList.innerHTML = '<p>No files available</p>';
-                    } else {
-                        data.files.forEach(file => {
-                            const fileItem = document.createElement('div');
-                            fileItem.className = 'file-item';
-                            
-                            const fileInfo = document.createElement('div');
-                            fileInfo.innerText = `${file.name} (${formatSize(file.size)})`;
-                            
-                            const downloadBtn = document.createElement('button');
-                            downloadBtn.className = 'btn';
-                            downloadBtn.innerText = 'Download';
-                            downloadBtn.onclick = () => { window.location.href = `/download/${file.name}`; };
-                            
-                            fileItem.appendChild(fileInfo);
-                            fileItem.appendChild(downloadBtn);
-                            fileList.appendChild(fileItem);
-                        });
-                    }
-                    
-                    document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
-                } catch (error) {
-                    document.getElementById('file-list').innerHTML = `<p>Error loading files: ${error.message}</p>`;
-                }
-            }
-            
-            function formatSize(bytes) {
-                if (bytes < 1024) return bytes + ' B';
-                if (bytes < 1024 * 1024) return (bytes / 1024).toFixed(1) + ' KB';
-                if (bytes < 1024 * 1024 * 1024) return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
-                return (bytes / (1024 * 1024 * 1024)).toFixed(1) + ' GB';
-            }
-            
-            // Initialize
-            window.onload = function() {
-                // Attempt to load files on page load
-                listFiles();
-                
-                // Set up periodic health checks and pod info updates
-                setInterval(async () => {
-                    try {
-                        const response = await rfetch.fetch('/health', {
-                            credentials: 'same-origin'
-                        });
-                        const data = await response.json();
-                        document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
-                    } catch (error) {
-                        console.error('Health check failed:', error);
-                    }
-                }, 5000);
-            };
-        </script>
-    </body>
-    </html>
-    """
-    return render_template_string(html)
-
-if __name__ == "__main__":
-    create_sample_files()
-    app.run(host="0.0.0.0", port=8080, debug=True)
+import os
+import threading
+import time
+import uuid
+import redis
+from flask import Flask, g, request, jsonify, Response, render_template_string
+from werkzeug.utils import secure_filename
+import requests as req
+from markupsafe import escape
+from session_cache import SessionCache
+from session_store import SessionStore
+from file_serving import serve_file, serve_source
+from chunk_store import ChunkStore, ManifestSource, UploadOffsetMismatch
+from file_catalogue import FileCatalogue
+from sample_files import SampleSource
+from response_cache import MicroCache, micro_cached, static_response
+import metrics
+
+class UploadRequest(Flask.request_class):
+    """Request whose multipart file parts are chunked into scratch files instead of spooled; only finished parts reach the store"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return chunk_store.writer()
+
+
+app = Flask("mtd_webapp")
+app.request_class = UploadRequest
+
+# Redis configuration (REDIS_HOST, REDIS_PORT, REDIS_DB, replicas and Sentinel) is read by SessionStore
+SESSION_CACHE_ENABLED = os.environ.get("SESSION_CACHE_ENABLED", "true").lower() == "true"
+
+# Configure upload directory
+UPLOAD_FOLDER = '/app/uploads'
+os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+# Uploaded files live in a content-addressed store on a volume shared by all pods
+STORAGE_ROOT = os.environ.get("STORAGE_ROOT", "/app/storage")
+chunk_store = ChunkStore(STORAGE_ROOT)
+
+# Index of the users' files, listed page by page with a cursor
+file_catalogue = FileCatalogue(os.environ.get("CATALOGUE_PATH", os.path.join(STORAGE_ROOT, "catalogue.db")))
+FILES_PAGE_SIZE = int(os.environ.get("FILES_PAGE_SIZE", 100))
+FILES_MAX_PAGE_SIZE = int(os.environ.get("FILES_MAX_PAGE_SIZE", 1000))
+
+# Predefined files for download testing
+SAMPLE_FILES = {
+    'small.txt': 1024 * 10,      # 10KB
+    'medium.txt': 1024 * 1024,   # 1MB
+    'large.txt': 10 * 1024 * 1024, # 10MB
+    'huge.txt': 100 * 1024 * 1024  # 100MB
+}
+# Generated on demand from a seeded PRNG, identical on every pod and never written to disk
+SAMPLE_SOURCES = {filename: SampleSource(filename, size) for filename, size in SAMPLE_FILES.items()}
+
+# Set once the pod has finished starting up, and once it starts shutting down, see /ready
+started = threading.Event()
+draining = threading.Event()
+STARTED_AT = time.monotonic()
+startup_seconds = None
+
+# Initialize the session store and its local cache
+session_store = SessionStore.from_env()
+session_cache = SessionCache(session_store)
+
+# Per-session JSON served from a short-lived cache, see response_cache
+micro_cache = MicroCache()
+
+# Request metrics, exported on METRICS_PORT by metrics.serve() (gunicorn.conf.py merges the workers)
+REQUEST_SECONDS = metrics.Histogram("webapp_request_seconds", "Time to build each response, by endpoint", ["endpoint"])
+RESPONSES = metrics.Counter("webapp_responses_total", "Responses by endpoint and status code", ["endpoint", "code"])
+RESPONSE_BYTES = metrics.Counter("webapp_response_bytes_total", "Bytes of responses with a known length, downloads included, by endpoint", ["endpoint"])
+INFLIGHT = metrics.Gauge("webapp_inflight_requests", "Requests being handled")
+metrics.CallbackCounter("webapp_cache_lookups_total", "Lookups in the session cache and the response micro cache", ["cache", "result"], lambda: [
+    (("session", "hit"), session_cache.hits), (("session", "miss"), session_cache.misses),
+    (("micro", "hit"), micro_cache.hits), (("micro", "miss"), micro_cache.misses),
+])
+
+@app.before_request
+def start_request_metrics():
+    g.started = time.perf_counter()
+    INFLIGHT.inc()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_SECONDS.labels(endpoint).observe(time.perf_counter() - g.get("started", time.perf_counter()))
+    RESPONSES.labels(endpoint, response.status_code).inc()
+    if response.content_length:
+        RESPONSE_BYTES.labels(endpoint).inc(response.content_length)
+    return response
+
+@app.teardown_request
+def finish_request_metrics(exc):
+    if "started" in g:
+        INFLIGHT.dec()
+
+# Bring the catalogue in line with manifests written while no pod was indexing them
+def reconcile_catalogue():
+    changed = file_catalogue.reconcile(chunk_store)
+    app.logger.info(f"Catalogue reconciled with the chunk store, {changed} entries changed")
+
+# Look up session data, served from the local cache when it is enabled
+def load_session(session_id):
+    if SESSION_CACHE_ENABLED:
+        return session_cache.get(session_id)
+    return session_store.get(session_id)
+
+# Resolve the user behind the request's session cookie, or None
+def session_user():
+    session_id = request.cookies.get("session_id")
+    if not session_id:
+        return None
+    user_data = load_session(session_id)
+    return user_data["user"] if user_data else None
+
+# Pod identity never changes, so it is read once
+POD_INFO = {
+    'pod_name': os.environ.get('HOSTNAME'),
+    'pod_ip': os.environ.get('POD_IP'),
+}
+
+# Function to get pod info for debugging
+def get_pod_info():
+    return POD_INFO
+
+@app.route("/", methods=["GET"])
+@micro_cached(micro_cache)
+def hello():
+    session_id = request.cookies.get("session_id")
+    pod_info = get_pod_info()
+    generic_message = jsonify({
+        "message": "Hello stranger",
+        "pod_info": pod_info,
+    }), 200
+
+    if session_id is None:
+        return generic_message
+
+    app.logger.info(f"Request with session id {session_id[:10]}...")
+    
+    # Try to get session data from the cache or Redis
+    user_data = load_session(session_id)
+    
+    if user_data is None:
+        return generic_message
+    
+    user = user_data["user"]
+    app.logger.info(f"Request from user {user}")
+    
+    return jsonify({
+        "message": f"Hello {user}",
+        "pod_info": pod_info
+    }), 200
+
+@app.route("/login/<name>", methods=["PUT"])
+def login(name):
+    session_id = request.cookies.get("session_id")
+
+    if session_id is None:
+        session_id = uuid.uuid4().hex
+        app.logger.info(f"Setting new session id {session_id[:10]}...")
+
+    # Store session data in Redis, expiring after SESSION_TTL (1 hour)
+    session_store.login(session_id, name)
+    session_cache.invalidate(session_id)
+    micro_cache.invalidate(session_id)
+
+    response = jsonify({
+        "message": f"{name} is now logged in!",
+        "pod_info": get_pod_info()
+    })
+    response.set_cookie(key="session_id", value=session_id, httponly=True, samesite='Strict')
+    return response, 202
+
+@app.route("/files", methods=["GET"])
+@micro_cached(micro_cache)
+def list_files():
+    # The first page starts with the sample files, whose sizes are known since startup; the user's
+    # uploads are paged from the SQLite catalogue with a keyset cursor
+    files = []
+    if not request.args.get("cursor"):
+        files = [{"name": filename, "size": size, "type": "sample"} for filename, size in SAMPLE_FILES.items()]
+    next_cursor = None
+
+    session_id = request.cookies.get("session_id")
+    if session_id:
+        user_data = load_session(session_id)
+        if user_data:
+            user = user_data["user"]
+            try:
+                page, next_cursor = file_catalogue.page(
+                    user,
+                    sort=request.args.get("sort", "name"),
+                    descending=request.args.get("order", "asc") == "desc",
+                    limit=min(request.args.get("limit", FILES_PAGE_SIZE, type=int), FILES_MAX_PAGE_SIZE),
+                    cursor=request.args.get("cursor"),
+                )
+            except ValueError as e:
+                return jsonify({
+                    "error": str(e),
+                    "pod_info": get_pod_info()
+                }), 400
+            files.extend({"name": entry["name"], "size": entry["size"], "type": "user"} for entry in page)
+    
+    return jsonify({
+        "files": files,
+        "next_cursor": next_cursor,
+        "pod_info": get_pod_info()
+    }), 200
+
+@app.route("/download/<filename>", methods=["GET"])
+def download_file(filename):
+    if filename in SAMPLE_SOURCES:
+        return serve_source(SAMPLE_SOURCES[filename], filename)
+
+    filepath = None
+    session_id = request.cookies.get("session_id")
+    if session_id:
+        user_data = load_session(session_id)
+        if user_data:
+            user = user_data["user"]
+            manifest = chunk_store.load_manifest(user, secure_filename(filename))
+            if manifest is not None:
+                return serve_source(ManifestSource(chunk_store, manifest), manifest["name"])
+            filepath = os.path.join(UPLOAD_FOLDER, user, filename)
+    
+    if filepath and os.path.exists(filepath):
+        return serve_file(filepath, os.path.basename(filepath))
+    else:
+        return jsonify({
+            "error": "File not found",
+            "pod_info": get_pod_info()
+        }), 404
+
+@app.route("/upload", methods=["POST"])
+def upload_file():
+    session_id = request.cookies.get("session_id")
+    if not session_id:
+        return jsonify({
+            "error": "Authentication required",
+            "pod_info": get_pod_info()
+        }), 401
+    
+    user_data = load_session(session_id)
+    if not user_data:
+        return jsonify({
+            "error": "Session expired",
+            "pod_info": get_pod_info()
+        }), 401
+    
+    user = user_data["user"]
+    
+    if 'file' not in request.files:
+        return jsonify({
+            "error": "No file part",
+            "pod_info": get_pod_info()
+        }), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({
+            "error": "No selected file",
+            "pod_info": get_pod_info()
+        }), 400
+
+    # The parts were chunked and hashed while the body was parsed; only this one is kept,
+    # the others are dropped when the request closes its files
+    chunks = file.stream.finish()
+    filename = secure_filename(file.filename)
+    manifest = chunk_store.save_manifest(user, filename, chunks, file.stream.written)
+    file_catalogue.add(user, manifest)
+    micro_cache.invalidate(session_id)
+    
+    return jsonify({
+        "message": "File uploaded successfully",
+        "filename": filename,
+        "size": manifest["size"],
+        "pod_info": get_pod_info()
+    }), 201
+
+def upload_not_found():
+    return jsonify({
+        "error": "Upload not found",
+        "pod_info": get_pod_info()
+    }), 404
+
+# Resumable uploads: create, send parts from the current offset on any pod, then complete
+@app.route("/uploads", methods=["POST"])
+def create_upload():
+    user = session_user()
+    if user is None:
+        return jsonify({
+            "error": "Authentication required",
+            "pod_info": get_pod_info()
+        }), 401
+
+    body = request.get_json(silent=True) or {}
+    filename = secure_filename(body.get("filename", ""))
+    if filename == '':
+        return jsonify({
+            "error": "No selected file",
+            "pod_info": get_pod_info()
+        }), 400
+
+    upload = chunk_store.create_upload(user, filename, body.get("size"))
+    return jsonify({
+        "upload_id": upload["id"],
+        "offset": upload["offset"],
+        "pod_info": get_pod_info()
+    }), 201
+
+def find_upload(upload_id):
+    """The caller's upload with this id, or None"""
+    user = session_user()
+    if user is None or not upload_id.isalnum():
+        return None
+    upload = chunk_store.get_upload(upload_id)
+    return upload if upload and upload["user"] == user else None
+
+@app.route("/uploads/<upload_id>", methods=["GET"])
+def upload_status(upload_id):
+    upload = find_upload(upload_id)
+    if upload is None:
+        return upload_not_found()
+    return jsonify({
+        "upload_id": upload_id,
+        "offset": upload["offset"],
+        "size": upload["size"],
+        "pod_info": get_pod_info()
+    }), 200
+
+@app.route("/uploads/<upload_id>", methods=["PUT"])
+def append_upload(upload_id):
+    if find_upload(upload_id) is None:
+        return upload_not_found()
+    try:
+        upload = chunk_store.append_upload(upload_id, request.headers.get("Upload-Offset", 0, type=int), request.stream)
+    except UploadOffsetMismatch as e:
+        return jsonify({
+            "error": str(e),
+            "offset": e.expected,
+            "pod_info": get_pod_info()
+        }), 409
+    except KeyError:
+        return upload_not_found()
+    return jsonify({
+        "upload_id": upload_id,
+        "offset": upload["offset"],
+        "pod_info": get_pod_info()
+    }), 200
+
+@app.route("/uploads/<upload_id>/complete", methods=["POST"])
+def complete_upload(upload_id):
+    upload = find_upload(upload_id)
+    if upload is None:
+        return upload_not_found()
+    try:
+        manifest = chunk_store.complete_upload(upload_id)
+    except UploadOffsetMismatch as e:
+        return jsonify({
+            "error": str(e),
+            "offset": e.expected,
+            "pod_info": get_pod_info()
+        }), 409
+    except KeyError:
+        return upload_not_found()
+    file_catalogue.add(upload["user"], manifest)
+    micro_cache.invalidate(request.cookies.get("session_id"))
+    return jsonify({
+        "message": "File uploaded successfully",
+        "filename": manifest["name"],
+        "size": manifest["size"],
+        "pod_info": get_pod_info()
+    }), 201
+
+@app.route("/health", methods=["GET"])
+@static_response
+def health_check():
+    # Simple health check endpoint
+    return jsonify({
+        "status": "ok",
+        "pod_info": get_pod_info()
+    }), 200
+
+@app.route("/ready", methods=["GET"])
+def readiness_check():
+    # Readiness probe: serving only once startup is done and Redis answers, until shutdown starts
+    ready = started.is_set() and not draining.is_set()
+    if ready:
+        try:
+            session_store.primary.ping()
+        except redis.RedisError:
+            ready = False
+    return jsonify({
+        "status": "ready" if ready else ("draining" if draining.is_set() else "starting"),
+        "startup_seconds": startup_seconds,
+        "pod_info": get_pod_info()
+    }), 200 if ready else 503
+
+@app.route("/session-cache", methods=["GET"])
+def session_cache_stats():
+    # Hit/miss counters of the local session cache
+    return jsonify({
+        "session_cache": session_cache.stats(),
+        "micro_cache": micro_cache.stats(),
+        "pod_info": get_pod_info()
+    }), 200
+
+@app.route("/ui", methods=["GET"])
+@static_response
+def ui():
+    # A simple HTML UI for testing file uploads and downloads
+    html = """
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <title>MTD Web Application</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 20px; }
+            .container { max-width: 800px; margin: 0 auto; }
+            .card { border: 1px solid #ddd; border-radius: 4px; padding: 20px; margin-bottom: 20px; }
+            .btn { background-color: #4CAF50; color: white; padding: 10px 15px; border: none; border-radius: 4px; cursor: pointer; }
+            .btn:hover { background-color: #45a049; }
+            .file-list { margin-top: 20px; }
+            .file-item { padding: 10px; border-bottom: 1px solid #eee; display: flex; justify-content: space-between; }
+            #pod-info { font-size: 12px; color: #666; margin-top: 30px; }
+            .reconnect-info { background-color: #f8f9fa; padding: 10px; border-left: 4px solid #17a2b8; margin-bottom: 15px; }
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <h1>MTD Web Application</h1>
+            
+            <div class="reconnect-info">
+                <p><strong>Connection Info:</strong> This app uses automatic reconnection if the connection is lost due to pod rotation or IP changes.</p>
+            </div>
+            
+            <div class="card">
+                <h2>Login</h2>
+                <input type="text" id="username" placeholder="Enter username">
+                <button class="btn" onclick="login()">Login</button>
+                <div id="login-status"></div>
+            </div>
+            
+            <div class="card">
+                <h2>Upload File</h2>
+                <input type="file" id="file-upload">
+                <button class="btn" onclick="uploadFile()">Upload</button>
+                <div id="upload-status"></div>
+            </div>
+            
+            <div class="card">
+                <h2>Available Files</h2>
+                <button class="btn" onclick="listFiles()">Refresh File List</button>
+                <div id="file-list" class="file-list"></div>
+            </div>
+            
+            <div id="pod-info"></div>
+        </div>
+        
+        <script>
+            // Add reconnection logic and exponential backoff
+            class ReconnectingFetch {
+                constructor(maxRetries = 5, initialBackoff = 300) {
+                    this.maxRetries = maxRetries;
+                    this.initialBackoff = initialBackoff;
+                }
+                
+                async fetch(url, options = {}) {
+                    let retries = 0;
+                    let backoff = this.initialBackoff;
+                    
+                    while (retries <= this.maxRetries) {
+                        try {
+                            const response = await fetch(url, options);
+                            if (response.ok) {
+                                return response;
+                            }
+                        } catch (error) {
+                            console.log(`Request failed (attempt ${retries + 1}/${this.maxRetries + 1}): ${error.message}`);
+                        }
+                        
+                        if (retries === this.maxRetries) {
+                            break;
+                        }
+                        
+                        // Wait before retrying with exponential backoff
+                        await new Promise(resolve => setTimeout(resolve, backoff));
+                        backoff *= 2; // Exponential backoff
+                        retries++;
+                    }
+                    
+                    throw new Error(`Failed after ${this.maxRetries + 1} attempts`);
+                }
+            }
+            
+            const rfetch = new ReconnectingFetch();
+            
+            async function login() {
+                const username = document.getElementById('username').value;
+                if (!username) {
+                    alert('Please enter a username');
+                    return;
+                }
+                
+                try {
+                    const response = await rfetch.fetch(`/login/${username}`, {
+                        method: 'PUT',
+                        credentials: 'same-origin'
+                    });
+                    const data = await response.json();
+                    document.getElementById('login-status').innerText = data.message;
+                    document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
+                    listFiles();
+                } catch (error) {
+                    document.getElementById('login-status').innerText = `Error: ${error.message}`;
+                }
+            }
+            
+            async function uploadFile() {
+                const fileInput = document.getElementById('file-upload');
+                if (!fileInput.files.length) {
+                    alert('Please select a file');
+                    return;
+                }
+                
+                const formData = new FormData();
+                formData.append('file', fileInput.files[0]);
+                
+                try {
+                    const response = await rfetch.fetch('/upload', {
+                        method: 'POST',
+                        body: formData,
+                        credentials: 'same-origin'
+                    });
+                    const data = await response.json();
+                    document.getElementById('upload-status').innerText = data.message;
+                    document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
+                    listFiles();
+                } catch (error) {
+                    document.getElementById('upload-status').innerText = `Error: ${error.message}`;
+                }
+            }
+            
+            async function listFiles() {
+                try {
+                    const response = await rfetch.fetch('/files', {
+                        credentials: 'same-origin'
+                    });
+                    const data = await response.json();
+                    const fileList = document.getElementById('file-list');
+                    fileList.innerHTML = '';
+                    
+                    if (data.files.length === 0) {
+                        fileList.innerHTML = '<p>No files available</p>';
+                    } else {
+                        data.files.forEach(file => {
+                            const fileItem = document.createElement('div');
+                            fileItem.className = 'file-item';
+                            
+                            const fileInfo = document.createElement('div');
+                            fileInfo.innerText = `${file.name} (${formatSize(file.size)})`;
+                            
+                            const downloadBtn = document.createElement('button');
+                            downloadBtn.className = 'btn';
+                            downloadBtn.innerText = 'Download';
+                            downloadBtn.onclick = () => { window.location.href = `/download/${file.name}`; };
+                            
+                            fileItem.appendChild(fileInfo);
+                            fileItem.appendChild(downloadBtn);
+                            fileList.appendChild(fileItem);
+                        });
+                    }
+                    
+                    document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
+                } catch (error) {
+                    document.getElementById('file-list').innerHTML = `<p>Error loading files: ${error.message}</p>`;
+                }
+            }
+            
+            function formatSize(bytes) {
+                if (bytes < 1024) return bytes + ' B';
+                if (bytes < 1024 * 1024) return (bytes / 1024).toFixed(1) + ' KB';
+                if (bytes < 1024 * 1024 * 1024) return (bytes / (1024 * 1024)).toFixed(1) + ' MB';
+                return (bytes / (1024 * 1024 * 1024)).toFixed(1) + ' GB';
+            }
+            
+            // Initialize
+            window.onload = function() {
+                // Attempt to load files on page load
+                listFiles();
+                
+                // Set up periodic health checks and pod info updates
+                setInterval(async () => {
+                    try {
+                        const response = await rfetch.fetch('/health', {
+                            credentials: 'same-origin'
+                        });
+                        const data = await response.json();
+                        document.getElementById('pod-info').innerText = `Pod: ${data.pod_info.pod_name} (${data.pod_info.pod_ip})`;
+                    } catch (error) {
+                        console.error('Health check failed:', error);
+                    }
+                }, 5000);
+            };
+        </script>
+    </body>
+    </html>
+    """
+    return render_template_string(html)
+
+def mark_started():
+    global startup_seconds
+    startup_seconds = round(time.monotonic() - STARTED_AT, 3)
+    started.set()
+    app.logger.info(f"Ready to serve after {startup_seconds}s")
+
+if __name__ == "__main__":
+    threading.Thread(target=reconcile_catalogue, name="catalogue-reconcile", daemon=True).start()
+    if SESSION_CACHE_ENABLED:
+        session_cache.start()
+    mark_started()
+    metrics.serve()
+    # Development server; production runs gunicorn with gunicorn.conf.py
+    app.run(host="0.0.0.0", port=8080, debug=True, use_reloader=False)
@@ -0,0 +1,135 @@
+import base64
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+SORT_COLUMNS = {"name", "size", "created"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    user TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    content_id TEXT,
+    PRIMARY KEY (user, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS files_by_size ON files (user, size, name);
+CREATE INDEX IF NOT EXISTS files_by_created ON files (user, created, name);
+"""
+
+INSERT = "INSERT OR REPLACE INTO files (user, name, size, created, content_id) VALUES (?, ?, ?, ?, ?)"
+
+
+def encode_cursor(sort_value, name: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([sort_value, name]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    value = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(value, list) or len(value) != 2:
+        raise ValueError("Invalid cursor")
+    sort_value, name = value
+    return sort_value, name
+
+
+class FileCatalogue:
+    """
+    SQLite index of every user's files, so listing a page is one indexed query
+    instead of a directory scan plus a stat per file.
+
+    The database sits next to the chunk store on the shared volume. It uses the
+    rollback journal rather than WAL, which needs shared memory between pods.
+    """
+    BUSY_TIMEOUT = float(os.environ.get("CATALOGUE_BUSY_TIMEOUT", 5))
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # Not kept: a connection must not be inherited by processes forked after this
+        connection = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT)
+        with connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+
+    def connection(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections must not be shared"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def add(self, user: str, manifest: dict):
+        """Index a manifest the chunk store just saved"""
+        with self.connection() as connection:
+            connection.execute(INSERT, (user, manifest["name"], manifest["size"], manifest["created"], manifest["content_id"]))
+
+    def count(self, user: str) -> int:
+        return self.connection().execute("SELECT COUNT(*) FROM files WHERE user = ?", (user,)).fetchone()[0]
+
+    def page(self, user: str, sort: str = "name", descending: bool = False, limit: int = 100, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """
+        One page of a user's files and the cursor of the next page, or None on the last page.
+
+        Keyset pagination on (sort column, name): every page is a range scan of
+        an index, however deep the client pages.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}")
+        if limit < 1:
+            raise ValueError(f"Page size must be at least 1, not {limit}")
+        direction, comparison = ("DESC", "<") if descending else ("ASC", ">")
+        order = f"{sort} {direction}" if sort == "name" else f"{sort} {direction}, name {direction}"
+        query = "SELECT name, size, created FROM files WHERE user = ?"
+        parameters: list = [user]
+        if cursor:
+            sort_value, name = decode_cursor(cursor)
+            if sort == "name":
+                query += f" AND name {comparison} ?"
+                parameters.append(name)
+            else:
+                query += f" AND ({sort}, name) {comparison} (?, ?)"
+                parameters.extend([sort_value, name])
+        query += f" ORDER BY {order} LIMIT ?"
+        parameters.append(limit + 1)
+
+        rows = self.connection().execute(query, parameters).fetchall()
+        files = [{"name": name, "size": size, "created": created} for name, size, created in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = files[-1]
+            next_cursor = encode_cursor(last[sort], last["name"])
+        return files, next_cursor
+
+    def reconcile(self, chunk_store) -> int:
+        """
+        Cold-start scan of the chunk store: index manifests the catalogue does not
+        know yet and forget rows whose manifest is gone. Returns the rows changed.
+        """
+        manifests_root = os.path.join(chunk_store.root, "manifests")
+        found = {
+            user: {entry[:-len(".json")] for entry in os.listdir(os.path.join(manifests_root, user)) if entry.endswith(".json")}
+            for user in os.listdir(manifests_root)
+        }
+        connection = self.connection()
+        known = {}
+        for user, name in connection.execute("SELECT user, name FROM files"):
+            known.setdefault(user, set()).add(name)
+
+        changed = 0
+        with connection:
+            for user, names in known.items():
+                gone = [(user, name) for name in names - found.get(user, set())]
+                connection.executemany("DELETE FROM files WHERE user = ? AND name = ?", gone)
+                changed += len(gone)
+            for user, names in found.items():
+                for name in names - known.get(user, set()):
+                    manifest = chunk_store.load_manifest(user, name)
+                    if manifest is not None:
+                        connection.execute(INSERT, (user, name, manifest["size"], manifest["created"], manifest["content_id"]))
+                        changed += 1
+        return changed
@@ -0,0 +1,142 @@
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.http import http_date, parse_date, quote_etag, unquote_etag
+
+CHUNK_SIZE = 256 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+_etags: Dict[str, Tuple[int, int, str]] = {}
+_etags_lock = threading.Lock()
+
+
+def content_etag(path: str, st: os.stat_result) -> str:
+    """
+    Strong ETag derived from the file content, so every pod serving the same
+    bytes announces the same validator. Cached until the file changes.
+    """
+    with _etags_lock:
+        cached = _etags.get(path)
+    if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    etag = digest.hexdigest()
+    with _etags_lock:
+        _etags[path] = (st.st_size, st.st_mtime_ns, etag)
+    return etag
+
+
+def parse_range(header: Optional[str], size: int):
+    """
+    Return (start, end) for a single byte range, None to serve the whole file,
+    or False when the range cannot be satisfied
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match:
+        # Multiple or malformed ranges: the full representation is a valid answer
+        return None
+    first, last = match.groups()
+    if first == "":
+        if last == "" or int(last) == 0:
+            return False
+        return max(0, size - int(last)), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def mmap_chunks(path: str, start: int, length: int):
+    """Yield a byte range straight from the page cache through a memory map"""
+    if length == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        end = start + length
+        for offset in range(start, end, CHUNK_SIZE):
+            yield mapped[offset:min(offset + CHUNK_SIZE, end)]
+
+
+class FileSource:
+    """A file on local disk, served through sendfile or a memory map"""
+
+    def __init__(self, path: str):
+        st = os.stat(path)
+        self.path = path
+        self.size = st.st_size
+        self.mtime = st.st_mtime
+        self.etag = content_etag(path, st)
+
+    def chunks(self, start: int, length: int):
+        return mmap_chunks(self.path, start, length)
+
+
+def serve_file(path: str, download_name: str) -> Response:
+    return serve_source(FileSource(path), download_name)
+
+
+def serve_source(source, download_name: str) -> Response:
+    """
+    send_file with byte ranges, If-Range and ETag/Last-Modified validators.
+
+    source provides size, mtime, etag and chunks(start, length). Ranges of a
+    local file running to its end (every resumed download) go through
+    wsgi.file_wrapper so servers such as gunicorn can use sendfile(2).
+    """
+    size = source.size
+    etag = source.etag
+    headers = {
+        "ETag": quote_etag(etag),
+        "Last-Modified": http_date(source.mtime),
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"attachment; filename={download_name}",
+    }
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and etag in [unquote_etag(tag.strip())[0] for tag in if_none_match.split(",")]:
+        return Response(status=304, headers=headers)
+
+    byte_range = parse_range(request.headers.get("Range"), size)
+    if_range = request.headers.get("If-Range")
+    if byte_range is not None and if_range:
+        if_range_date = parse_date(if_range)
+        if if_range_date is not None:
+            fresh = int(source.mtime) <= int(if_range_date.timestamp())
+        else:
+            fresh = unquote_etag(if_range)[0] == etag and not unquote_etag(if_range)[1]
+        if not fresh:
+            byte_range = None
+
+    if byte_range is False:
+        headers["Content-Range"] = f"bytes */{size}"
+        return Response(status=416, headers=headers)
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    length = max(0, end - start + 1)
+    headers["Content-Length"] = str(length)
+    status = 206 if byte_range else 200
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if file_wrapper is not None and source.path is not None and end == size - 1:
+        f = open(source.path, "rb")
+        f.seek(start)
+        body = file_wrapper(f, CHUNK_SIZE)
+    else:
+        body = source.chunks(start, length)
+
+    mimetype = mimetypes.guess_type(download_name)[0] or "application/octet-stream"
+    return Response(body, status=status, headers=headers, mimetype=mimetype, direct_passthrough=True)
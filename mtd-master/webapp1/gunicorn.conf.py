@@ -0,0 +1,94 @@
+import math
+import os
+import shutil
+import signal
+import threading
+
+""" Production server for the webapp: gunicorn -c gunicorn.conf.py """
+
+
+def cpu_limit() -> float:
+    """CPUs this container may use: its cgroup CPU quota when it has one, else the CPUs it can run on"""
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: a quota of -1 means unlimited
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0))
+
+
+wsgi_app = "enhanced_serve:app"
+bind = os.environ.get("WEB_BIND", "0.0.0.0:8080")
+
+# One process per CPU of quota works around the GIL; threads cover requests waiting on Redis or the network
+workers = int(os.environ.get("WEB_WORKERS", 0)) or max(1, math.ceil(cpu_limit() * float(os.environ.get("WEB_WORKERS_PER_CPU", 1))))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", 8))
+
+# Import the app once in the master so workers fork with its state already built
+preload_app = True
+
+# On SIGTERM workers stop accepting and finish what they are serving, up to this long
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+timeout = int(os.environ.get("WEB_TIMEOUT", 120))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+
+# Workers snapshot their metrics here; the master merges them on its own METRICS_PORT
+METRICS_DIR = os.environ.get("METRICS_DIR", "/tmp/webapp-metrics")
+METRICS_SNAPSHOT_INTERVAL = float(os.environ.get("METRICS_SNAPSHOT_INTERVAL", 1))
+
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("WEB_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    import enhanced_serve
+    import metrics
+    shutil.rmtree(METRICS_DIR, ignore_errors=True)
+    os.makedirs(METRICS_DIR)
+    metrics.serve(render_metrics=lambda: metrics.render_directory(METRICS_DIR))
+    threading.Thread(target=enhanced_serve.reconcile_catalogue, name="catalogue-reconcile", daemon=True).start()
+    server.log.info(f"Serving with {workers} workers of {threads} threads ({cpu_limit():.2f} CPUs available)")
+
+
+def post_worker_init(worker):
+    import enhanced_serve
+    import metrics
+    # Threads do not survive fork: start the per-process ones in each worker
+    if enhanced_serve.SESSION_CACHE_ENABLED:
+        enhanced_serve.session_cache.start()
+    metrics.start_snapshots(METRICS_DIR, METRICS_SNAPSHOT_INTERVAL)
+
+    # Report not ready as soon as draining starts, then let gunicorn finish in-flight requests
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        enhanced_serve.draining.set()
+        handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+    enhanced_serve.mark_started()
+
+
+def worker_exit(server, worker):
+    import metrics
+    metrics.write_snapshot(METRICS_DIR)
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.retire_snapshot(METRICS_DIR, worker.pid)
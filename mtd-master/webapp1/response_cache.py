@@ -0,0 +1,164 @@
+import functools
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Tuple
+
+from flask import Response, current_app, request
+from werkzeug.http import parse_accept_header
+
+try:
+    import brotli
+except ImportError:  # brotli is optional: responses fall back to gzip
+    brotli = None
+
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 512))
+
+
+class PreparedResponse:
+    """
+    A response body built once and served many times.
+
+    The ETag is computed up front, and compressed variants are produced the
+    first time a client asks for them (or eagerly with precompress()), so a
+    hit costs a header lookup and a copy of bytes that are already encoded.
+    """
+
+    def __init__(self, body: bytes, mimetype: str, status: int = 200, cache_control: str = "no-cache", vary: str = "Accept-Encoding"):
+        self.body = body
+        self.mimetype = mimetype
+        self.status = status
+        self.cache_control = cache_control
+        self.vary = vary
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.variants: Dict[str, bytes] = {"identity": body}
+        self.lock = threading.Lock()
+
+    def variant(self, encoding: str) -> bytes:
+        body = self.variants.get(encoding)
+        if body is None:
+            body = brotli.compress(self.body, quality=11) if encoding == "br" else gzip.compress(self.body, compresslevel=9, mtime=0)
+            with self.lock:
+                self.variants[encoding] = body
+        return body
+
+    def precompress(self) -> "PreparedResponse":
+        for encoding in available_encodings():
+            self.variant(encoding)
+        return self
+
+    def respond(self) -> Response:
+        """Answer the current request: 304 when the client has it, else the best encoding it accepts"""
+        encoding = negotiate_encoding(len(self.body))
+        etag = self.etag if encoding == "identity" else f"{self.etag}-{encoding}"
+        headers = {"ETag": f'"{etag}"', "Cache-Control": self.cache_control, "Vary": self.vary}
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match and self.status == 200:
+            # Any encoding of the same body is the same representation for revalidation
+            tags = {tag.strip().strip('"').split("-")[0] for tag in if_none_match.split(",")}
+            if self.etag in tags or "*" in tags:
+                return Response(status=304, headers=headers)
+
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(self.variant(encoding), status=self.status, headers=headers, mimetype=self.mimetype)
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(size: int) -> str:
+    """Best content coding the client accepts, or identity for small bodies"""
+    if size < COMPRESS_MIN_SIZE:
+        return "identity"
+    accepted = parse_accept_header(request.headers.get("Accept-Encoding", ""))
+    for encoding in available_encodings():
+        if accepted[encoding] > 0:
+            return encoding
+    return "identity"
+
+
+class MicroCache:
+    """
+    Short-TTL cache of per-session responses, keyed by a scope (the session id)
+    and a key within it. A whole scope can be dropped when its data changes on
+    this pod; other pods see the change once their copy expires.
+    """
+    TTL = float(os.environ.get("MICRO_CACHE_TTL", 1.0))
+    MAX_SCOPES = int(os.environ.get("MICRO_CACHE_MAX_SCOPES", 10000))
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.scopes: "OrderedDict[Hashable, Dict[Hashable, Tuple[float, PreparedResponse]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(self, scope: Hashable, key: Hashable, build: Callable[[], PreparedResponse]) -> PreparedResponse:
+        now = self.clock()
+        with self.lock:
+            entry = self.scopes.get(scope, {}).get(key)
+            if entry is not None and entry[0] > now:
+                self.scopes.move_to_end(scope)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        prepared = build()
+        with self.lock:
+            self.scopes.setdefault(scope, {})[key] = (now + self.TTL, prepared)
+            self.scopes.move_to_end(scope)
+            while len(self.scopes) > self.MAX_SCOPES:
+                self.scopes.popitem(last=False)
+        return prepared
+
+    def invalidate(self, scope: Hashable):
+        with self.lock:
+            self.scopes.pop(scope, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"scopes": len(self.scopes), "hits": self.hits, "misses": self.misses}
+
+
+def to_prepared(view_result, cache_control: str, vary: str) -> PreparedResponse:
+    response = current_app.make_response(view_result)
+    return PreparedResponse(response.get_data(), response.mimetype, response.status_code, cache_control, vary)
+
+
+def static_response(view):
+    """
+    Cache a view whose output never changes for the life of the process,
+    with its ETag and compressed variants computed on the first call.
+    """
+    if not RESPONSE_CACHE_ENABLED:
+        return view
+    prepared: List[PreparedResponse] = []
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not prepared:
+            prepared.append(to_prepared(view(*args, **kwargs), "no-cache", "Accept-Encoding").precompress())
+        return prepared[0].respond()
+    return wrapper
+
+
+def micro_cached(cache: MicroCache):
+    """Cache a per-session view for MICRO_CACHE_TTL, scoped by the session cookie and keyed by path and query"""
+    def decorator(view):
+        if not RESPONSE_CACHE_ENABLED:
+            return view
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            scope = request.cookies.get("session_id", "")
+            build = lambda: to_prepared(view(*args, **kwargs), "private, no-cache", "Accept-Encoding, Cookie")
+            return cache.get_or_build(scope, request.full_path, build).respond()
+        return wrapper
+    return decorator
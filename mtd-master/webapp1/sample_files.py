@@ -0,0 +1,42 @@
+import functools
+import hashlib
+import os
+import random
+from zlib import crc32
+
+BLOCK_SIZE = 256 * 1024
+SAMPLE_SEED = int(os.environ.get("SAMPLE_SEED", 1810))
+""" Fixed Last-Modified: the content only depends on the seed, name and size """
+SAMPLE_MTIME = 1704067200
+
+
+@functools.lru_cache(maxsize=int(os.environ.get("SAMPLE_BLOCK_CACHE", 64)))
+def sample_block(seed: int, index: int) -> bytes:
+    return random.Random(seed * 1_000_003 + index).randbytes(BLOCK_SIZE)
+
+
+class SampleSource:
+    """
+    A sample file that is never written to disk.
+
+    Its bytes are generated block by block from a PRNG seeded with the file
+    name, so every pod serves the same content under the same ETag and a
+    download can be resumed on another pod. Nothing is generated at startup.
+    """
+
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.path = None
+        self.size = size
+        self.mtime = SAMPLE_MTIME
+        self.seed = crc32(f"{SAMPLE_SEED}:{name}".encode())
+        self.etag = hashlib.blake2b(f"{self.seed}:{size}".encode(), digest_size=16).hexdigest()
+
+    def chunks(self, start: int, length: int):
+        end = start + length
+        while start < end:
+            index, offset = divmod(start, BLOCK_SIZE)
+            block = sample_block(self.seed, index)
+            piece = block[offset:min(BLOCK_SIZE, offset + end - start)]
+            start += len(piece)
+            yield piece
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from session_store import SessionStore
+
+logger = logging.getLogger("mtd_webapp.session_cache")
+
+
+class SessionCache:
+    """
+    Bounded in-process LRU cache in front of the Redis session keys.
+
+    Entries never outlive the key's remaining Redis TTL. Writes made by any pod
+    are pushed to every cache through Redis client-side caching in broadcast
+    mode (CLIENT TRACKING ... BCAST PREFIX session:), redirected to a pub/sub
+    connection so it also works over RESP2. If the invalidation channel is
+    down the cache is flushed and bypassed until it is back.
+    """
+    MAX_ENTRIES = int(os.environ.get("SESSION_CACHE_SIZE", 10000))
+    TTL_SECONDS = float(os.environ.get("SESSION_CACHE_TTL", 300))
+    RECONNECT_SECONDS = 1
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+        self.prefix = store.prefix
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tracking = threading.Event()
+        self._stopped = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._epoch = 0
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """Return the session data, from memory when the cached copy is still valid"""
+        key = self.store.key(session_id)
+        if self._tracking.is_set():
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+
+        with self._lock:
+            self.misses += 1
+            epoch = self._epoch
+
+        data, pttl = self.store.get_with_ttl(session_id)
+        if data is None:
+            return None
+
+        if self._tracking.is_set():
+            ttl = self.TTL_SECONDS if pttl is None or pttl < 0 else min(self.TTL_SECONDS, pttl / 1000)
+            with self._lock:
+                if epoch != self._epoch:
+                    # An invalidation raced with this read, the value may already be stale
+                    return data
+                self._entries[key] = (data, time.monotonic() + ttl)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.MAX_ENTRIES:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return data
+
+    def invalidate(self, session_id: str):
+        self._drop(self.store.key(session_id))
+
+    def _drop(self, key: str):
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self._tracking.is_set(),
+                "size": len(self._entries),
+                "max_entries": self.MAX_ENTRIES,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def start(self):
+        threading.Thread(target=self._listen, name="session-cache-invalidation", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            pool = self.store.primary.connection_pool
+            subscriber = pool.make_connection()
+            tracker = pool.make_connection()
+            try:
+                subscriber.send_command("CLIENT", "ID")
+                redirect_id = subscriber.read_response()
+                subscriber.send_command("SUBSCRIBE", "__redis__:invalidate")
+                subscriber.read_response()
+
+                # A dedicated connection owns the tracking state and redirects it to the subscriber
+                tracker.send_command("CLIENT", "TRACKING", "ON", "REDIRECT", redirect_id, "BCAST", "PREFIX", self.prefix)
+                tracker.read_response()
+
+                self.clear()
+                self._tracking.set()
+                logger.info("Session cache invalidation channel established")
+
+                while not self._stopped.is_set():
+                    if not subscriber.can_read(timeout=1):
+                        continue
+                    kind, _, keys = subscriber.read_response()
+                    if kind not in (b"message", "message"):
+                        continue
+                    if keys is None:
+                        self.clear()
+                    else:
+                        for key in keys if isinstance(keys, list) else [keys]:
+                            self._drop(key.decode() if isinstance(key, bytes) else key)
+            except Exception as e:
+                logger.warning(f"Session cache invalidation channel lost: {e}")
+            finally:
+                self._tracking.clear()
+                self.clear()
+                tracker.disconnect()
+                subscriber.disconnect()
+            self._stopped.wait(self.RECONNECT_SECONDS)
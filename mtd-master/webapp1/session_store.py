@@ -0,0 +1,144 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
+from redis.retry import Retry
+from redis.sentinel import Sentinel
+import metrics
+
+REDIS_SECONDS = metrics.Histogram("webapp_redis_seconds", "Round trips to Redis by command, a pipeline counting as one", ["command"],
+                                  buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1))
+
+
+class TimedRedis(redis.Redis):
+    """Redis client that records the round trip of every command and pipeline"""
+
+    def execute_command(self, *args, **options):
+        with REDIS_SECONDS.time(str(args[0]).upper()):
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class TimedPipeline(redis.client.Pipeline):
+    def execute(self, raise_on_error=True):
+        with REDIS_SECONDS.time("PIPELINE"):
+            return super().execute(raise_on_error)
+
+
+class SessionStore:
+    """
+    Session storage on Redis with bounded waits.
+
+    Connections come from a blocking pool with socket timeouts, retries with
+    exponential backoff and periodic health checks, so a Redis hiccup costs a
+    request a bounded delay instead of stalling every worker. Reads can go to a
+    replica (or a Sentinel-managed replica) and fall back to the primary.
+    """
+    SESSION_TTL = int(os.environ.get("SESSION_TTL", 3600))
+    POOL_SIZE = int(os.environ.get("REDIS_POOL_SIZE", 50))
+    POOL_TIMEOUT = float(os.environ.get("REDIS_POOL_TIMEOUT", 2))
+    SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", 1))
+    CONNECT_TIMEOUT = float(os.environ.get("REDIS_CONNECT_TIMEOUT", 1))
+    RETRIES = int(os.environ.get("REDIS_RETRIES", 3))
+    BACKOFF_BASE = float(os.environ.get("REDIS_BACKOFF_BASE", 0.05))
+    BACKOFF_CAP = float(os.environ.get("REDIS_BACKOFF_CAP", 1))
+    HEALTH_CHECK_INTERVAL = int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 15))
+
+    def __init__(self, primary: redis.Redis, replica: Optional[redis.Redis] = None, prefix: str = "session:"):
+        self.primary = primary
+        self.replica = replica
+        self.prefix = prefix
+
+    @classmethod
+    def connection_options(cls) -> dict:
+        return {
+            "socket_timeout": cls.SOCKET_TIMEOUT,
+            "socket_connect_timeout": cls.CONNECT_TIMEOUT,
+            "socket_keepalive": True,
+            "health_check_interval": cls.HEALTH_CHECK_INTERVAL,
+            "retry": Retry(ExponentialBackoff(cap=cls.BACKOFF_CAP, base=cls.BACKOFF_BASE), cls.RETRIES),
+            "retry_on_error": [ConnectionError, TimeoutError],
+        }
+
+    @classmethod
+    def client(cls, host: str, port: int, db: int) -> redis.Redis:
+        pool = redis.BlockingConnectionPool(
+            host=host,
+            port=port,
+            db=db,
+            max_connections=cls.POOL_SIZE,
+            timeout=cls.POOL_TIMEOUT,
+            **cls.connection_options()
+        )
+        return TimedRedis(connection_pool=pool)
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """Build the store from REDIS_* variables: Sentinel, primary plus replica, or a single server"""
+        db = int(os.environ.get("REDIS_DB", "0"))
+        sentinels = os.environ.get("REDIS_SENTINELS")
+        if sentinels:
+            addresses = [(host, int(port)) for host, port in (item.rsplit(":", 1) for item in sentinels.split(","))]
+            service = os.environ.get("REDIS_SENTINEL_SERVICE", "mymaster")
+            sentinel = Sentinel(addresses, socket_timeout=cls.SOCKET_TIMEOUT)
+            options = dict(cls.connection_options(), db=db, max_connections=cls.POOL_SIZE, redis_class=TimedRedis)
+            return cls(sentinel.master_for(service, **options), sentinel.slave_for(service, **options))
+
+        primary = cls.client(os.environ.get("REDIS_HOST", "redis-service"), int(os.environ.get("REDIS_PORT", "6379")), db)
+        replica_host = os.environ.get("REDIS_REPLICA_HOST")
+        replica = cls.client(replica_host, int(os.environ.get("REDIS_REPLICA_PORT", "6379")), db) if replica_host else None
+        return cls(primary, replica)
+
+    def key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def _read(self, command):
+        """Run a read on the replica when there is one, falling back to the primary"""
+        if self.replica is not None:
+            try:
+                return command(self.replica)
+            except (ConnectionError, TimeoutError):
+                pass
+        return command(self.primary)
+
+    def get(self, session_id: str) -> Optional[dict]:
+        raw = self._read(lambda client: client.get(self.key(session_id)))
+        return json.loads(raw) if raw else None
+
+    def get_with_ttl(self, session_id: str) -> Tuple[Optional[dict], Optional[int]]:
+        """Session data and remaining TTL in milliseconds, in one round trip"""
+        def command(client):
+            pipe = client.pipeline(transaction=False)
+            pipe.get(self.key(session_id))
+            pipe.pttl(self.key(session_id))
+            return pipe.execute()
+
+        raw, pttl = self._read(command)
+        return (json.loads(raw) if raw else None), pttl
+
+    def get_many(self, session_ids: List[str]) -> Dict[str, Optional[dict]]:
+        values = self._read(lambda client: client.mget([self.key(session_id) for session_id in session_ids]))
+        return {session_id: json.loads(raw) if raw else None for session_id, raw in zip(session_ids, values)}
+
+    def login(self, session_id: str, user: str) -> dict:
+        """Store the session and index it under the user, refreshing both TTLs in one round trip"""
+        data = {"user": user}
+        user_key = f"user-sessions:{user}"
+        pipe = self.primary.pipeline(transaction=True)
+        pipe.set(self.key(session_id), json.dumps(data), ex=self.SESSION_TTL)
+        pipe.sadd(user_key, session_id)
+        pipe.expire(user_key, self.SESSION_TTL)
+        pipe.execute()
+        return data
+
+    def touch(self, session_ids: List[str]):
+        """Refresh the TTL of several sessions in one round trip"""
+        pipe = self.primary.pipeline(transaction=False)
+        for session_id in session_ids:
+            pipe.expire(self.key(session_id), self.SESSION_TTL)
+        pipe.execute()